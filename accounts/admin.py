@@ -18,9 +18,20 @@ class DoctorProfileAdmin(admin.ModelAdmin):
 
 @admin.register(PatientProfile)
 class PatientProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'assigned_doctor', 'blood_type', 'emergency_contact']
+    list_display = ['user', 'assigned_doctor', 'blood_type', 'emergency_contact', 'total_records', 'last_visit']
     list_filter = ['assigned_doctor', 'blood_type']
     search_fields = ['user__username', 'user__email']
+    list_select_related = ['user', 'assigned_doctor__user', 'record_summary']
+    
+    @admin.display(ordering='record_summary__total_records')
+    def total_records(self, obj):
+        summary = getattr(obj, 'record_summary', None)
+        return summary.total_records if summary else 0
+    
+    @admin.display(ordering='record_summary__last_visit')
+    def last_visit(self, obj):
+        summary = getattr(obj, 'record_summary', None)
+        return summary.last_visit if summary else None
     
     def save_model(self, request, obj, form, change):
         # Trigger notification when doctor is assigned
@@ -31,5 +42,9 @@ class PatientProfileAdmin(admin.ModelAdmin):
                 obj.user.get_full_name()
             )
         super().save_model(request, obj, form, change)
+        
+        if change and 'assigned_doctor' in form.changed_data:
+            from health_records.cache import invalidate_patient
+            invalidate_patient(obj.id, obj.assigned_doctor_id, form.initial.get('assigned_doctor'))
 
 admin.site.register(User, CustomUserAdmin)
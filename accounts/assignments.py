@@ -0,0 +1,112 @@
+"""
+Cached sets of the patients assigned to each doctor.
+
+Object permission checks ask whether a record's patient is assigned to the
+requesting doctor. assigned_patient_ids() answers from a per-process copy of
+the doctor's patient ids, checked against a version number in the shared
+cache on every call:
+
+    accounts:assignments:version:<doctor id>
+    accounts:assignments:<doctor id>:<version>    frozenset of patient ids
+
+A change of PatientProfile.assigned_doctor is recorded by
+assignments_changed() for the old and the new doctor: it bumps their cache
+versions and DoctorProfile.assignment_version, which tells delta sync that
+the doctor's scope changed. save() and delete() do so through signals, which
+covers assign_doctor_to_patient and the admin. update() and bulk_update() do
+so in PatientProfileQuerySet. The next check sees the new version and reloads
+the set from the shared cache or, failing that, the database.
+
+Local copies expire after ASSIGNMENT_CACHE_TIMEOUT and at most LOCAL_SIZE
+doctors are kept per process. Without a shared cache (CACHE_IS_SHARED) a
+version bump would not reach other processes, so every check reads the
+database instead.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+KEY_PREFIX = 'accounts:assignments'
+LOCAL_SIZE = 1000
+
+# doctor id -> (version, frozenset of patient ids, monotonic expiry), oldest first
+_local = {}
+
+def _version_key(doctor_id):
+    return f'{KEY_PREFIX}:version:{doctor_id}'
+
+def get_version(doctor_id):
+    key = _version_key(doctor_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so an evicted version never matches an old copy
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+def _load(doctor_id):
+    from .models import PatientProfile
+    # Read from the primary: a lagging replica would store the old
+    # assignment under the new version
+    return frozenset(
+        PatientProfile.objects.using(DEFAULT_DB_ALIAS).filter(assigned_doctor_id=doctor_id)
+        .values_list('pk', flat=True)
+    )
+
+def assigned_patient_ids(doctor_id):
+    """Ids of the patients assigned to the doctor, as a frozenset"""
+    if not settings.CACHE_IS_SHARED:
+        return _load(doctor_id)
+
+    version = get_version(doctor_id)
+    now = time.monotonic()
+    local = _local.pop(doctor_id, None)
+    if local is not None and local[0] == version and local[2] > now:
+        _local[doctor_id] = local
+        return local[1]
+
+    key = f'{KEY_PREFIX}:{doctor_id}:{version}'
+    patient_ids = cache.get(key)
+    if patient_ids is None:
+        patient_ids = _load(doctor_id)
+        cache.set(key, patient_ids, settings.ASSIGNMENT_CACHE_TIMEOUT)
+    while len(_local) >= LOCAL_SIZE:
+        _local.pop(next(iter(_local), None), None)
+    _local[doctor_id] = (version, patient_ids, now + settings.ASSIGNMENT_CACHE_TIMEOUT)
+    return patient_ids
+
+def is_assigned(doctor_id, patient_id):
+    return patient_id in assigned_patient_ids(doctor_id)
+
+def invalidate_assignments(*doctor_ids):
+    """
+    Bump the version of each doctor now and again once the current
+    transaction commits, so a set loaded from uncommitted state in between
+    is never used.
+    """
+    doctor_ids = {doctor_id for doctor_id in doctor_ids if doctor_id}
+
+    def bump():
+        for doctor_id in doctor_ids:
+            key = _version_key(doctor_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+def assignments_changed(*doctor_ids, using=DEFAULT_DB_ALIAS):
+    """Record that patients were assigned to or unassigned from these doctors"""
+    from .models import DoctorProfile
+    doctor_ids = {doctor_id for doctor_id in doctor_ids if doctor_id}
+    if not doctor_ids:
+        return
+    DoctorProfile.objects.using(using).filter(pk__in=doctor_ids).update(
+        assignment_version=F('assignment_version') + 1
+    )
+    invalidate_assignments(*doctor_ids)
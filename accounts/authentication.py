@@ -0,0 +1,72 @@
+"""
+JWT authentication that trusts the token's claims instead of the database.
+
+Tokens issued by ProfileRefreshToken (login, register, refresh) carry the
+user's user_type and profile id. ClaimsJWTAuthentication turns them into a
+User instance whose other fields are deferred, with the PatientProfile or
+DoctorProfile pre-cached the same way. Scoping, cache principals and
+permission checks therefore need no query. Any other field is loaded on
+first access.
+
+The claims are re-read from the database on every refresh, so they are
+never older than ACCESS_TOKEN_LIFETIME (5 minutes). Deactivating or deleting
+a user calls revoke_tokens(), which records the time in the cache, and
+access tokens issued before it are rejected until they expire. Tokens
+without the claims fall back to JWTAuthentication's database lookup, and so
+does every token when the cache is not shared between processes
+(CACHE_IS_SHARED): a revocation recorded in one process's local memory would
+not reach the others.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .models import DoctorProfile, PatientProfile, User
+
+REVOKED_KEY_PREFIX = 'auth:revoked'
+
+PROFILE_MODELS = {'PATIENT': PatientProfile, 'DOCTOR': DoctorProfile}
+
+def revoke_tokens(user_id):
+    """Reject the user's access tokens issued until now"""
+    leeway = jwt_settings.LEEWAY
+    lifetime = jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds() + (
+        leeway.total_seconds() if isinstance(leeway, timedelta) else leeway
+    )
+    # Once every such token has expired, the marker is no longer needed
+    cache.set(f'{REVOKED_KEY_PREFIX}:{user_id}', time.time(), timeout=int(lifetime) + 1)
+
+def is_revoked(user_id, issued_at):
+    revoked_at = cache.get(f'{REVOKED_KEY_PREFIX}:{user_id}')
+    return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+def claims_user(user_id, user_type, profile_id):
+    """User with only id, user_type and is_active loaded, and its profile cached"""
+    user = User.from_db(None, ['id', 'user_type', 'is_active'], [user_id, user_type, True])
+    profile_model = PROFILE_MODELS.get(user_type)
+    if profile_model is not None and profile_id is not None:
+        profile = profile_model.from_db(None, ['id', 'user_id'], [profile_id, user_id])
+        profile_model._meta.get_field('user').set_cached_value(profile, user)
+        profile_model._meta.get_field('user').remote_field.set_cached_value(user, profile)
+    return user
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if 'user_type' not in validated_token or not settings.CACHE_IS_SHARED:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if is_revoked(user_id, validated_token.get('iat')):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        return claims_user(user_id, validated_token['user_type'], validated_token.get('profile_id'))
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    # Build the composite indexes before dropping the single-column FK
+    # indexes they replace, so lookups are never left without an index.
+    operations = [
+        migrations.AddIndex(
+            model_name='patientprofile',
+            index=models.Index(fields=['assigned_doctor', 'id'], name='patient_doctor_idx'),
+        ),
+        migrations.AlterField(
+            model_name='patientprofile',
+            name='assigned_doctor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='patients', to='accounts.doctorprofile'),
+        ),
+    ]
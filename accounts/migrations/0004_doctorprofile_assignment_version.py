@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='assignment_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
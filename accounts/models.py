@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = [
@@ -15,16 +16,55 @@ class User(AbstractUser):
     
     def __str__(self):
         return f"{self.username} ({self.user_type})"
+    
+    @property
+    def profile(self):
+        """
+        The PatientProfile or DoctorProfile matching user_type, or None.
+        Already cached on users authenticated from token claims.
+        """
+        accessor = {'PATIENT': 'patientprofile', 'DOCTOR': 'doctorprofile'}.get(self.user_type)
+        if accessor is None:
+            return None
+        try:
+            return getattr(self, accessor)
+        except ObjectDoesNotExist:
+            return None
 
 class DoctorProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     specialization = models.CharField(max_length=100)
     license_number = models.CharField(max_length=50, unique=True)
     years_of_experience = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bumped whenever a patient is assigned to or unassigned from the doctor
+    # (see accounts/assignments.py); delta sync tokens carry it
+    assignment_version = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f"Dr. {self.user.get_full_name()} - {self.specialization}"
 
+class PatientProfileQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Queryset updates skip the save signals, so changes of assigned_doctor
+        (bulk_update() included) invalidate the cached assignments here
+        """
+        if 'assigned_doctor' not in kwargs and 'assigned_doctor_id' not in kwargs:
+            return super().update(**kwargs)
+        
+        from .assignments import assignments_changed
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list('pk', 'assigned_doctor_id'))
+            updated = super().update(**kwargs)
+            # The new value may be an expression; read back what was written
+            doctor_ids = set(
+                self.model._base_manager.using(self.db).filter(pk__in=[pk for pk, _ in rows])
+                .values_list('assigned_doctor_id', flat=True)
+            )
+            assignments_changed(*doctor_ids, *(doctor_id for _, doctor_id in rows), using=self.db)
+        return updated
+
 class PatientProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     emergency_contact = models.CharField(max_length=15)
@@ -35,8 +75,19 @@ class PatientProfile(models.Model):
         on_delete=models.SET_NULL, 
         null=True, 
         blank=True,
-        related_name='patients'
+        related_name='patients',
+        # Indexed as the leading column of patient_doctor_idx
+        db_index=False
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = PatientProfileQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Doctor panel join: assigned patients resolved from the index alone
+            models.Index(fields=['assigned_doctor', 'id'], name='patient_doctor_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - Patient"
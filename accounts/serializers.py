@@ -1,9 +1,13 @@
 
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 from django.contrib.auth import authenticate
 
 from .models import User, DoctorProfile, PatientProfile
+from .tokens import ProfileRefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
 
@@ -75,3 +79,30 @@ class PatientProfileSerializer(serializers.ModelSerializer):
         model = PatientProfile
         fields = '__all__'
 
+
+class ProfileTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that re-reads the user: inactive or deleted users get no new
+    tokens, and the role and profile claims are brought up to date.
+    """
+    token_class = ProfileRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh[jwt_settings.USER_ID_CLAIM]}, is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed('User is inactive or no longer exists', code='user_inactive')
+
+        refresh.set_profile_claims(user)
+        # Access tokens copy iat from the refresh token; it must not predate a revocation
+        refresh.set_iat()
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            data['refresh'] = str(refresh)
+
+        return data
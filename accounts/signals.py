@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .assignments import assignments_changed, invalidate_assignments
+from .authentication import revoke_tokens
+from .models import DoctorProfile, PatientProfile, User
+
+@receiver(post_save, sender=User)
+def revoke_tokens_of_inactive_user(sender, instance, **kwargs):
+    """Access tokens are not checked against the database; stop them explicitly"""
+    if not instance.is_active:
+        revoke_tokens(instance.pk)
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_of_deleted_user(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
+
+@receiver(pre_save, sender=PatientProfile)
+def invalidate_changed_assignment(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not {'assigned_doctor', 'assigned_doctor_id'} & set(update_fields):
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = sender._base_manager.using(using).filter(pk=instance.pk).values_list(
+            'assigned_doctor_id', flat=True
+        ).first()
+    if previous != instance.assigned_doctor_id:
+        assignments_changed(previous, instance.assigned_doctor_id, using=using)
+
+@receiver(post_delete, sender=PatientProfile)
+def invalidate_deleted_patient_assignment(sender, instance, using, **kwargs):
+    assignments_changed(instance.assigned_doctor_id, using=using)
+
+@receiver(post_delete, sender=DoctorProfile)
+def invalidate_deleted_doctor_assignments(sender, instance, **kwargs):
+    # Its patients were unassigned by SET_NULL, which sends no signals
+    invalidate_assignments(instance.pk)
@@ -1,3 +1,226 @@
-from django.test import TestCase
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from health_records.models import HealthRecord
+
+from . import assignments
+from .assignments import assigned_patient_ids
+from .models import User, DoctorProfile, PatientProfile
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag revalidation on profile and doctor list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create_user(username='doctor1', password='securepass123', user_type='DOCTOR')
+        cls.doctor = DoctorProfile.objects.create(
+            user=cls.doctor_user, specialization='General', license_number='DOC000001', years_of_experience=3
+        )
+        cls.patient_user = User.objects.create_user(username='patient1', password='securepass123', user_type='PATIENT')
+        cls.patient = PatientProfile.objects.create(user=cls.patient_user, emergency_contact='', assigned_doctor=cls.doctor)
+
+    def setUp(self):
+        self.client.force_authenticate(self.patient_user)
+
+    def test_profile_revalidation(self):
+        url = reverse('profile')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A change to the embedded assigned doctor must invalidate the patient's profile
+        self.doctor.specialization = 'Cardiology'
+        self.doctor.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned_doctor']['specialization'], 'Cardiology')
+
+    def test_available_doctors_revalidation(self):
+        url = reverse('available-doctors')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        new_user = User.objects.create_user(username='doctor2', password='securepass123', user_type='DOCTOR')
+        DoctorProfile.objects.create(user=new_user, specialization='General', license_number='DOC000002', years_of_experience=1)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ClaimsAuthenticationTests(APITestCase):
+    """Requests authenticated from token claims, without loading the user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create_user(username='doctor1', password='securepass123', user_type='DOCTOR')
+        cls.doctor = DoctorProfile.objects.create(
+            user=cls.doctor_user, specialization='General', license_number='DOC000001', years_of_experience=3
+        )
+        cls.patient_user = User.objects.create_user(username='patient1', password='securepass123', user_type='PATIENT')
+        cls.patient = PatientProfile.objects.create(user=cls.patient_user, emergency_contact='', assigned_doctor=cls.doctor)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, username):
+        response = self.client.post(reverse('login'), {'username': username, 'password': 'securepass123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['tokens']
+
+    def get(self, url, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_tokens_carry_role_and_profile(self):
+        access = AccessToken(self.login('doctor1')['access'])
+        self.assertEqual((access['user_type'], access['profile_id']), ('DOCTOR', self.doctor.pk))
+
+        response = self.client.post(reverse('register'), {
+            'username': 'patient2', 'email': 'p2@example.com', 'password': 'securepass123',
+            'password_confirm': 'securepass123', 'user_type': 'PATIENT'
+        })
+        access = AccessToken(response.data['tokens']['access'])
+        self.assertEqual(access['profile_id'], PatientProfile.objects.get(user__username='patient2').pk)
+
+    def test_requests_do_not_load_the_user_or_profile(self):
+        for username in ('patient1', 'doctor1'):
+            response, queries = self.get(reverse('health-record-list') + '?fields=id,title', self.login(username)['access'])
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([sql for sql in queries if 'accounts_' in sql], queries)
+
+    def test_deactivated_users_are_locked_out(self):
+        tokens = self.login('patient1')
+        self.patient_user.is_active = False
+        self.patient_user.save()
+
+        response, _ = self.get(reverse('health-record-list'), tokens['access'])
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_local_cache_falls_back_to_the_database(self):
+        access = self.login('patient1')['access']
+        response, queries = self.get(reverse('health-record-list'), access)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue([sql for sql in queries if 'accounts_user' in sql], queries)
+
+        # Deactivated in another process: no revocation marker in this one
+        User.objects.filter(pk=self.patient_user.pk).update(is_active=False)
+        response, _ = self.get(reverse('health-record-list'), access)
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_renews_claims(self):
+        # Issued before the claims existed: authenticated from the database, upgraded on refresh
+        refresh = RefreshToken.for_user(self.patient_user)
+        response, _ = self.get(reverse('health-record-list'), str(refresh.access_token))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        access = AccessToken(response.data['access'])
+        self.assertEqual((access['user_type'], access['profile_id']), ('PATIENT', self.patient.pk))
+        self.assertIn('refresh', response.data)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class AssignmentCacheTests(APITestCase):
+    """Assigned patient ids are cached per doctor and follow every way of reassigning"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'doctor{i}', password='securepass123', user_type='DOCTOR')
+            cls.doctors.append(DoctorProfile.objects.create(
+                user=user, specialization='General', license_number=f'DOC00000{i}', years_of_experience=3
+            ))
+        cls.patients = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'patient{i}', password='securepass123', user_type='PATIENT')
+            cls.patients.append(PatientProfile.objects.create(user=user, emergency_contact='', assigned_doctor=cls.doctors[0]))
+
+    def setUp(self):
+        cache.clear()
+
+    def assertAssigned(self, doctor, patients):
+        self.assertEqual(assigned_patient_ids(doctor.pk), {patient.pk for patient in patients})
+
+    def test_repeated_checks_do_not_query(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+        with self.assertNumQueries(0):
+            self.assertAssigned(self.doctors[0], self.patients)
+
+    def test_local_copies_expire_and_are_bounded(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+        expires = assignments._local[self.doctors[0].pk][2]
+        with patch.object(assignments.time, 'monotonic', return_value=expires + 1):
+            self.assertAssigned(self.doctors[0], self.patients)
+        self.assertGreater(assignments._local[self.doctors[0].pk][2], expires)
+
+        with patch.object(assignments, 'LOCAL_SIZE', 1):
+            self.assertAssigned(self.doctors[1], [])
+            self.assertEqual(list(assignments._local), [self.doctors[1].pk])
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_without_a_shared_cache_every_check_reads_the_database(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+        # A version bump in another process would not be seen here
+        with self.assertNumQueries(1):
+            self.assertAssigned(self.doctors[0], self.patients)
+
+    def test_assign_view_moves_the_patient(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+        self.assertAssigned(self.doctors[1], [])
+
+        self.client.force_authenticate(self.doctors[1].user)
+        response = self.client.post(reverse('assign-doctor'), {'patient_id': self.patients[0].pk})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertAssigned(self.doctors[0], self.patients[1:])
+        self.assertAssigned(self.doctors[1], self.patients[:1])
+
+    def test_queryset_updates_invalidate(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+
+        PatientProfile.objects.filter(pk=self.patients[0].pk).update(assigned_doctor=self.doctors[1])
+        self.assertAssigned(self.doctors[0], self.patients[1:])
+        self.assertAssigned(self.doctors[1], self.patients[:1])
+
+        patient = PatientProfile.objects.get(pk=self.patients[1].pk)
+        patient.assigned_doctor = self.doctors[1]
+        PatientProfile.objects.bulk_update([patient], ['assigned_doctor'])
+        self.assertAssigned(self.doctors[0], [])
+        self.assertAssigned(self.doctors[1], self.patients)
+
+    def test_deleting_profiles_invalidates(self):
+        self.assertAssigned(self.doctors[0], self.patients)
+
+        self.patients[1].user.delete()
+        self.assertAssigned(self.doctors[0], self.patients[:1])
+
+        doctor_id = self.doctors[0].pk
+        self.doctors[0].delete()
+        self.assertEqual(assigned_patient_ids(doctor_id), set())
+
+    def test_unassigned_doctor_loses_access(self):
+        record = HealthRecord.objects.create(
+            patient=self.patients[0], record_type='CHECKUP', title='Visit', description='Routine checkup',
+            visit_date='2024-01-01T00:00:00Z', created_by=self.patients[0].user
+        )
+        url = reverse('add-doctor-comment', args=[record.pk])
+        self.client.force_authenticate(self.doctors[0].user)
+        self.assertEqual(self.client.post(url, {'comment': 'First'}).status_code, 201)
+
+        self.patients[0].assigned_doctor = self.doctors[1]
+        self.patients[0].save()
+        self.assertEqual(self.client.post(url, {'comment': 'Second'}).status_code, 403)
@@ -0,0 +1,27 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import DoctorProfile, PatientProfile
+
+def profile_claims(user):
+    """Claims that let ClaimsJWTAuthentication resolve the user without a query"""
+    profile_model = DoctorProfile if user.user_type == 'DOCTOR' else PatientProfile
+    return {
+        'user_type': user.user_type,
+        'profile_id': profile_model.objects.filter(user_id=user.pk).values_list('id', flat=True).first(),
+    }
+
+class ProfileRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role and profile id. Access tokens
+    minted from it copy both claims.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_profile_claims(user)
+        return token
+
+    def set_profile_claims(self, user):
+        for claim, value in profile_claims(user).items():
+            self[claim] = value
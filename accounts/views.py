@@ -1,11 +1,19 @@
 from rest_framework import status, generics, permissions, serializers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import ProfileRefreshToken
 from django.contrib.auth import authenticate
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from health_record_api.conditional import (
+    ConditionalGetMixin,
+    latest,
+    make_etag,
+    not_modified_response,
+    set_validators
+)
 from .models import User, DoctorProfile, PatientProfile
 from .serializers import (
     UserRegistrationSerializer, 
@@ -58,7 +66,7 @@ def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = ProfileRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'tokens': {
@@ -94,7 +102,7 @@ def login(request):
     
     user = authenticate(username=username, password=password)
     if user:
-        refresh = RefreshToken.for_user(user)
+        refresh = ProfileRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'tokens': {
@@ -107,7 +115,7 @@ def login(request):
         status=status.HTTP_401_UNAUTHORIZED
     )
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class ProfileView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     @swagger_auto_schema(
         operation_summary="Get User Profile",
@@ -124,6 +132,19 @@ class ProfileView(generics.RetrieveUpdateAPIView):
             return DoctorProfileSerializer
         return PatientProfileSerializer
     
+    def get_validators(self, request, *args, **kwargs):
+        user = request.user
+        if user.user_type == 'DOCTOR':
+            row = DoctorProfile.objects.filter(user=user).values_list('updated_at').first()
+        else:
+            row = PatientProfile.objects.filter(user=user).values_list(
+                'updated_at', 'assigned_doctor__updated_at', 'assigned_doctor__user__updated_at'
+            ).first()
+        
+        if row is None:
+            return None
+        return (user.updated_at, *row), latest(user.updated_at, *row)
+    
     def get_object(self):
         if self.request.user.user_type == 'DOCTOR':
             return DoctorProfile.objects.get(user=self.request.user)
@@ -170,6 +191,9 @@ def assign_doctor_to_patient(request):
         patient.assigned_doctor = doctor
         patient.save()
         
+        from health_records.cache import invalidate_patient
+        invalidate_patient(patient.id, doctor.id, old_doctor.id if old_doctor else None)
+        
         # Send notification to new doctor
         if old_doctor != doctor:
             from notifications.tasks import send_patient_assignment_notification
@@ -203,5 +227,15 @@ def assign_doctor_to_patient(request):
 @permission_classes([permissions.IsAuthenticated])
 def available_doctors(request):
     """List all available doctors for assignment"""
-    doctors = DoctorProfile.objects.all()
-    return Response(DoctorProfileSerializer(doctors, many=True).data)
+    stats = DoctorProfile.objects.aggregate(
+        last_update=Max('updated_at'),
+        last_user_update=Max('user__updated_at'),
+        count=Count('id')
+    )
+    etag = make_etag(request.get_full_path(), *stats.values())
+    
+    response = not_modified_response(request, etag)
+    if response is None:
+        doctors = DoctorProfile.objects.select_related('user')
+        response = Response(DoctorProfileSerializer(doctors, many=True).data)
+    return set_validators(response, etag)
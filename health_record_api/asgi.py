@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "health_record_api.settings")
+# Persistent connections are per thread, and ASGI runs each request in a new one
+os.environ.setdefault("DJANGO_SERVER_INTERFACE", "asgi")
 
 application = get_asgi_application()
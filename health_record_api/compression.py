@@ -0,0 +1,198 @@
+"""
+Accept-Encoding negotiated response compression: zstd, brotli and gzip.
+
+zstd and brotli are used when their libraries (zstandard, Brotli) are
+installed; gzip is always available. Among the encodings the client accepts,
+the highest q-value wins and ties go to available_encodings() order. Bodies below
+COMPRESSION_MIN_SIZE are sent as is; streamed responses are compressed
+chunk by chunk, so they still stream.
+"""
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Already-compressed media gains nothing from another pass
+INCOMPRESSIBLE_TYPES = ('image/', 'video/', 'audio/', 'application/zip', 'application/gzip', 'application/zstd')
+
+STREAM_FLUSH_SIZE = 16 * 1024
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+class _GzipStream:
+    """Incremental gzip with the same framing as gzip.compress()"""
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        # Sync flush so every chunk is decodable as soon as it is sent
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+class _BrotliStream:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+class _ZstdStream:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def available_encodings():
+    """Supported encodings in server preference order"""
+    # zstd first: about brotli's ratio at default levels for a fraction of the
+    # CPU (see the benchmark_compression command)
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+def compression_level(encoding):
+    return settings.COMPRESSION_LEVELS[encoding]
+
+def compress(encoding, data, level=None):
+    """Compress a whole body in one go"""
+    level = compression_level(encoding) if level is None else level
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def compress_stream(encoding, chunks, level=None):
+    """
+    Compress an iterable of byte chunks. Output is flushed every
+    STREAM_FLUSH_SIZE bytes of input: often enough to keep the response
+    streaming, rarely enough that row-sized chunks still compress well.
+    """
+    level = compression_level(encoding) if level is None else level
+    stream = {'br': _BrotliStream, 'zstd': _ZstdStream, 'gzip': _GzipStream}[encoding](level)
+    pending = 0
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            data += stream.flush()
+            pending = 0
+        if data:
+            yield data
+    yield stream.finish()
+
+def negotiate(accept_encoding, encodings):
+    """Pick an encoding from the Accept-Encoding header, or None for identity"""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if not match:
+            continue
+        name, q = match.group(1).lower(), match.group(2)
+        try:
+            qualities[name] = float(q) if q is not None else 1.0
+        except ValueError:
+            continue
+
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = qualities.get(encoding, qualities.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class CompressionMiddleware:
+    """
+    Compress responses with the best encoding the client accepts.
+
+    Place it near the top of MIDDLEWARE so it sees the final body. Skipped for
+    responses that are already encoded, partial (206/Content-Range) or open
+    to range requests (Accept-Ranges), of an incompressible media type,
+    smaller than COMPRESSION_MIN_SIZE, or served under
+    COMPRESSION_EXCLUDE_PATHS (responses that carry secrets next to reflected
+    input, where compression enables BREACH-style attacks).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encodings = available_encodings()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not self.should_compress(request, response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(encoding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation of the same resource
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, request, response):
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return False
+        if response.status_code == 206:
+            return False
+        # Byte ranges refer to the uncompressed file, and compressing it would
+        # defeat FileResponse's sendfile path
+        if response.has_header('Accept-Ranges'):
+            return False
+        if request.path.startswith(tuple(settings.COMPRESSION_EXCLUDE_PATHS)):
+            return False
+        if response.get('Content-Type', '').startswith(INCOMPRESSIBLE_TYPES):
+            return False
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return False
+        return True
@@ -0,0 +1,68 @@
+"""
+Conditional GET support for DRF views.
+
+Validators are computed from cheap aggregate queries over updated_at columns
+instead of hashing the rendered body, so a matching If-None-Match or
+If-Modified-Since is answered with 304 Not Modified before any serialization.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+def make_etag(*parts):
+    """Hash the parts that determine a representation into an opaque ETag value"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode(), usedforsecurity=False)
+    return digest.hexdigest()
+
+def latest(*timestamps):
+    """Most recent of the given datetimes, ignoring None"""
+    timestamps = [ts for ts in timestamps if ts is not None]
+    return max(timestamps) if timestamps else None
+
+def not_modified_response(request, etag, last_modified=None):
+    """Return a 304 response if the client's cached copy is still current, else None"""
+    return get_conditional_response(
+        request,
+        etag=quote_etag(etag),
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Responses are per user: let clients revalidate, keep shared caches out
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified handling to a generic view's GET.
+
+    Views implement get_validators(request, *args, **kwargs) returning
+    (etag_parts, last_modified). Returning None skips conditional handling,
+    e.g. when the object does not exist and the normal path should 404.
+    The user and full path are always part of the ETag because the same URL
+    renders differently per user and per query string.
+    """
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag_parts, last_modified = validators
+        etag = make_etag(request.user.pk, request.get_full_path(), *etag_parts)
+        self.etag, self.last_modified = etag, last_modified
+
+        response = not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return set_validators(response, etag, last_modified)
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError('ConditionalGetMixin views must implement get_validators()')
@@ -0,0 +1,173 @@
+"""
+Read-replica routing with read-your-writes pinning.
+
+Within a request handled by ReplicaRoutingMiddleware, reads made by a GET,
+HEAD or OPTIONS request go to one of DATABASE_REPLICAS. Everything else uses
+the primary: writes, other methods, reads after the request wrote, and code
+outside a request (Celery tasks, management commands).
+
+A user who wrote is pinned to the primary for REPLICA_PIN_SECONDS, so they
+see their own writes from any device. The cache principals a write
+invalidates are pinned too, which keeps a lagging replica from refilling the
+response cache with stale data. Each process measures replica lag at most
+every LAG_CHECK_INTERVAL seconds. Replicas further behind than
+REPLICA_MAX_LAG_SECONDS, not receiving WAL from the primary, or whose probe
+fails (bounded by the connect and statement timeouts set in settings), are
+skipped.
+
+Pins live in the cache, so they only reach the other workers through a
+shared one (CACHE_IS_SHARED). Without it every read goes to the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+LAG_CHECK_INTERVAL = 2
+PIN_KEY_PREFIX = 'db:pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# (receiving WAL, seconds behind the primary). Lag is 0 once everything
+# received has been replayed, which says nothing once the WAL receiver is
+# gone: pg_stat_wal_receiver has a row only while it runs.
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT EXISTS (SELECT 1 FROM pg_stat_wal_receiver), '
+        'CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+    ),
+}
+
+_routing = ContextVar('db_routing', default=None)
+# alias -> (monotonic time of the check, lag in seconds or None if unusable)
+_lag = {}
+
+class _RequestRouting:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+def replica_lag(alias):
+    """Seconds `alias` is behind the primary, or None if it is not replicating or cannot be reached"""
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor)
+    if query is None:
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            receiving, lag = cursor.fetchone()
+    except DatabaseError:
+        # Counts as lagging; drop the connection so requests don't reuse it
+        connection.close()
+        return None
+    if not receiving:
+        return None
+    return float(lag or 0)
+
+def healthy_replicas():
+    now = time.monotonic()
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        checked_at, lag = _lag.get(alias, (None, None))
+        if checked_at is None or now - checked_at >= LAG_CHECK_INTERVAL:
+            lag = replica_lag(alias)
+            _lag[alias] = (now, lag)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+            healthy.append(alias)
+    return healthy
+
+def pin(*keys):
+    """Send reads for these keys (user ids, cache principals) to the primary for a while"""
+    if settings.DATABASE_REPLICAS and settings.CACHE_IS_SHARED and keys:
+        cache.set_many({f'{PIN_KEY_PREFIX}:{key}': True for key in keys}, settings.REPLICA_PIN_SECONDS)
+
+def is_pinned(key):
+    return cache.get(f'{PIN_KEY_PREFIX}:{key}') is not None
+
+def use_primary():
+    """Read from the primary for the rest of the current request"""
+    state = _routing.get()
+    if state is not None:
+        state.replica = None
+
+def use_primary_if_pinned(key):
+    state = _routing.get()
+    if state is not None and state.replica is not None and is_pinned(key):
+        state.replica = None
+
+def token_user_id(request):
+    """User id claimed by a valid bearer token, without touching the database"""
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        return AccessToken(header[1])[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None:
+            return None
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # Whatever the request reads next has to include this write
+            state.replica = None
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+class ReplicaRoutingMiddleware:
+    """
+    Choose the database for the request's reads, and pin the user to the
+    primary once the request has written.
+
+    Streamed response bodies are produced after this returns, so they read
+    from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS or not settings.CACHE_IS_SHARED:
+            return self.get_response(request)
+
+        user_id = token_user_id(request)
+        replica = None
+        if request.method in SAFE_METHODS and not (user_id and is_pinned(f'user:{user_id}')):
+            replicas = healthy_replicas()
+            replica = random.choice(replicas) if replicas else None
+
+        state = _RequestRouting(replica)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if state.wrote:
+            # DRF hands the user it authenticated back to the HttpRequest
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                user_id = user.pk
+            if user_id:
+                pin(f'user:{user_id}')
+        return response
@@ -0,0 +1,69 @@
+"""
+orjson-backed drop-in replacements for DRF's JSONRenderer and JSONParser.
+
+Output matches JSONRenderer byte for byte under the default settings
+(COMPACT_JSON, UNICODE_JSON): datetimes are ISO 8601 with a trailing Z for
+UTC, decimals go through the same encoder default, and U+2028/U+2029 are
+escaped. Floats are where the two differ: outside [1e-4, 1e16) orjson writes
+1e22 rather than 1e+22 (same value), and it writes NaN as null where strict
+mode would raise. The search `rank` is the only float we emit. On input,
+orjson reads integers wider than 64 bits as floats; no field here accepts
+such values, and they fail validation either way.
+
+Anything else orjson cannot handle the same way (indented output, non-string
+keys, non-UTF-8 request bodies, a missing orjson) goes through the stdlib
+classes unchanged.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UTF8_NAMES = ('utf-8', 'utf8')
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_UTC_Z)
+        except orjson.JSONEncodeError:
+            # Let the stdlib either encode it or raise its usual error
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same JavaScript-safe escaping as JSONRenderer; in UTF-8 these byte
+        # sequences can only be the two characters themselves
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        raw = stream.read()
+
+        if encoding.lower() in UTF8_NAMES:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+
+        # Anything orjson rejected gets the stdlib's result or error message
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(raw.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 from datetime import timedelta
 import dj_database_url
 
@@ -52,11 +52,13 @@ REDOC_SETTINGS = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'health_record_api.compression.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'health_record_api.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,6 +83,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'health_record_api.wsgi.application'
 
+# PostgreSQL 13 or later: the health record table is partitioned by year
+# (health_records/partitions.py) and migration 0008 refuses older servers.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -109,11 +113,21 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON, byte-compatible with DRF's own (see fastjson.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'health_record_api.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'health_record_api.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -122,11 +136,70 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.ProfileTokenRefreshSerializer',
+}
+
+# Cache: local memory per process by default, shared Redis when configured.
+# Health record reads are cached per patient/doctor (see health_records/cache.py)
+# only with a shared cache, see CACHE_IS_SHARED.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+HEALTH_RECORD_CACHE_TIMEOUT = config('HEALTH_RECORD_CACHE_TIMEOUT', default=300, cast=int)
+# Seconds a doctor's assigned patient ids stay in the shared cache and in each
+# process's local copy (see accounts/assignments.py)
+ASSIGNMENT_CACHE_TIMEOUT = config('ASSIGNMENT_CACHE_TIMEOUT', default=3600, cast=int)
+
+# archive_health_records moves records whose visit and last update are older
+# than this into the compressed archive (see health_records/archive.py)
+HEALTH_RECORD_ARCHIVE_AFTER_DAYS = config('HEALTH_RECORD_ARCHIVE_AFTER_DAYS', default=5 * 365, cast=int)
+
+# Health record attachments (see health_records/attachments.py)
+ATTACHMENT_ROOT = config('ATTACHMENT_ROOT', default=os.path.join(BASE_DIR, 'attachments'))
+ATTACHMENT_MAX_SIZE = config('ATTACHMENT_MAX_SIZE', default=100 * 1024 * 1024, cast=int)
+ATTACHMENT_CHUNK_MAX_SIZE = config('ATTACHMENT_CHUNK_MAX_SIZE', default=8 * 1024 * 1024, cast=int)
+ATTACHMENT_UPLOAD_EXPIRY_HOURS = config('ATTACHMENT_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+# Internal nginx location aliased to ATTACHMENT_ROOT, e.g. /protected-attachments/.
+# When set, downloads are handed to nginx with X-Accel-Redirect.
+ATTACHMENT_ACCEL_REDIRECT_PREFIX = config('ATTACHMENT_ACCEL_REDIRECT_PREFIX', default='')
+
+# Response compression (see health_record_api/compression.py). brotli and zstd
+# are offered only when the Brotli / zstandard packages are installed.
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_LEVELS = {
+    'br': config('COMPRESSION_LEVEL_BROTLI', default=4, cast=int),
+    'zstd': config('COMPRESSION_LEVEL_ZSTD', default=3, cast=int),
+    'gzip': config('COMPRESSION_LEVEL_GZIP', default=6, cast=int),
 }
+# Token responses: never compress secrets alongside attacker-influenced input
+COMPRESSION_EXCLUDE_PATHS = ['/api/auth/login/', '/api/auth/register/', '/api/auth/token/']
 
 # Celery Configuration (Default for local development)
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379')
+# Periodic tasks, run by `celery -A health_record_api beat`
+CELERY_BEAT_SCHEDULE = {
+    'ensure-record-partitions': {
+        'task': 'health_records.tasks.ensure_record_partitions',
+        'schedule': timedelta(days=1),
+    },
+    'prune-attachments': {
+        'task': 'health_records.tasks.prune_attachments',
+        'schedule': timedelta(hours=6),
+    },
+}
 
 # Railway production settings
 if 'RAILWAY_ENVIRONMENT' in os.environ or os.environ.get('PORT'):
@@ -145,6 +218,15 @@ if 'RAILWAY_ENVIRONMENT' in os.environ or os.environ.get('PORT'):
     # Use Railway's managed Redis
     CELERY_BROKER_URL = os.environ.get('REDIS_URL')
     CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL')
+    
+    # Share the response cache across workers
+    if os.environ.get('REDIS_URL'):
+        CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': os.environ.get('REDIS_URL'),
+            }
+        }
 
     # Static files configuration
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -170,6 +252,70 @@ if 'RAILWAY_ENVIRONMENT' in os.environ or os.environ.get('PORT'):
         CELERY_BROKER_URL = os.environ.get('REDIS_URL')
         CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL')
 
+# True when every process (web workers, Celery, management commands) uses the
+# same cache. Cache-based invalidation only reaches other processes through a
+# shared backend, so the response cache (health_records/cache.py) is off
+# without one: a per-process LocMemCache would keep serving a doctor records
+# of a patient unassigned in another process. Likewise access tokens are
+# checked against the database instead of cached revocations
+# (accounts/authentication.py).
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Longest the activity feed holds an empty response open for ?wait=N. Each
+# waiting client occupies a worker for the whole wait, so with sync gunicorn
+# workers (start.sh, Procfile) one client would block the API. Only raise it
+# with workers that can hold many idle requests (e.g. gunicorn -k gevent) and
+# a shared cache, which is how the wait learns about new rows. 0 disables it.
+FEED_MAX_WAIT = config('FEED_MAX_WAIT', default=0, cast=int)
+
+# Read replicas (see health_record_api/db_routing.py): comma-separated database
+# URLs, added as replica1, replica2, ... GET requests read from a replica that
+# is at most REPLICA_MAX_LAG_SECONDS behind; after a write the user is pinned
+# to the primary for REPLICA_PIN_SECONDS, which must exceed the maximum lag.
+# Pins are kept in the cache, so replicas are only used with a shared one
+# (CACHE_IS_SHARED); otherwise all reads go to the primary.
+# Replica connections and queries give up after REPLICA_CONNECT_TIMEOUT and
+# REPLICA_STATEMENT_TIMEOUT seconds, so an unreachable replica fails its lag
+# probe quickly and reads go to the primary instead of hanging a worker.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+REPLICA_CONNECT_TIMEOUT = config('REPLICA_CONNECT_TIMEOUT', default=2, cast=int)
+REPLICA_STATEMENT_TIMEOUT = config('REPLICA_STATEMENT_TIMEOUT', default=30, cast=int)
+for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    replica = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+    if 'postgresql' in replica['ENGINE']:
+        options = replica.setdefault('OPTIONS', {})
+        options.setdefault('connect_timeout', REPLICA_CONNECT_TIMEOUT)
+        options['options'] = (
+            f"{options.get('options', '')} -c statement_timeout={REPLICA_STATEMENT_TIMEOUT * 1000}"
+        ).strip()
+    DATABASES[f'replica{number}'] = replica
+DATABASE_REPLICAS = [f'replica{number}' for number in range(1, len(DATABASE_REPLICA_URLS) + 1)]
+DATABASE_ROUTERS = ['health_record_api.db_routing.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=3, cast=float)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Database connections (compare modes with the benchmark_connections command).
+# Under WSGI every worker thread keeps one connection per database alias open
+# for DB_CONN_MAX_AGE seconds and pings it before reusing it after an error, so
+# gunicorn workers x threads x aliases must stay below max_connections.
+# Under ASGI each request runs in its own thread, so connections are not kept
+# and pooling belongs in PgBouncer. Set DB_TRANSACTION_POOLING behind PgBouncer
+# in transaction mode, which cannot hold server-side cursors across queries;
+# exports are then fetched in full instead of streamed from the database.
+SERVER_INTERFACE = os.environ.get('DJANGO_SERVER_INTERFACE', 'wsgi')
+DB_CONN_MAX_AGE = 0 if SERVER_INTERFACE == 'asgi' else config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+DB_TRANSACTION_POOLING = config('DB_TRANSACTION_POOLING', default=False, cast=bool)
+for database in DATABASES.values():
+    database.update(
+        CONN_MAX_AGE=DB_CONN_MAX_AGE,
+        CONN_HEALTH_CHECKS=DB_CONN_HEALTH_CHECKS,
+        DISABLE_SERVER_SIDE_CURSORS=DB_TRANSACTION_POOLING,
+    )
+
 AUTH_USER_MODEL = 'accounts.User'
 
 LANGUAGE_CODE = 'en-us'
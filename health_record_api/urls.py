@@ -108,11 +108,11 @@ def api_docs(request):
                     'auth_required': False
                 },
                 'POST /api/auth/token/refresh/': {
-                    'description': 'Refresh access token',
+                    'description': 'Refresh access token; fails once the user is deactivated',
                     'body': {
                         'refresh': 'string (required)'
                     },
-                    'response': 'New access token',
+                    'response': 'New access and rotated refresh token',
                     'auth_required': False
                 },
                 'GET /api/auth/profile/': {
@@ -143,6 +143,20 @@ def api_docs(request):
             'Health Records': {
                 'GET /api/health-records/': {
                     'description': 'List health records (patients: own records, doctors: assigned patients)',
+                    'query_params': {
+                        'record_type': 'comma-separated record types (optional)',
+                        'visit_date__gte': 'YYYY-MM-DD or ISO datetime (optional)',
+                        'visit_date__lte': 'YYYY-MM-DD (whole day) or ISO datetime (optional)',
+                        'patient_id': 'integer (optional, doctors: one patient of the panel)',
+                        'has_comments': 'true or false (optional)',
+                        'ids': 'comma-separated record ids, max 100 (optional, unpaginated results plus not_found ids)',
+                        'fields': 'comma-separated field names (optional, e.g. id,title,record_type,visit_date)',
+                        'expand': 'comments and/or created_by (optional, embeds are opt-in once fields or expand is given)',
+                        'page': 'integer (optional, page-number pagination)',
+                        'pagination': 'cursor (optional, keyset pagination without page counts)',
+                        'cursor': 'string (optional, from next/previous links in cursor mode)',
+                        'page_size': 'integer (optional, cursor mode only, max 100)'
+                    },
                     'response': 'Paginated list of health records',
                     'auth_required': True
                 },
@@ -162,14 +176,71 @@ def api_docs(request):
                     'auth_required': True,
                     'permissions': 'Patients only'
                 },
+                'POST /api/health-records/batch/': {
+                    'description': 'Create up to 500 health records at once (patients only); all or nothing',
+                    'body': {
+                        'records': 'list of health record objects, same fields as POST /api/health-records/'
+                    },
+                    'response': 'Count and ids of the created records, or per-item errors by index',
+                    'auth_required': True,
+                    'permissions': 'Patients only'
+                },
+                'GET /api/health-records/export/': {
+                    'description': 'Stream the complete visible history with permitted comments',
+                    'query_params': {
+                        'export_format': 'ndjson (default) or csv',
+                        'record_type, visit_date__gte, visit_date__lte': 'same filters as the list (optional)',
+                        'fields': 'comma-separated field names (optional)',
+                        'expand': 'comments and/or created_by (optional)',
+                        'include_archived': 'boolean (optional, default false)'
+                    },
+                    'response': 'NDJSON or CSV file, one record per line, newest visit first',
+                    'auth_required': True
+                },
+                'GET /api/health-records/feed/': {
+                    'description': 'New records and comments across all visible patients, oldest first after a cursor',
+                    'query_params': {
+                        'cursor': 'string (optional, from the previous response; omit to start from now)',
+                        'limit': 'integer (optional, default 50, max 200)',
+                        'wait': 'integer seconds (optional, max 25, long-poll while nothing is new where enabled by FEED_MAX_WAIT)'
+                    },
+                    'response': 'results, cursor and has_more',
+                    'auth_required': True
+                },
+                'GET /api/health-records/search/': {
+                    'description': 'Ranked full-text search over clinical text of visible records',
+                    'query_params': {
+                        'q': 'string (required)',
+                        'record_type': 'comma-separated record types (optional)',
+                        'fields': 'comma-separated field names (optional)',
+                        'expand': 'comments and/or created_by (optional)'
+                    },
+                    'response': 'Paginated list of health records with rank, best match first',
+                    'auth_required': True
+                },
+                'GET /api/health-records/sync/': {
+                    'description': 'Records created/updated and ids deleted since a sync token (full sync without one)',
+                    'query_params': {
+                        'token': 'string (optional, from the previous sync response)',
+                        'limit': 'integer (optional, default 100, max 500)',
+                        'fields': 'comma-separated field names (optional)',
+                        'expand': 'comments and/or created_by (optional)'
+                    },
+                    'response': 'updated, deleted, token and has_more; 410 when the token can no longer be used, e.g. the assigned patients changed (sync again without one)',
+                    'auth_required': True
+                },
                 'GET /api/health-records/{id}/': {
                     'description': 'Get specific health record',
-                    'response': 'Health record with doctor comments',
+                    'query_params': {
+                        'fields': 'comma-separated field names (optional)',
+                        'expand': 'comments and/or created_by (optional)'
+                    },
+                    'response': 'Health record with doctor comments; archived records included',
                     'auth_required': True,
                     'permissions': 'Record owner or assigned doctor'
                 },
                 'PUT /api/health-records/{id}/': {
-                    'description': 'Update health record (patients only)',
+                    'description': 'Update health record (patients only); archived records are read-only (409)',
                     'body': 'Health record fields to update',
                     'auth_required': True,
                     'permissions': 'Record owner only'
@@ -189,9 +260,46 @@ def api_docs(request):
                     'auth_required': True,
                     'permissions': 'Assigned doctor only'
                 },
+                'GET /api/health-records/{id}/attachments/': {
+                    'description': 'Files attached to a health record',
+                    'response': 'List of attachments with size, sha256 and download_url',
+                    'auth_required': True,
+                    'permissions': 'Record owner or assigned doctor'
+                },
+                'POST /api/health-records/{id}/attachments/': {
+                    'description': 'Start a chunked attachment upload',
+                    'body': {
+                        'filename': 'string (required)',
+                        'size': 'integer bytes (required)',
+                        'content_type': 'string (optional, default: application/octet-stream)'
+                    },
+                    'response': 'Upload with id, received and upload_url',
+                    'auth_required': True,
+                    'permissions': 'Record owner or assigned doctor'
+                },
+                'PUT /api/health-records/attachments/uploads/{upload_id}/': {
+                    'description': 'Send the next chunk as raw bytes; GET shows progress, DELETE abandons',
+                    'headers': {
+                        'Content-Range': 'bytes <first>-<last>/<size>, starting at the received offset'
+                    },
+                    'response': 'Upload progress, or the created attachment after the last chunk',
+                    'auth_required': True,
+                    'permissions': 'User who started the upload'
+                },
+                'GET /api/health-records/attachments/{id}/download/': {
+                    'description': 'Download an attachment; supports Range, If-Range and If-None-Match',
+                    'response': 'File content (206 for a byte range)',
+                    'auth_required': True,
+                    'permissions': 'Record owner or assigned doctor'
+                },
                 'GET /api/health-records/my-patients/': {
                     'description': 'List patients assigned to current doctor',
-                    'response': 'Array of patient summaries with record counts',
+                    'query_params': {
+                        'name': 'words matched against first/last name (optional)',
+                        'ordering': 'last_visit, -last_visit (default), total_records, -total_records, name or -name (optional)',
+                        'page': 'integer (optional)'
+                    },
+                    'response': 'Paginated patient summaries with record counts per type, last visit and unreviewed records',
                     'auth_required': True,
                     'permissions': 'Doctors only'
                 }
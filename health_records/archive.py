@@ -0,0 +1,159 @@
+"""
+Cold archive for old health records.
+
+archive_records() moves records whose visit and last update are both older
+than a cutoff out of the hot table. Each record becomes one
+ArchivedHealthRecord row: the record and its comments as zlib-compressed
+JSON, next to the few columns that scoping, filtering and ordering need.
+The record keeps its id. Patient summaries still count archived records.
+Archiving is not a deletion, so synced clients get no tombstone and keep
+their copy. Attachments stay where they are, under the same record id.
+
+Archived records are read-only. The detail endpoint returns them, DELETE
+removes them, and the export endpoint includes them with
+?include_archived=true. They are not searchable and do not appear in list,
+feed or sync responses.
+"""
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from accounts.models import DoctorProfile, User
+from .cache import invalidate_patient, invalidate_patients
+from .models import (
+    ArchivedHealthRecord, DeletedHealthRecord, DoctorComment, HealthRecord, HealthRecordAttachment, HealthRecordQuerySet,
+    PatientRecordSummary
+)
+
+BATCH_SIZE = 500
+COMPRESSION_LEVEL = 9
+
+def _default(value):
+    # Full precision, unlike DjangoJSONEncoder, which drops microseconds
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _dump(instance):
+    return {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+
+def _load(model, values):
+    """Unsaved model instance from _dump() output"""
+    return model(**{
+        field.attname: field.to_python(values[field.attname])
+        for field in model._meta.concrete_fields if field.attname in values
+    })
+
+def encode(record, comments):
+    payload = {'record': _dump(record), 'comments': [_dump(comment) for comment in comments]}
+    return zlib.compress(json.dumps(payload, default=_default, separators=(',', ':')).encode(), COMPRESSION_LEVEL)
+
+def decode(data):
+    return json.loads(zlib.decompress(data))
+
+def archive_records(before, batch_size=BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Move records with visit_date and updated_at before `before` into the
+    archive, one transaction per batch. Returns the number of records moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic(using=using):
+            records = list(
+                HealthRecord.objects.using(using).filter(visit_date__lt=before, updated_at__lt=before)
+                .order_by('visit_date', 'id').select_for_update()[:batch_size]
+            )
+            if not records:
+                return moved
+
+            ids = [record.pk for record in records]
+            comments = {}
+            for comment in DoctorComment.objects.using(using).filter(health_record_id__in=ids).order_by('-created_at'):
+                comments.setdefault(comment.health_record_id, []).append(comment)
+
+            ArchivedHealthRecord.objects.using(using).bulk_create([
+                ArchivedHealthRecord(
+                    id=record.pk,
+                    patient_id=record.patient_id,
+                    created_by_id=record.created_by_id,
+                    record_type=record.record_type,
+                    visit_date=record.visit_date,
+                    comment_count=len(comments.get(record.pk, [])),
+                    public_comment_count=sum(not c.is_private for c in comments.get(record.pk, [])),
+                    data=encode(record, comments.get(record.pk, [])),
+                )
+                for record in records
+            ])
+
+            # Plain DELETEs: the rows live on in the archive, so none of the
+            # per-row delete signals (tombstones, summaries, cache) apply
+            DoctorComment.objects.using(using).filter(health_record_id__in=ids)._raw_delete(using)
+            HealthRecord.objects.using(using).filter(pk__in=ids)._raw_delete(using)
+
+            patient_ids = {record.patient_id for record in records}
+            PatientRecordSummary.objects.db_manager(using).refresh(patient_ids)
+            invalidate_patients(patient_ids, using=using)
+        moved += len(records)
+
+def materialize(rows, user, fields=None, expand=None):
+    """
+    Unsaved HealthRecord instances for archive rows, prepared like
+    HealthRecordQuerySet.with_display_relations() for the same arguments.
+    Each carries the archived_at of its row.
+    """
+    if fields is None and expand is None:
+        expand = HealthRecordQuerySet.EXPANSIONS
+    payloads = [(row, decode(row.data)) for row in rows]
+
+    users = {}
+    if 'created_by' in expand:
+        users = User.objects.in_bulk({row.created_by_id for row in rows})
+    doctors = {}
+    if 'comments' in expand:
+        doctors = DoctorProfile.objects.select_related('user').in_bulk({
+            comment['doctor_id'] for _, payload in payloads for comment in payload['comments']
+        })
+    hide_private = getattr(user, 'user_type', None) == 'PATIENT'
+
+    records = []
+    for row, payload in payloads:
+        record = _load(HealthRecord, payload['record'])
+        record.archived_at = row.archived_at
+        if 'created_by' in expand and record.created_by_id in users:
+            record.created_by = users[record.created_by_id]
+        if 'comments' in expand:
+            record.visible_comments = []
+            for values in payload['comments']:
+                comment = _load(DoctorComment, values)
+                # A deleted doctor's comments are gone from the hot table too
+                if comment.doctor_id not in doctors or (hide_private and comment.is_private):
+                    continue
+                comment.doctor = doctors[comment.doctor_id]
+                record.visible_comments.append(comment)
+        records.append(record)
+    return records
+
+def iter_records(queryset, user, fields=None, expand=None, chunk_size=BATCH_SIZE):
+    """Materialized records for an ordered archive queryset, decoded a chunk at a time"""
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from materialize(chunk, user, fields, expand)
+            chunk = []
+    if chunk:
+        yield from materialize(chunk, user, fields, expand)
+
+def delete_archived(record):
+    """Delete an archived record for good, as HealthRecord.delete() would"""
+    with transaction.atomic():
+        ArchivedHealthRecord.objects.filter(pk=record.pk).delete()
+        HealthRecordAttachment.objects.filter(health_record_id=record.pk).delete()
+        DeletedHealthRecord.objects.create(record_id=record.pk, patient_id=record.patient_id)
+        PatientRecordSummary.objects.refresh([record.patient_id])
+    invalidate_patient(record.patient_id, record.patient.assigned_doctor_id)
@@ -0,0 +1,244 @@
+"""
+Content-addressed file storage for health record attachments.
+
+Uploads arrive in chunks (see AttachmentUploadView). Each chunk is copied
+from the request stream to a file under ATTACHMENT_ROOT/uploads/, one
+buffer at a time, so neither the web server nor Django holds a whole file
+in memory. Once the last byte arrives the file is hashed and moved to
+ATTACHMENT_ROOT/blobs/<aa>/<bb>/<sha256>. If a blob with that content is
+already stored, the new attachment shares it and the upload is dropped.
+
+Downloads honour single byte ranges and If-Range. With
+ATTACHMENT_ACCEL_REDIRECT_PREFIX set, the response carries only an
+X-Accel-Redirect header, and nginx sends the file (ranges included) with
+sendfile from an internal location aliased to ATTACHMENT_ROOT. Otherwise
+Django serves it: full files through FileResponse, which lets the WSGI
+server's file wrapper use sendfile, and ranges as a bounded stream.
+
+Blobs nobody references any more, and abandoned uploads, are removed by
+prune_attachments().
+"""
+import fcntl
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .models import AttachmentBlob, AttachmentUpload, HealthRecordAttachment
+
+BUFFER_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class IncompleteChunk(Exception):
+    """The request body ended before the announced number of bytes"""
+
+def blob_name(sha256):
+    """Path of a blob relative to ATTACHMENT_ROOT"""
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+def blob_path(sha256):
+    return os.path.join(settings.ATTACHMENT_ROOT, blob_name(sha256))
+
+def upload_dir():
+    return os.path.join(settings.ATTACHMENT_ROOT, 'uploads')
+
+def upload_path(upload_id):
+    return os.path.join(upload_dir(), str(upload_id))
+
+def parse_content_range(header):
+    """(first byte, last byte, total size) from a Content-Range header, or None"""
+    match = CONTENT_RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last, total = (int(value) for value in match.groups())
+    if first > last or last >= total:
+        return None
+    return first, last, total
+
+def write_chunk(upload, stream, offset, length):
+    """
+    Copy `length` bytes from `stream` into the upload's file at `offset`, then
+    move `received` past them with a compare-and-set update. Anything past the
+    chunk, left over from an interrupted attempt, is cut off.
+
+    No transaction is held while the client sends the bytes. Instead an
+    exclusive lock on the file keeps a retry from writing over a chunk still
+    being received; the retry gets False, as does a chunk whose offset was
+    written in the meantime.
+    """
+    path = upload_path(upload.pk)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+b') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        pending = AttachmentUpload.objects.filter(pk=upload.pk, received=offset)
+        if not pending.exists():
+            return False
+        file.seek(offset)
+        remaining = length
+        while remaining:
+            data = stream.read(min(BUFFER_SIZE, remaining))
+            if not data:
+                raise IncompleteChunk(f'Expected {length} bytes, received {length - remaining}')
+            file.write(data)
+            remaining -= len(data)
+        file.truncate()
+        file.flush()
+        # Still under the file lock, so only a deleted upload fails here
+        return pending.update(received=offset + length) == 1
+
+def discard_upload(upload_id):
+    """Remove the bytes received for an upload"""
+    path = upload_path(upload_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+def complete(upload):
+    """Turn a fully received upload into an attachment, storing its content once"""
+    path = upload_path(upload.pk)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(BUFFER_SIZE), b''):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+
+    with transaction.atomic():
+        blob, _ = AttachmentBlob.objects.get_or_create(sha256=sha256, defaults={'size': upload.size})
+        target = blob_path(sha256)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        attachment = HealthRecordAttachment.objects.create(
+            health_record_id=upload.health_record_id,
+            patient_id=upload.patient_id,
+            blob=blob,
+            filename=upload.filename,
+            content_type=upload.content_type,
+            uploaded_by_id=upload.uploaded_by_id,
+        )
+        upload.delete()
+    return attachment
+
+def parse_range(header, size):
+    """
+    (start, stop) for a single-range Range header, None to send the whole
+    file (no header, or one we ignore), or False when it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the final `last` bytes
+        start, stop = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        stop = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None
+    if start >= stop:
+        return False
+    return start, stop
+
+def _read_range(path, start, stop):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = stop - start
+        while remaining:
+            data = file.read(min(BUFFER_SIZE, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+
+def serve(request, attachment):
+    """Response delivering the attachment's content, honouring Range and If-Range"""
+    blob = attachment.blob
+    # The content never changes for a given digest, so it is a strong validator
+    etag = f'"{blob.sha256}"'
+    if etag in (request.META.get('HTTP_IF_NONE_MATCH') or ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    if settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=attachment.content_type)
+        response['X-Accel-Redirect'] = f"{settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{blob_name(blob.sha256)}"
+    else:
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), blob.size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{blob.size}'
+        elif byte_range is None:
+            response = FileResponse(open(blob_path(blob.sha256), 'rb'), content_type=attachment.content_type)
+        else:
+            start, stop = byte_range
+            response = StreamingHttpResponse(
+                _read_range(blob_path(blob.sha256), start, stop), status=206, content_type=attachment.content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{stop - 1}/{blob.size}'
+            response['Content-Length'] = str(stop - start)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, attachment.filename)
+    response['Cache-Control'] = 'private'
+    return response
+
+def prune_attachments(max_age=None):
+    """
+    Delete uploads started more than `max_age` ago (default
+    ATTACHMENT_UPLOAD_EXPIRY_HOURS) and blobs no attachment references.
+    Returns (uploads removed, blobs removed).
+    """
+    if max_age is None:
+        max_age = timedelta(hours=settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS)
+    cutoff = timezone.now() - max_age
+
+    uploads = 0
+    for upload_id in AttachmentUpload.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True):
+        AttachmentUpload.objects.filter(pk=upload_id).delete()
+        discard_upload(upload_id)
+        uploads += 1
+    # Files whose upload went away with its health record
+    if os.path.isdir(upload_dir()):
+        known = {str(upload_id) for upload_id in AttachmentUpload.objects.values_list('pk', flat=True)}
+        for entry in os.scandir(upload_dir()):
+            if entry.name not in known and entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+                uploads += 1
+
+    blobs = 0
+    # Only blobs old enough that no upload can still be completing against them
+    orphans = AttachmentBlob.objects.filter(attachments__isnull=True, created_at__lt=cutoff)
+    for sha256 in orphans.values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                deleted, _ = AttachmentBlob.objects.filter(pk=sha256, attachments__isnull=True).delete()
+        except ProtectedError:
+            # Referenced again in the meantime
+            continue
+        if not deleted:
+            continue
+        if os.path.exists(blob_path(sha256)):
+            os.remove(blob_path(sha256))
+        blobs += 1
+    return uploads, blobs
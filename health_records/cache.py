@@ -0,0 +1,156 @@
+"""
+Per-principal response cache for health record reads.
+
+Responses are cached under the patient or doctor profile that requested
+them, together with a version number per principal:
+
+    hr:resp:<principal>:<version>:<view>:<hash of path and query>
+
+Invalidation never deletes entries; it bumps the version of every principal
+whose view of the data changed, and old entries simply age out. A request
+reads the version before it touches the database, and versions are bumped
+again on commit, so a response built from pre-commit data is stored under
+a version that is never read again.
+
+Versions only reach other processes through a shared cache. Without one
+(settings.CACHE_IS_SHARED is False) CachedResponseMixin passes every request
+through, since a stale entry could outlive an unassignment.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.response import Response
+
+from accounts.models import PatientProfile
+from health_record_api import db_routing
+from health_record_api.conditional import not_modified_response, set_validators
+
+KEY_PREFIX = 'hr'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+def patient_principal(patient_id):
+    return f'patient:{patient_id}'
+
+def doctor_principal(doctor_id):
+    return f'doctor:{doctor_id}'
+
+def principal_for(user):
+    """Cache principal of the requesting user, or None if they have no profile"""
+    profile = user.profile
+    if profile is None:
+        return None
+    if user.user_type == 'PATIENT':
+        return patient_principal(profile.pk)
+    return doctor_principal(profile.pk)
+
+def get_version(principal):
+    key = f'{KEY_PREFIX}:version:{principal}'
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock rather than 0: if the version key is ever evicted,
+        # entries cached under an earlier version must not become reachable again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+def invalidate(*principals):
+    """
+    Bump the version of each principal now and again once the current
+    transaction commits. The first bump hides the change from this request
+    onwards. The second one discards anything cached from uncommitted state
+    by a concurrent reader in between.
+    """
+    principals = {principal for principal in principals if principal}
+
+    def bump():
+        for principal in principals:
+            key = f'{KEY_PREFIX}:version:{principal}'
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+        # Until replicas catch up, cache misses for these principals are read
+        # from the primary, or a lagging replica would refill the cache
+        db_routing.pin(*principals)
+
+    bump()
+    transaction.on_commit(bump)
+
+def invalidate_patient(patient_id, *doctor_ids):
+    """Invalidate a patient's cached reads and those of the given doctors"""
+    invalidate(
+        patient_principal(patient_id),
+        *(doctor_principal(doctor_id) for doctor_id in doctor_ids if doctor_id)
+    )
+
+def invalidate_patients(patient_ids, using=DEFAULT_DB_ALIAS):
+    """Invalidate the cached reads of several patients and their assigned doctors"""
+    rows = PatientProfile.objects.using(using).filter(pk__in=set(patient_ids)).values_list('pk', 'assigned_doctor_id')
+    for patient_id, doctor_id in rows:
+        invalidate_patient(patient_id, doctor_id)
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+def cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+class CachedResponseMixin:
+    """
+    Serve GET responses from the per-principal cache.
+
+    Sits in front of ConditionalGetMixin: a hit is answered (or turned into a
+    304) from the cached body and validators without touching the record
+    tables; a miss falls through and its 200 response is stored.
+    """
+    cache_timeout = None
+
+    def get(self, request, *args, **kwargs):
+        if not settings.CACHE_IS_SHARED:
+            return super().get(request, *args, **kwargs)
+        principal = principal_for(request.user)
+        if principal is None:
+            return super().get(request, *args, **kwargs)
+        db_routing.use_primary_if_pinned(principal)
+
+        path_hash = hashlib.sha1(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+        key = f'{KEY_PREFIX}:resp:{principal}:{get_version(principal)}:{type(self).__name__}:{path_hash}'
+
+        cached = cache.get(key)
+        if cached is not None:
+            count(HITS_KEY)
+            etag, last_modified, data = cached
+            response = not_modified_response(request, etag, last_modified)
+            if response is None:
+                response = Response(data)
+            return set_validators(response, etag, last_modified)
+
+        count(MISSES_KEY)
+        response = super().get(request, *args, **kwargs)
+        # The validators are set by ConditionalGetMixin while building the response
+        etag = getattr(self, 'etag', None)
+        if response.status_code == 200 and etag is not None:
+            cache.set(
+                key,
+                (etag, self.last_modified, response.data),
+                self.cache_timeout or settings.HEALTH_RECORD_CACHE_TIMEOUT
+            )
+        return response
@@ -0,0 +1,58 @@
+"""
+Streaming export of health records as NDJSON or CSV.
+
+Rows are read with QuerySet.iterator(chunk_size=...), which uses a server-side
+cursor on PostgreSQL, and each chunk is serialized and handed to the client
+as soon as it is fetched. Comments are prefetched per chunk, so memory stays
+bounded by the chunk size rather than by the size of the history.
+"""
+import csv
+import heapq
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+CHUNK_SIZE = 500
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+def iter_representations(queryset, serializer, chunk_size=CHUNK_SIZE, archived=None):
+    """
+    Serialize records one at a time with a single serializer instance.
+    `archived` records (see archive.iter_records), in the same newest-first
+    order as the queryset, are merged in.
+    """
+    records = queryset.iterator(chunk_size=chunk_size)
+    if archived is not None:
+        records = heapq.merge(records, archived, key=lambda record: (record.visit_date, record.pk), reverse=True)
+    for record in records:
+        yield serializer.to_representation(record)
+
+def to_json(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+
+def ndjson_rows(representations):
+    for data in representations:
+        yield to_json(data) + '\n'
+
+class _LineBuffer:
+    """File-like object for csv.writer that hands back each written line"""
+
+    def write(self, line):
+        return line
+
+def csv_rows(representations, field_names):
+    """
+    One CSV row per record. Nested values (created_by, doctor_comments) are
+    embedded as JSON so the file keeps one row per record.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(field_names)
+    for data in representations:
+        yield writer.writerow([
+            to_json(data[name]) if isinstance(data[name], (dict, list)) else data[name]
+            for name in field_names
+        ])
@@ -0,0 +1,102 @@
+"""
+Activity feed: new records and comments across everything a user can see,
+in (created_at, id) order after an opaque cursor.
+
+The cursor keeps one position per stream, so records and comments are read
+independently off their (created_at, id) indexes and merged. Rows younger
+than SETTLE_TIME are held back: a transaction that commits late can still
+carry a created_at from before the cursor, and would otherwise be skipped.
+"""
+import base64
+import json
+import time
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from .cache import get_version
+from .models import DoctorComment
+
+SETTLE_TIME = timedelta(seconds=1)
+POLL_INTERVAL = 0.5
+
+def encode_cursor(positions):
+    payload = {stream: [created_at.isoformat(), pk] for stream, (created_at, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+def decode_cursor(cursor, streams):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {}
+        for stream in streams:
+            created_at, pk = payload[stream]
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(created_at)
+            positions[stream] = (created_at, int(pk))
+        return positions
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        raise serializers.ValidationError({'cursor': 'Invalid cursor'})
+
+def after(queryset, position, until, field='created_at'):
+    """Rows strictly after a (timestamp, pk) position on `field`, up to `until`"""
+    timestamp, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}),
+        **{f'{field}__lte': until}
+    ).order_by(field, 'pk')
+
+def feed_streams(records, user):
+    """Querysets per stream: the visible records and the comments visible on them"""
+    comments = DoctorComment.objects.filter(health_record__in=records.values('pk')).select_related(
+        'doctor__user'
+    ).annotate(patient_id=F('health_record__patient_id'))
+    if user.user_type == 'PATIENT':
+        comments = comments.filter(is_private=False)
+    return {'records': records, 'comments': comments}
+
+def read_feed(streams, positions, limit):
+    """
+    Return (items, positions, has_more). Items are (stream, obj) pairs in
+    created_at order; positions only move past items that were returned.
+    """
+    until = timezone.now() - SETTLE_TIME
+    candidates = []
+    for stream, queryset in streams.items():
+        candidates.extend((stream, obj) for obj in after(queryset, positions[stream], until)[:limit + 1])
+
+    candidates.sort(key=lambda item: (item[1].created_at, item[0], item[1].pk))
+    items = candidates[:limit]
+
+    positions = dict(positions)
+    for stream, obj in items:
+        positions[stream] = (obj.created_at, obj.pk)
+    return items, positions, len(candidates) > limit
+
+def wait_for_feed(streams, positions, limit, principal, timeout):
+    """
+    Long-poll: re-read the feed until it has items or `timeout` seconds pass.
+    Between reads only the principal's cache version is polled; the database
+    is read again when the version moves, and for SETTLE_TIME afterwards
+    while the new rows settle.
+    """
+    settle = SETTLE_TIME.total_seconds()
+    deadline = time.monotonic() + timeout
+    # Rows written just before this request may still be settling
+    recheck_until = time.monotonic() + settle
+    version = get_version(principal)
+    items, new_positions, has_more = read_feed(streams, positions, limit)
+
+    while not items and time.monotonic() < deadline:
+        time.sleep(min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        current = get_version(principal)
+        if current != version:
+            version = current
+            recheck_until = time.monotonic() + settle
+        if time.monotonic() <= recheck_until + POLL_INTERVAL:
+            items, new_positions, has_more = read_feed(streams, positions, limit)
+
+    return items, new_positions, has_more
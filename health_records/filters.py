@@ -0,0 +1,124 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import ArchivedHealthRecord, HealthRecord, DoctorComment
+
+class HealthRecordFilterBackend(BaseFilterBackend):
+    """
+    Server-side filtering for health record lists.
+
+    ?record_type=LAB_RESULT            one or more comma-separated types
+    ?visit_date__gte=2025-01-01        date or ISO datetime, inclusive
+    ?visit_date__lte=2025-03-31        date (whole day) or ISO datetime, inclusive
+    ?patient_id=12                     narrow a doctor's panel to one patient
+    ?has_comments=true|false           only records with/without visible comments
+    ?ids=4,8,15                        fetch specific records, at most MAX_IDS
+
+    Every filter maps onto the (patient, record_type, visit_date) or
+    (patient, visit_date) indexes, or an EXISTS probe on the comment index.
+    The same filters apply to ArchivedHealthRecord querysets.
+    """
+    BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+    MAX_IDS = 100
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        ids = self.parse_ids(params)
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+
+        record_types = params.get('record_type')
+        if record_types:
+            record_types = [value.strip().upper() for value in record_types.split(',') if value.strip()]
+            valid = {choice for choice, _ in HealthRecord.RECORD_TYPE_CHOICES}
+            invalid = set(record_types) - valid
+            if invalid:
+                raise serializers.ValidationError({'record_type': f"Unknown record types: {', '.join(sorted(invalid))}"})
+            queryset = queryset.filter(record_type__in=record_types)
+
+        if 'visit_date__gte' in params:
+            value, _ = self.parse_visit_date(params, 'visit_date__gte')
+            queryset = queryset.filter(visit_date__gte=value)
+
+        if 'visit_date__lte' in params:
+            value, is_date = self.parse_visit_date(params, 'visit_date__lte')
+            if is_date:
+                # Include the whole day without casting the column, so the index still applies
+                try:
+                    queryset = queryset.filter(visit_date__lt=value + timedelta(days=1))
+                except OverflowError:
+                    # The last representable day bounds nothing
+                    pass
+            else:
+                queryset = queryset.filter(visit_date__lte=value)
+
+        if 'patient_id' in params:
+            try:
+                patient_id = int(params['patient_id'])
+            except ValueError:
+                raise serializers.ValidationError({'patient_id': 'Must be an integer'})
+            queryset = queryset.filter(patient_id=patient_id)
+
+        if 'has_comments' in params:
+            has_comments = self.BOOLEAN_VALUES.get(params['has_comments'].lower())
+            if has_comments is None:
+                raise serializers.ValidationError({'has_comments': 'Must be true or false'})
+
+            # Patients never see private comments, so those must not count either
+            is_patient = request.user.user_type == 'PATIENT'
+            if queryset.model is ArchivedHealthRecord:
+                # Archived comments are compressed with the record; their counts are columns
+                count = 'public_comment_count' if is_patient else 'comment_count'
+                queryset = queryset.filter(**{f'{count}__gt': 0}) if has_comments else queryset.filter(**{count: 0})
+            else:
+                comments = DoctorComment.objects.filter(health_record=OuterRef('pk'))
+                if is_patient:
+                    comments = comments.filter(is_private=False)
+                queryset = queryset.filter(Exists(comments) if has_comments else ~Exists(comments))
+
+        return queryset
+
+    @classmethod
+    def parse_ids(cls, params):
+        """Requested record ids in request order without duplicates, or None"""
+        if 'ids' not in params:
+            return None
+        try:
+            ids = list(dict.fromkeys(int(value) for value in params['ids'].split(',') if value.strip()))
+        except ValueError:
+            raise serializers.ValidationError({'ids': 'Expected comma-separated integers'})
+        if not ids:
+            raise serializers.ValidationError({'ids': 'Expected at least one id'})
+        if len(ids) > cls.MAX_IDS:
+            raise serializers.ValidationError({'ids': f'At most {cls.MAX_IDS} ids per request'})
+        return ids
+
+    def parse_visit_date(self, params, name):
+        """Return (aware datetime, is_date_only) for a date or datetime query param"""
+        raw = params[name]
+        try:
+            # Dates first: parse_datetime would also accept a bare date as midnight
+            day = parse_date(raw)
+            if day is not None:
+                return timezone.make_aware(datetime.combine(day, time.min)), True
+
+            value = parse_datetime(raw)
+        except ValueError:
+            value = None
+
+        if value is None:
+            raise serializers.ValidationError({name: 'Expected a date (YYYY-MM-DD) or ISO 8601 datetime'})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        try:
+            # The database compares in UTC; an offset past year 9999 cannot be stored
+            value.astimezone(dt_timezone.utc)
+        except OverflowError:
+            raise serializers.ValidationError({name: 'Out of range'})
+        return value, False
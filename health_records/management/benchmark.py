@@ -0,0 +1,68 @@
+"""Seed data and requests shared by the benchmark_* management commands"""
+import random
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User, DoctorProfile, PatientProfile
+from health_records.models import HealthRecord, DoctorComment
+from health_records.views import HealthRecordListCreateView
+
+# Enough clinical vocabulary that the seeded text compresses like real notes
+# rather than like a repeated template
+VOCABULARY = (
+    'patient reports intermittent chest pain shortness of breath fatigue dizziness nausea '
+    'headache fever cough wheezing palpitations edema swelling tenderness lower left right '
+    'upper abdominal lumbar cervical thoracic acute chronic mild moderate severe onset days '
+    'weeks months history hypertension diabetes asthma hyperlipidemia anemia migraine '
+    'examination reveals normal abnormal elevated reduced blood pressure heart rate glucose '
+    'cholesterol hemoglobin creatinine levels within range recommend follow-up imaging '
+    'ultrasound x-ray mri ct scan referral cardiology neurology physiotherapy continue '
+    'discontinue increase decrease dose daily twice weekly mg metformin lisinopril '
+    'atorvastatin ibuprofen amoxicillin salbutamol inhaler diet exercise hydration rest'
+).split()
+
+def seed_patient(records):
+    """A patient with `records` health records and a few comments on each; call inside a rolled-back transaction"""
+    rng = random.Random(42)
+    words = lambda n: ' '.join(rng.choice(VOCABULARY) for _ in range(n)).capitalize() + '.'
+    stamp = int(time.time())
+
+    doctor_user = User.objects.create_user(username=f'bench_doctor_{stamp}', password=None, user_type='DOCTOR')
+    doctor = DoctorProfile.objects.create(
+        user=doctor_user, specialization='General', license_number=f'BENCH{stamp}', years_of_experience=5
+    )
+    user = User.objects.create_user(username=f'bench_patient_{stamp}', password=None, user_type='PATIENT')
+    patient = PatientProfile.objects.create(user=user, emergency_contact='', assigned_doctor=doctor)
+
+    now = timezone.now()
+    created = HealthRecord.objects.bulk_create([
+        HealthRecord(
+            patient=patient,
+            record_type=rng.choice(HealthRecord.RECORD_TYPE_CHOICES)[0],
+            title=words(4),
+            description=words(rng.randint(40, 120)),
+            symptoms=words(rng.randint(5, 20)),
+            diagnosis=words(rng.randint(5, 25)),
+            treatment=words(rng.randint(10, 40)),
+            medications=words(rng.randint(3, 10)),
+            visit_date=now - timedelta(days=i),
+            created_by=user,
+        )
+        for i in range(records)
+    ])
+    DoctorComment.objects.bulk_create([
+        DoctorComment(health_record=record, doctor=doctor, comment=words(rng.randint(10, 40)), is_private=False)
+        for record in created
+        for _ in range(rng.randint(0, 2))
+    ])
+    return patient
+
+def list_page(patient, page_size):
+    """The patient's first cursor page of the record list, before rendering"""
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    request = factory.get('/api/health-records/', {'pagination': 'cursor', 'page_size': page_size})
+    force_authenticate(request, user=patient.user)
+    return HealthRecordListCreateView.as_view()(request)
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from health_records import archive
+from health_records.models import HealthRecord
+
+class Command(BaseCommand):
+    help = (
+        'Move health records whose visit and last update are older than --days, with their '
+        'comments, into the compressed archive. They stay readable through the detail and export endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.HEALTH_RECORD_ARCHIVE_AFTER_DAYS,
+            help='Archive records older than this many days (default: HEALTH_RECORD_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE, help='Records moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the records that would be archived')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = HealthRecord.objects.filter(visit_date__lt=before, updated_at__lt=before).count()
+            self.stdout.write(f'{count} health records older than {before:%Y-%m-%d} would be archived.')
+            return
+
+        moved = archive.archive_records(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} health records older than {before:%Y-%m-%d}.'))
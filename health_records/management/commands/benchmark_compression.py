@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from health_record_api import compression
+from health_records.management.benchmark import list_page, seed_patient
+
+class Command(BaseCommand):
+    help = (
+        'Measure response size and compression CPU time per encoding and level on rendered '
+        'health record list pages. Seed data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=500, help='Number of health records to seed')
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[20, 100])
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per measurement (median is reported)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            patient = seed_patient(options['records'])
+            for page_size in options['page_sizes']:
+                body = list_page(patient, page_size).render().content
+                self.report(page_size, body, options['repeat'])
+            transaction.set_rollback(True)
+
+    def report(self, page_size, body, repeat):
+        self.stdout.write(f'\nPage of {page_size} records: {len(body):,} bytes uncompressed')
+        self.stdout.write(f'{"encoding":>10} {"level":>6} {"bytes":>10} {"ratio":>7} {"compress ms":>12} {"MB/s":>8}')
+
+        for encoding in compression.available_encodings():
+            levels = sorted({*self.LEVELS[encoding], compression.compression_level(encoding)})
+            for level in levels:
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    compressed = compression.compress(encoding, body, level)
+                    samples.append(time.perf_counter() - start)
+                seconds = statistics.median(samples)
+                self.stdout.write(
+                    f'{encoding:>10} {level:>6} {len(compressed):>10,} {len(body) / len(compressed):>6.1f}x '
+                    f'{seconds * 1000:>12.2f} {len(body) / seconds / 1e6:>8.1f}'
+                )
+
+    LEVELS = {
+        'gzip': [1, 6, 9],
+        'br': [1, 4, 6, 11],
+        'zstd': [1, 3, 9, 19],
+    }
@@ -0,0 +1,57 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from health_record_api import fastjson
+from health_records.management.benchmark import list_page, seed_patient
+
+class Command(BaseCommand):
+    help = (
+        'Compare DRF\'s JSONRenderer/JSONParser with the orjson-backed ones on serialized '
+        'health record list pages. Seed data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=500, help='Number of health records to seed')
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[20, 100])
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per measurement (median is reported)')
+
+    def handle(self, *args, **options):
+        if fastjson.orjson is None:
+            raise CommandError('orjson is not installed; FastJSONRenderer is falling back to the stdlib.')
+
+        with transaction.atomic():
+            patient = seed_patient(options['records'])
+            self.stdout.write(f'{"records":>8} {"bytes":>10} {"":>8} {"stdlib ms":>10} {"orjson ms":>10} {"speedup":>8}')
+            for page_size in options['page_sizes']:
+                self.report(page_size, list_page(patient, page_size).data, options['repeat'])
+            transaction.set_rollback(True)
+
+    def report(self, page_size, data, repeat):
+        body = JSONRenderer().render(data)
+        if fastjson.FastJSONRenderer().render(data) != body:
+            raise CommandError(f'Rendered output differs from JSONRenderer for a page of {page_size} records.')
+
+        measurements = [
+            ('render', lambda: JSONRenderer().render(data), lambda: fastjson.FastJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: fastjson.FastJSONParser().parse(io.BytesIO(body))),
+        ]
+        for name, stdlib, fast in measurements:
+            baseline, candidate = self.time(stdlib, repeat), self.time(fast, repeat)
+            self.stdout.write(
+                f'{page_size:>8} {len(body):>10,} {name:>8} {baseline * 1000:>10.2f} '
+                f'{candidate * 1000:>10.2f} {baseline / candidate:>7.1f}x'
+            )
+
+    def time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
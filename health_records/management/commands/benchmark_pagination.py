@@ -0,0 +1,98 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination, Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User, PatientProfile
+from health_records.models import HealthRecord
+from health_records.pagination import VisitDateCursorPagination
+
+class Command(BaseCommand):
+    help = (
+        'Compare page-number and cursor pagination latency at increasing page depths '
+        'on a seeded health record table. Seed data is rolled back unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of health records to seed')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per depth (median is reported)')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            patient = self.seed(options['rows'], options['batch_size'])
+            self.run(patient, options['rows'], options['page_size'], options['repeat'])
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def seed(self, rows, batch_size):
+        user = User.objects.create_user(
+            username=f'bench_patient_{int(time.time())}',
+            password=None,
+            user_type='PATIENT',
+        )
+        patient = PatientProfile.objects.create(user=user, emergency_contact='')
+
+        self.stdout.write(f'Seeding {rows:,} health records...')
+        start = timezone.now()
+        for offset in range(0, rows, batch_size):
+            HealthRecord.objects.bulk_create([
+                HealthRecord(
+                    patient=patient,
+                    record_type='CHECKUP',
+                    title=f'Visit {i}',
+                    description='Benchmark record',
+                    # Every 4 records share a visit_date to exercise the id tie-breaker
+                    visit_date=start - timedelta(hours=i // 4),
+                    created_by=user,
+                )
+                for i in range(offset, min(offset + batch_size, rows))
+            ])
+        return patient
+
+    def run(self, patient, rows, page_size, repeat):
+        queryset = HealthRecord.objects.filter(patient=patient)
+        last_page = max(1, -(-rows // page_size))
+        depths = sorted({1, 10, 100, 1_000, 10_000, last_page} & set(range(1, last_page + 1)))
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+
+        self.stdout.write(f'{"page":>10} {"page-number ms":>16} {"cursor ms":>12}')
+        for page in depths:
+            page_request = Request(factory.get('/', {'page': page, 'page_size': page_size}))
+            cursor_request = Request(factory.get(self.cursor_url(queryset, page, page_size)))
+
+            page_ms = self.time(repeat, lambda: self.paginate(PageNumberPagination, queryset, page_request, page_size))
+            cursor_ms = self.time(repeat, lambda: self.paginate(VisitDateCursorPagination, queryset, cursor_request, page_size))
+            self.stdout.write(f'{page:>10,} {page_ms:>16.2f} {cursor_ms:>12.2f}')
+
+    def cursor_url(self, queryset, page, page_size):
+        """Build the next link a client would hold after walking to `page` (not timed)"""
+        paginator = VisitDateCursorPagination()
+        paginator.base_url = f'/?page_size={page_size}'
+        if page == 1:
+            return paginator.base_url
+
+        boundary = queryset.order_by('-visit_date', '-id').only('visit_date')[(page - 1) * page_size - 1]
+        return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=paginator.encode_position(boundary)))
+
+    def paginate(self, pagination_class, queryset, request, page_size):
+        paginator = pagination_class()
+        paginator.page_size = page_size
+        return list(paginator.paginate_queryset(queryset, request))
+
+    def time(self, repeat, func):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from health_records.cache import cache_stats, reset_cache_stats
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the health record response cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else 'n/a'
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit rate: {hit_rate}")
+
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write('Counters reset.')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from health_records import partitions
+
+class Command(BaseCommand):
+    help = 'Create missing yearly partitions of the health record table (PostgreSQL only).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years', type=int, nargs='+',
+            help=f'Years to create; defaults to this year and the {partitions.PARTITIONS_AHEAD} after it'
+        )
+
+    def handle(self, *args, **options):
+        created = partitions.ensure_partitions(years=options['years'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partitions created.'))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from health_records import attachments
+
+class Command(BaseCommand):
+    help = 'Remove abandoned attachment uploads and stored files that no attachment references any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS,
+            help='Age after which unfinished uploads are abandoned (default: ATTACHMENT_UPLOAD_EXPIRY_HOURS)'
+        )
+
+    def handle(self, *args, **options):
+        uploads, blobs = attachments.prune_attachments(max_age=timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Removed {uploads} abandoned uploads and {blobs} unreferenced files.'))
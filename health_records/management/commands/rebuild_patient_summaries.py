@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from health_records.models import PatientRecordSummary
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-patient health record summaries from scratch, then verify them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only verify the summaries, do not rebuild')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if not options['check']:
+            written = PatientRecordSummary.objects.rebuild(batch_size=batch_size)
+            self.stdout.write(f'Rebuilt {written} patient summaries.')
+
+        stale = 0
+        for patient_id, stored, expected in PatientRecordSummary.objects.inconsistencies(batch_size=batch_size):
+            stale += 1
+            self.stderr.write(f'patient {patient_id}: stored {stored}, expected {expected}')
+
+        if stale:
+            raise CommandError(f'{stale} patient summaries are inconsistent; run without --check to rebuild.')
+        self.stdout.write(self.style.SUCCESS('All patient summaries are consistent.'))
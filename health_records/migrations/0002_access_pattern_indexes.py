@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_access_pattern_indexes'),
+        ('health_records', '0001_initial'),
+    ]
+
+    # Build the composite indexes before dropping the single-column FK
+    # indexes they replace, so lookups are never left without an index.
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorcomment',
+            index=models.Index(fields=['health_record', '-created_at'], name='comment_record_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['patient', '-visit_date', '-id'], name='hr_patient_visit_idx'),
+        ),
+        migrations.AlterField(
+            model_name='doctorcomment',
+            name='health_record',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='doctor_comments', to='health_records.healthrecord'),
+        ),
+        migrations.AlterField(
+            model_name='healthrecord',
+            name='patient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='health_records', to='accounts.patientprofile'),
+        ),
+    ]
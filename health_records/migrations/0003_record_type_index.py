@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_records', '0002_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['patient', 'record_type', '-visit_date'], name='hr_patient_type_visit_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+from health_records import search
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = search.postgres_setup_sql()
+    elif vendor == 'sqlite':
+        statements = search.sqlite_setup_sql()
+    else:
+        return
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = search.postgres_teardown_sql()
+    elif vendor == 'sqlite':
+        statements = search.sqlite_teardown_sql()
+    else:
+        return
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_records', '0003_record_type_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
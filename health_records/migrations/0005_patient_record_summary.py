@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Q
+
+
+RECORD_TYPES = ['CHECKUP', 'DIAGNOSIS', 'PRESCRIPTION', 'LAB_RESULT', 'EMERGENCY']
+
+
+def backfill_summaries(apps, schema_editor):
+    PatientProfile = apps.get_model('accounts', 'PatientProfile')
+    HealthRecord = apps.get_model('health_records', 'HealthRecord')
+    PatientRecordSummary = apps.get_model('health_records', 'PatientRecordSummary')
+    db_alias = schema_editor.connection.alias
+
+    aggregates = {'total_records': Count('id'), 'last_visit': Max('visit_date')}
+    for record_type in RECORD_TYPES:
+        aggregates[f'{record_type.lower()}_count'] = Count('id', filter=Q(record_type=record_type))
+
+    stats = {
+        row.pop('patient_id'): row
+        for row in HealthRecord.objects.using(db_alias).order_by().values('patient_id').annotate(**aggregates)
+    }
+    PatientRecordSummary.objects.using(db_alias).bulk_create(
+        [
+            PatientRecordSummary(patient_id=patient_id, **stats.get(patient_id, {}))
+            for patient_id in PatientProfile.objects.using(db_alias).values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_updated_at'),
+        ('health_records', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientRecordSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='record_summary', serialize=False, to='accounts.patientprofile')),
+                ('total_records', models.PositiveIntegerField(default=0)),
+                ('last_visit', models.DateTimeField(blank=True, null=True)),
+                ('checkup_count', models.PositiveIntegerField(default=0)),
+                ('diagnosis_count', models.PositiveIntegerField(default=0)),
+                ('prescription_count', models.PositiveIntegerField(default=0)),
+                ('lab_result_count', models.PositiveIntegerField(default=0)),
+                ('emergency_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_records', '0005_patient_record_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorcomment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['created_at', 'id'], name='hr_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_updated_at'),
+        ('health_records', '0006_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedHealthRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['patient', 'updated_at', 'id'], name='hr_patient_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='deletedhealthrecord',
+            name='patient',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.patientprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedhealthrecord',
+            index=models.Index(fields=['patient', 'deleted_at', 'record_id'], name='hr_tombstone_patient_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from health_records import partitions
+
+
+def partition_records(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        partitions.partition_table(schema_editor.connection)
+
+
+def unpartition_records(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        partitions.unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_records', '0007_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doctorcomment',
+            name='health_record',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='doctor_comments', to='health_records.healthrecord'),
+        ),
+        migrations.RunPython(partition_records, unpartition_records),
+    ]
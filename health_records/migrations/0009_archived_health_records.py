@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('health_records', '0008_partition_health_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedHealthRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('record_type', models.CharField(choices=[('CHECKUP', 'Regular Checkup'), ('DIAGNOSIS', 'Diagnosis'), ('PRESCRIPTION', 'Prescription'), ('LAB_RESULT', 'Lab Result'), ('EMERGENCY', 'Emergency Visit')], max_length=20)),
+                ('visit_date', models.DateTimeField()),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('public_comment_count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.patientprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', '-visit_date', '-id'], name='hr_archive_patient_visit_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from health_records import search, sync
+
+
+def install_change_stamps(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        # Limit the FTS update trigger to the text columns, so stamping a
+        # row that the FTS table does not hold yet leaves the index alone
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {search.FTS_TABLE}_update')
+        for statement in search.sqlite_setup_sql():
+            schema_editor.execute(statement)
+    sync.install(schema_editor.connection)
+
+
+def uninstall_change_stamps(apps, schema_editor):
+    sync.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_records', '0010_attachments'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='healthrecord',
+            name='hr_patient_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='deletedhealthrecord',
+            name='hr_tombstone_patient_idx',
+        ),
+        migrations.RunPython(install_change_stamps, uninstall_change_stamps),
+    ]
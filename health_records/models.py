@@ -1,5 +1,99 @@
-from django.db import models
+import uuid
+from contextvars import ContextVar
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.utils import timezone
 from accounts.models import User, PatientProfile, DoctorProfile
+from .cache import invalidate_patients
+
+# Set while a queryset delete refreshes summaries and writes tombstones for
+# all its rows at once, so the per-row post_delete signals skip that work
+bulk_delete_in_progress = ContextVar('bulk_delete_in_progress', default=False)
+
+class HealthRecordQuerySet(models.QuerySet):
+    # Related data that can be embedded in a record representation
+    EXPANSIONS = ('comments', 'created_by')
+    
+    def with_display_relations(self, user, fields=None, expand=None):
+        """
+        Load everything HealthRecordSerializer renders in a fixed number of queries.
+        Private comments are dropped inside the prefetch for patients.
+        
+        With a field selection (see HealthRecordSerializer.parse_field_selection)
+        only the requested columns and expansions are loaded.
+        """
+        queryset = self
+        if fields is None and expand is None:
+            expand = self.EXPANSIONS
+        
+        if 'created_by' in expand:
+            queryset = queryset.select_related('created_by')
+        
+        if 'comments' in expand:
+            comments = DoctorComment.objects.select_related('doctor__user')
+            if getattr(user, 'user_type', None) == 'PATIENT':
+                comments = comments.filter(is_private=False)
+            queryset = queryset.prefetch_related(
+                Prefetch('doctor_comments', queryset=comments, to_attr='visible_comments')
+            )
+        
+        if fields is not None:
+            # id, patient and visit_date back permission checks and cursor links,
+            # updated_at the list ETag
+            load = set(fields) | {'id', 'patient', 'visit_date', 'updated_at'}
+            if 'created_by' in expand:
+                load.add('created_by')
+            queryset = queryset.only(*load)
+        
+        return queryset
+    
+    # Bulk writes bypass save() and post_save, so they keep the patient
+    # summaries current themselves, in the same transaction as the write,
+    # and invalidate the cached reads of every patient they touch
+    SUMMARY_FIELDS = {'patient', 'patient_id', 'record_type', 'visit_date'}
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            patient_ids = {obj.patient_id for obj in created}
+            PatientRecordSummary.objects.refresh(patient_ids)
+            invalidate_patients(patient_ids, using=self.db)
+        return created
+    
+    def update(self, **kwargs):
+        # auto_now is not applied by update(), but the list ETags rely on updated_at
+        kwargs.setdefault('updated_at', timezone.now())
+        
+        with transaction.atomic(using=self.db, savepoint=False):
+            patient_ids = set(self.order_by().values_list('patient_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            moved_to = kwargs.get('patient_id', kwargs.get('patient'))
+            if moved_to is not None:
+                patient_ids.add(getattr(moved_to, 'pk', moved_to))
+            if self.SUMMARY_FIELDS & set(kwargs):
+                PatientRecordSummary.objects.refresh(patient_ids)
+            invalidate_patients(patient_ids, using=self.db)
+        return rows
+    
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            deleted = list(self.order_by().values_list('pk', 'patient_id'))
+            token = bulk_delete_in_progress.set(True)
+            try:
+                result = super().delete()
+            finally:
+                bulk_delete_in_progress.reset(token)
+            DeletedHealthRecord.objects.bulk_create([
+                DeletedHealthRecord(record_id=pk, patient_id=patient_id) for pk, patient_id in deleted
+            ])
+            patient_ids = {patient_id for _, patient_id in deleted}
+            PatientRecordSummary.objects.refresh(patient_ids)
+            invalidate_patients(patient_ids, using=self.db)
+        return result
+    
+    delete.alters_data = True
+    delete.queryset_only = True
 
 class HealthRecord(models.Model):
     RECORD_TYPE_CHOICES = [
@@ -10,7 +104,8 @@ class HealthRecord(models.Model):
         ('EMERGENCY', 'Emergency Visit'),
     ]
     
-    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='health_records')
+    # Indexed as the leading column of hr_patient_visit_idx
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='health_records', db_index=False)
     record_type = models.CharField(max_length=20, choices=RECORD_TYPE_CHOICES)
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -23,14 +118,38 @@ class HealthRecord(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = HealthRecordQuerySet.as_manager()
+    
+    # On PostgreSQL the table is range-partitioned by visit_date year and its
+    # primary key is (id, visit_date); see partitions.py
     class Meta:
         ordering = ['-visit_date']
+        indexes = [
+            # Patient history and doctor panel lists, newest first; id breaks
+            # visit_date ties for cursor pagination
+            models.Index(fields=['patient', '-visit_date', '-id'], name='hr_patient_visit_idx'),
+            # ?record_type= lists, e.g. the last 90 days of lab results
+            models.Index(fields=['patient', 'record_type', '-visit_date'], name='hr_patient_type_visit_idx'),
+            # Activity feed, read forward from a (created_at, id) cursor
+            models.Index(fields=['created_at', 'id'], name='hr_created_idx'),
+            # Delta sync reads hr_patient_change_idx, created with its columns by sync.install()
+        ]
     
     def __str__(self):
         return f"{self.patient.user.get_full_name()} - {self.title}"
+    
+    def save(self, *args, **kwargs):
+        # post_save refreshes the patient summary; keep it in the same transaction
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
 
 class DoctorComment(models.Model):
-    health_record = models.ForeignKey(HealthRecord, on_delete=models.CASCADE, related_name='doctor_comments')
+    # Indexed as the leading column of comment_record_created_idx
+    # No database constraint: the partitioned record table has no unique key
+    # on id alone to reference (see partitions.py). Django still cascades.
+    health_record = models.ForeignKey(
+        HealthRecord, on_delete=models.CASCADE, related_name='doctor_comments', db_index=False, db_constraint=False
+    )
     doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE)
     comment = models.TextField()
     is_private = models.BooleanField(default=False)
@@ -39,6 +158,210 @@ class DoctorComment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Comments prefetched per record, newest first
+            models.Index(fields=['health_record', '-created_at'], name='comment_record_created_idx'),
+            # Activity feed, read forward from a (created_at, id) cursor
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by Dr. {self.doctor.user.get_full_name()}"
+
+class DeletedHealthRecord(models.Model):
+    """
+    Tombstone left behind by a deleted health record, so delta sync can tell
+    clients which records to drop.
+    """
+    record_id = models.BigIntegerField()
+    # No database constraint: tombstones may outlive a cascade-deleted patient
+    patient = models.ForeignKey(
+        PatientProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', db_index=False
+    )
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Deleted record {self.record_id}"
+
+class AttachmentBlob(models.Model):
+    """File content stored once per SHA-256 digest (see attachments.py)"""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.sha256
+
+class HealthRecordAttachment(models.Model):
+    # No database constraint, like DoctorComment. Archiving a record leaves
+    # its attachments in place under the same record id.
+    health_record = models.ForeignKey(
+        HealthRecord, on_delete=models.CASCADE, related_name='attachments', db_index=False, db_constraint=False
+    )
+    # The record's patient, for IsPatientOwnerOrAssignedDoctor checks that
+    # also work once the record is archived
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='+', db_index=False)
+    # Unreferenced blobs are removed by prune_attachments
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, related_name='attachments')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['health_record', 'created_at', 'id'], name='attachment_record_idx'),
+        ]
+    
+    def __str__(self):
+        return self.filename
+
+class AttachmentUpload(models.Model):
+    """A chunked upload in progress; the bytes received so far are on disk (see attachments.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    health_record = models.ForeignKey(
+        HealthRecord, on_delete=models.CASCADE, related_name='+', db_constraint=False
+    )
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='+', db_index=False)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+class ArchivedHealthRecord(models.Model):
+    """
+    A health record moved to cold storage with its comments, compressed into
+    `data` (see archive.py). It keeps the id it had as a HealthRecord.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # Indexed as the leading column of hr_archive_patient_visit_idx
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='+', db_index=False)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    record_type = models.CharField(max_length=20, choices=HealthRecord.RECORD_TYPE_CHOICES)
+    visit_date = models.DateTimeField()
+    # Back ?has_comments= without decompressing; patients only count public ones
+    comment_count = models.PositiveIntegerField(default=0)
+    public_comment_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-visit_date', '-id'], name='hr_archive_patient_visit_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived record {self.pk}"
+
+class PatientRecordSummaryManager(models.Manager):
+    def aggregates(self):
+        """Aggregates over HealthRecord rows, named after the summary fields"""
+        aggregates = {'total_records': Count('id'), 'last_visit': Max('visit_date')}
+        for record_type, _ in HealthRecord.RECORD_TYPE_CHOICES:
+            aggregates[f'{record_type.lower()}_count'] = Count('id', filter=Q(record_type=record_type))
+        return aggregates
+    
+    def compute(self, patient_ids):
+        """
+        Summary values recomputed from HealthRecord and ArchivedHealthRecord
+        (archived records still count), keyed by patient id
+        """
+        empty = {name: 0 for name in self.aggregates()}
+        empty['last_visit'] = None
+        
+        hot, archived = (
+            model.objects.using(self.db).filter(patient_id__in=patient_ids).order_by().values('patient_id').annotate(
+                **self.aggregates()
+            )
+            for model in (HealthRecord, ArchivedHealthRecord)
+        )
+        computed = {patient_id: dict(empty) for patient_id in patient_ids}
+        # One round trip, at most two rows per patient
+        for row in hot.union(archived, all=True):
+            values = computed[row.pop('patient_id')]
+            last_visit = row.pop('last_visit')
+            if values['last_visit'] is None or last_visit > values['last_visit']:
+                values['last_visit'] = last_visit
+            for name, count in row.items():
+                values[name] += count
+        return computed
+    
+    def refresh(self, patient_ids):
+        """Recompute the summaries of the given patients"""
+        patient_ids = sorted({patient_id for patient_id in patient_ids if patient_id})
+        if not patient_ids:
+            return
+        
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Lock first so concurrent writers for a patient recompute one after another
+            list(self.select_for_update().filter(patient_id__in=patient_ids).values_list('pk', flat=True))
+            now = timezone.now()
+            for patient_id, values in self.compute(patient_ids).items():
+                # Update only: rows are created with the patient, and must not
+                # be recreated while a patient is being cascade-deleted
+                self.filter(patient_id=patient_id).update(updated_at=now, **values)
+    
+    def rebuild(self, batch_size=1000):
+        """Recreate every summary from scratch. Returns the number of rows written."""
+        written = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            self.all().delete()
+            patient_ids = PatientProfile.objects.order_by('pk').values_list('pk', flat=True)
+            for batch in _batches(patient_ids.iterator(chunk_size=batch_size), batch_size):
+                self.bulk_create([
+                    PatientRecordSummary(patient_id=patient_id, **values)
+                    for patient_id, values in self.compute(batch).items()
+                ])
+                written += len(batch)
+        return written
+    
+    def inconsistencies(self, batch_size=1000):
+        """Yield (patient_id, stored values or None, expected values) for every stale summary"""
+        fields = list(self.aggregates())
+        patient_ids = PatientProfile.objects.order_by('pk').values_list('pk', flat=True)
+        for batch in _batches(patient_ids.iterator(chunk_size=batch_size), batch_size):
+            stored = {
+                row.pop('patient_id'): row
+                for row in self.filter(patient_id__in=batch).values('patient_id', *fields)
+            }
+            for patient_id, expected in self.compute(batch).items():
+                if stored.get(patient_id) != expected:
+                    yield patient_id, stored.get(patient_id), expected
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class PatientRecordSummary(models.Model):
+    """
+    Per-patient record statistics, kept in step with HealthRecord writes
+    (see HealthRecordQuerySet and signals) so panels read one row per patient.
+    Rebuild and check with the rebuild_patient_summaries command.
+    """
+    patient = models.OneToOneField(PatientProfile, on_delete=models.CASCADE, primary_key=True, related_name='record_summary')
+    total_records = models.PositiveIntegerField(default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
+    # One counter per HealthRecord.RECORD_TYPE_CHOICES entry, named <type>_count
+    checkup_count = models.PositiveIntegerField(default=0)
+    diagnosis_count = models.PositiveIntegerField(default=0)
+    prescription_count = models.PositiveIntegerField(default=0)
+    lab_result_count = models.PositiveIntegerField(default=0)
+    emergency_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = PatientRecordSummaryManager()
+    
+    def __str__(self):
+        return f"{self.patient} - {self.total_records} records"
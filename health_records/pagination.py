@@ -0,0 +1,76 @@
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+class VisitDateCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (visit_date, id), newest first.
+
+    Unlike PageNumberPagination there is no COUNT(*) and no OFFSET, so every
+    page is a single range scan on visit_date no matter how deep the client goes.
+    The id tie-breaker keeps pages stable when several records share a visit_date.
+    """
+    ordering = ('-visit_date', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        if reverse:
+            queryset = queryset.order_by('visit_date', 'id')
+        else:
+            queryset = queryset.order_by('-visit_date', '-id')
+
+        if self.cursor is not None and self.cursor.position is not None:
+            visit_date, pk = self.decode_position(self.cursor.position)
+            # Written as a range on visit_date plus a tie-breaker exclusion so an
+            # index on visit_date can serve it as a plain range scan.
+            if reverse:
+                queryset = queryset.filter(visit_date__gte=visit_date).exclude(visit_date=visit_date, id__lte=pk)
+            else:
+                queryset = queryset.filter(visit_date__lte=visit_date).exclude(visit_date=visit_date, id__gte=pk)
+
+        # Fetch one extra row to find out whether another page follows
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0])))
+
+    def encode_position(self, instance):
+        return f'{instance.visit_date.isoformat()}|{instance.pk}'
+
+    def decode_position(self, position):
+        try:
+            visit_date, pk = position.rsplit('|', 1)
+            visit_date = parse_datetime(visit_date)
+            pk = int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        if visit_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return visit_date, pk
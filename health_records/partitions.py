@@ -0,0 +1,155 @@
+"""
+Yearly range partitioning of the health record table on PostgreSQL.
+
+The table is partitioned on visit_date with one partition per calendar year
+(UTC), plus a default partition for rows outside them. Queries that bound
+visit_date only scan the years they cover. Vacuum, reindexing and analyze
+work one year at a time. Migration 0008 rebuilds an existing table into this
+layout inside its transaction, so it holds an exclusive lock while the rows
+are copied. ensure_partitions() keeps PARTITIONS_AHEAD future years ready;
+it runs daily from Celery beat and on demand via create_record_partitions.
+
+PostgreSQL requires the partition key in every unique constraint. The primary
+key is therefore (id, visit_date), with ids still drawn from one sequence,
+and comments reference records without a database foreign key (Django still
+cascades deletes). Row triggers on partitioned tables need PostgreSQL 13 or
+later. Other databases keep a plain table.
+"""
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, transaction
+from django.utils import timezone
+
+from . import search
+from .search import RECORD_TABLE
+
+PARTITIONS_AHEAD = 2
+# connection.pg_version of PostgreSQL 13
+MIN_POSTGRESQL_VERSION = 130000
+
+DEFAULT_PARTITION = f'{RECORD_TABLE}_default'
+SEQUENCE = f'{RECORD_TABLE}_id_seq'
+
+def partition_name(year):
+    return f'{RECORD_TABLE}_y{year}'
+
+def _bounds(year):
+    return f"'{year}-01-01 00:00:00+00'", f"'{year + 1}-01-01 00:00:00+00'"
+
+def is_partitioned(cursor):
+    cursor.execute(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [RECORD_TABLE]
+    )
+    return cursor.fetchone()[0]
+
+def partition_years(cursor):
+    cursor.execute(
+        'SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s)', [RECORD_TABLE]
+    )
+    prefix = partition_name('')
+    return {int(name[len(prefix):]) for (name,) in cursor.fetchall() if name.startswith(prefix)}
+
+def create_partition_sql(year):
+    """Attach a partition for `year`, taking over its rows from the default partition"""
+    name = partition_name(year)
+    start, end = _bounds(year)
+    return [
+        f'CREATE TABLE {name} (LIKE {RECORD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        f'WITH moved AS ('
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE visit_date >= {start} AND visit_date < {end} RETURNING *'
+        f') INSERT INTO {name} SELECT * FROM moved',
+        f'ALTER TABLE {RECORD_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})',
+    ]
+
+def ensure_partitions(years=None, using=DEFAULT_DB_ALIAS):
+    """
+    Create the missing partitions for `years`, by default this year and the
+    PARTITIONS_AHEAD after it. Returns the names of the partitions created.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+    if years is None:
+        this_year = timezone.now().year
+        years = range(this_year, this_year + PARTITIONS_AHEAD + 1)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        missing = sorted(set(years) - partition_years(cursor))
+        for year in missing:
+            for statement in create_partition_sql(year):
+                cursor.execute(statement)
+    return [partition_name(year) for year in missing]
+
+def partition_table(connection):
+    """Rebuild the record table as a partitioned table"""
+    if connection.pg_version < MIN_POSTGRESQL_VERSION:
+        raise NotSupportedError('Partitioned health records need PostgreSQL 13 or later')
+    _rebuild(connection, partitioned=True)
+
+def unpartition_table(connection):
+    """Rebuild the record table as a plain table"""
+    _rebuild(connection, partitioned=False)
+
+def _rebuild(connection, partitioned):
+    """
+    Copy the record table into a new table with the same columns, defaults,
+    indexes, foreign keys and search trigger, then drop the old one.
+    """
+    old_table = f'{RECORD_TABLE}_old'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s',
+            [RECORD_TABLE, f'{RECORD_TABLE}_pkey']
+        )
+        indexes = [indexdef for (indexdef,) in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [RECORD_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f"SELECT GREATEST(COALESCE(max(id), 0), COALESCE(pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass), 0)), "
+            f"array_agg(DISTINCT EXTRACT(YEAR FROM visit_date AT TIME ZONE 'UTC')::int) FROM {RECORD_TABLE}",
+            [RECORD_TABLE]
+        )
+        last_id, data_years = cursor.fetchone()
+
+        # Free the sequence name whether ids came from an identity column or a serial
+        cursor.execute(f'ALTER TABLE {RECORD_TABLE} RENAME TO {old_table}')
+        cursor.execute(f'ALTER TABLE {old_table} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {old_table} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE}')
+
+        cursor.execute(
+            f'CREATE TABLE {RECORD_TABLE} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)'
+            + (' PARTITION BY RANGE (visit_date)' if partitioned else '')
+        )
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {RECORD_TABLE}.id')
+        cursor.execute(f"ALTER TABLE {RECORD_TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute('SELECT setval(%s, %s, %s)', [SEQUENCE, max(last_id, 1), last_id > 0])
+
+        if partitioned:
+            this_year = timezone.now().year
+            years = set(data_years or []) | set(range(this_year, this_year + PARTITIONS_AHEAD + 1))
+            for year in sorted(years):
+                start, end = _bounds(year)
+                cursor.execute(
+                    f'CREATE TABLE {partition_name(year)} PARTITION OF {RECORD_TABLE} FOR VALUES FROM ({start}) TO ({end})'
+                )
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {RECORD_TABLE} DEFAULT')
+
+        # Copy before indexing: building the indexes once is faster than maintaining them per row
+        cursor.execute(f'INSERT INTO {RECORD_TABLE} SELECT * FROM {old_table}')
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        key = 'id, visit_date' if partitioned else 'id'
+        cursor.execute(f'ALTER TABLE {RECORD_TABLE} ADD CONSTRAINT {RECORD_TABLE}_pkey PRIMARY KEY ({key})')
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {RECORD_TABLE} ADD CONSTRAINT {name} {definition}')
+        # The search column was copied with the rows; only the trigger is missing
+        for statement in search.postgres_setup_sql(backfill=False):
+            cursor.execute(statement)
+        cursor.execute(f'ANALYZE {RECORD_TABLE}')
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from accounts.assignments import is_assigned
+
 class IsPatientOwnerOrAssignedDoctor(permissions.BasePermission):
     """
     Permission to allow patients to access their own records
@@ -8,15 +10,17 @@ class IsPatientOwnerOrAssignedDoctor(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         user = request.user
+        profile = user.profile
+        if profile is None:
+            return False
         
         # Patient can access their own records
         if user.user_type == 'PATIENT':
-            return obj.patient.user == user
+            return obj.patient_id == profile.pk
         
         # Doctor can access records of assigned patients
         if user.user_type == 'DOCTOR':
-            doctor_profile = user.doctorprofile
-            return obj.patient.assigned_doctor == doctor_profile
+            return is_assigned(profile.pk, obj.patient_id)
         
         return False
 
@@ -35,6 +39,6 @@ class IsDoctorAssignedToPatient(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         if request.user.user_type == 'DOCTOR':
-            doctor_profile = request.user.doctorprofile
-            return obj.patient.assigned_doctor == doctor_profile
+            doctor_profile = request.user.profile
+            return doctor_profile is not None and is_assigned(doctor_profile.pk, obj.patient_id)
         return False
@@ -0,0 +1,149 @@
+"""
+Full-text search over the clinical text of health records.
+
+PostgreSQL keeps a weighted tsvector column (search_vector) on the record
+table, maintained by a trigger and served by a GIN index. SQLite, used for
+local and test runs, keeps an FTS5 external-content table in sync through
+triggers instead. Both are created by migration 0004_search_index; the
+column and the FTS table are deliberately not part of the Django model.
+The setup statements are idempotent, so a later migration that rebuilds the
+record table (SQLite drops its triggers when it does) can simply re-run them.
+
+Weights, highest first:
+    A  title, diagnosis
+    B  symptoms, medications
+    C  description, treatment
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'english'
+
+RECORD_TABLE = 'health_records_healthrecord'
+FTS_TABLE = 'health_records_healthrecord_fts'
+
+WEIGHTED_COLUMNS = [
+    ('title', 'A'),
+    ('diagnosis', 'A'),
+    ('symptoms', 'B'),
+    ('medications', 'B'),
+    ('description', 'C'),
+    ('treatment', 'C'),
+]
+
+# bm25() column weights for the FTS5 fallback, in WEIGHTED_COLUMNS order
+FTS_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0}
+
+def postgres_setup_sql(backfill=True):
+    vector = ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.{column}, '')), '{weight}')"
+        for column, weight in WEIGHTED_COLUMNS
+    )
+    columns = ', '.join(column for column, _ in WEIGHTED_COLUMNS)
+    statements = [
+        f'ALTER TABLE {RECORD_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f"""
+        CREATE OR REPLACE FUNCTION {RECORD_TABLE}_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {vector};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f'DROP TRIGGER IF EXISTS {RECORD_TABLE}_search_vector_trigger ON {RECORD_TABLE}',
+        f"""
+        CREATE TRIGGER {RECORD_TABLE}_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF {columns} ON {RECORD_TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {RECORD_TABLE}_search_vector_update()
+        """,
+        f'CREATE INDEX IF NOT EXISTS hr_search_vector_idx ON {RECORD_TABLE} USING gin (search_vector)',
+    ]
+    if backfill:
+        # Fill in existing rows through the trigger
+        statements.append(f'UPDATE {RECORD_TABLE} SET title = title')
+    return statements
+
+def postgres_teardown_sql():
+    return [
+        f'DROP TRIGGER IF EXISTS {RECORD_TABLE}_search_vector_trigger ON {RECORD_TABLE}',
+        f'DROP FUNCTION IF EXISTS {RECORD_TABLE}_search_vector_update()',
+        f'ALTER TABLE {RECORD_TABLE} DROP COLUMN IF EXISTS search_vector',
+    ]
+
+def sqlite_setup_sql():
+    columns = ', '.join(column for column, _ in WEIGHTED_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column, _ in WEIGHTED_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column, _ in WEIGHTED_COLUMNS)
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {columns}, content='{RECORD_TABLE}', content_rowid='id', tokenize='porter'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {RECORD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {RECORD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {columns} ON {RECORD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        """,
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+def sqlite_teardown_sql():
+    return [
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    ]
+
+def fts5_query(query):
+    """
+    Turn free text into a safe FTS5 query: every word must match, as a quoted
+    term so that user input can never be parsed as FTS5 syntax.
+    """
+    return ' '.join(f'"{term}"' for term in re.findall(r'\w+', query))
+
+def search_records(queryset, query):
+    """
+    Narrow a HealthRecord queryset to records matching `query`, annotated with
+    `rank` (higher is better) and ordered by it. Scoping is left to the caller.
+    """
+    if connection.vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        matches = RawSQL(f'{RECORD_TABLE}.search_vector @@ {tsquery}', [query], output_field=BooleanField())
+        rank = RawSQL(f'ts_rank_cd({RECORD_TABLE}.search_vector, {tsquery})', [query], output_field=FloatField())
+
+    elif connection.vendor == 'sqlite':
+        query = fts5_query(query)
+        if not query:
+            return queryset.none()
+        weights = ', '.join(str(FTS_WEIGHTS[weight]) for _, weight in WEIGHTED_COLUMNS)
+        matches = RawSQL(
+            f'{RECORD_TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            [query], output_field=BooleanField()
+        )
+        # bm25() is lower-is-better, so negate it to match ts_rank_cd
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {RECORD_TABLE}.id)',
+            [query], output_field=FloatField()
+        )
+
+    else:
+        raise NotImplementedError(f'Full-text search is not supported on {connection.vendor}')
+
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', '-visit_date', '-id')
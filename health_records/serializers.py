@@ -1,5 +1,7 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import HealthRecord, DoctorComment
+from .models import AttachmentUpload, HealthRecord, HealthRecordAttachment, HealthRecordQuerySet, DoctorComment
 from accounts.serializers import UserSerializer, DoctorProfileSerializer
 
 class DoctorCommentSerializer(serializers.ModelSerializer):
@@ -11,24 +13,92 @@ class DoctorCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['doctor', 'created_at', 'updated_at']
 
 class HealthRecordSerializer(serializers.ModelSerializer):
+    """
+    Full representation by default. Clients can trim it with ?fields=a,b,c and
+    opt in to nested data with ?expand=comments,created_by; once either is
+    given, anything not asked for is neither loaded nor serialized.
+    """
     created_by = UserSerializer(read_only=True)
     doctor_comments = serializers.SerializerMethodField()
     
+    EXPANDABLE = HealthRecordQuerySet.EXPANSIONS
+    # Fields kept even when ?fields= does not list them
+    ALWAYS_INCLUDED = ()
+    
     class Meta:
         model = HealthRecord
         fields = '__all__'
         read_only_fields = ['patient', 'created_by', 'created_at', 'updated_at']
     
+    @classmethod
+    def parse_field_selection(cls, query_params):
+        """
+        Return (fields, expand) from the query string, or (None, None) when the
+        client wants the full representation. fields is None when only expand is given.
+        """
+        fields = query_params.get('fields')
+        expand = query_params.get('expand')
+        if fields is None and expand is None:
+            return None, None
+        
+        if fields is not None:
+            fields = {name.strip() for name in fields.split(',') if name.strip()}
+            allowed = {field.name for field in HealthRecord._meta.concrete_fields}
+            unknown = fields - allowed
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        
+        expand = {name.strip() for name in (expand or '').split(',') if name.strip()}
+        unknown = expand - set(cls.EXPANDABLE)
+        if unknown:
+            raise serializers.ValidationError({'expand': f"Unknown expansions: {', '.join(sorted(unknown))}"})
+        
+        return fields, expand
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None:
+            return fields
+        
+        requested, expand = self.parse_field_selection(request.query_params)
+        if requested is None and expand is None:
+            return fields
+        
+        if 'comments' not in expand:
+            fields.pop('doctor_comments')
+        if 'created_by' not in expand:
+            fields['created_by'] = serializers.PrimaryKeyRelatedField(read_only=True)
+        
+        if requested is not None:
+            keep = set(requested) | set(self.ALWAYS_INCLUDED)
+            if 'created_by' in expand:
+                keep.add('created_by')
+            if 'comments' in expand:
+                keep.add('doctor_comments')
+            fields = {name: field for name, field in fields.items() if name in keep}
+        
+        return fields
+    
     def get_doctor_comments(self, obj):
-        user = self.context['request'].user
-        comments = obj.doctor_comments.all()
+        # Already filtered by HealthRecordQuerySet.with_display_relations
+        comments = getattr(obj, 'visible_comments', None)
         
-        # If user is a patient, exclude private comments
-        if user.user_type == 'PATIENT':
-            comments = comments.filter(is_private=False)
+        if comments is None:
+            user = self.context['request'].user
+            comments = obj.doctor_comments.select_related('doctor__user')
+            
+            # If user is a patient, exclude private comments
+            if user.user_type == 'PATIENT':
+                comments = comments.filter(is_private=False)
         
         return DoctorCommentSerializer(comments, many=True).data
 
+class HealthRecordSearchResultSerializer(HealthRecordSerializer):
+    rank = serializers.FloatField(read_only=True)
+    
+    ALWAYS_INCLUDED = ('rank',)
+
 class HealthRecordCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = HealthRecord
@@ -37,11 +107,83 @@ class HealthRecordCreateSerializer(serializers.ModelSerializer):
             'diagnosis', 'treatment', 'medications', 'visit_date'
         ]
 
+class HealthRecordFeedSerializer(serializers.ModelSerializer):
+    type = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = HealthRecord
+        fields = ['type', 'id', 'patient', 'record_type', 'title', 'visit_date', 'created_at']
+    
+    def get_type(self, obj):
+        return 'record'
+
+class DoctorCommentFeedSerializer(serializers.ModelSerializer):
+    type = serializers.SerializerMethodField()
+    # Annotated by feed.feed_streams
+    patient = serializers.IntegerField(source='patient_id', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    
+    class Meta:
+        model = DoctorComment
+        fields = ['type', 'id', 'health_record', 'patient', 'doctor', 'doctor_name', 'comment', 'is_private', 'created_at']
+    
+    def get_type(self, obj):
+        return 'comment'
+
 class PatientSummarySerializer(serializers.Serializer):
     id = serializers.IntegerField()
-    name = serializers.CharField()
-    email = serializers.CharField()
-    phone = serializers.CharField()
+    name = serializers.CharField(source='user.get_full_name')
+    email = serializers.CharField(source='user.email')
+    phone = serializers.CharField(source='user.phone_number')
     blood_type = serializers.CharField()
     total_records = serializers.IntegerField()
     last_visit = serializers.DateTimeField(allow_null=True)
+    records_by_type = serializers.SerializerMethodField()
+    unreviewed_records = serializers.IntegerField()
+    
+    def get_records_by_type(self, obj):
+        # Annotated by MyPatientsView as <record_type>_count
+        return {
+            record_type: getattr(obj, f'{record_type.lower()}_count')
+            for record_type, _ in HealthRecord.RECORD_TYPE_CHOICES
+        }
+
+class HealthRecordAttachmentSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(source='blob.size', read_only=True)
+    sha256 = serializers.CharField(source='blob_id', read_only=True)
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = HealthRecordAttachment
+        fields = ['id', 'health_record', 'filename', 'content_type', 'size', 'sha256', 'uploaded_by', 'created_at', 'download_url']
+    
+    def get_download_url(self, obj):
+        url = reverse('attachment-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    content_type = serializers.CharField(max_length=100, default='application/octet-stream')
+    upload_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = AttachmentUpload
+        fields = ['id', 'health_record', 'filename', 'content_type', 'size', 'received', 'created_at', 'upload_url']
+        read_only_fields = ['health_record', 'received', 'created_at']
+    
+    def validate_filename(self, value):
+        # Keep the name only; clients sometimes send a full local path
+        name = value.replace('\\', '/').rsplit('/', 1)[-1].strip()
+        if not name:
+            raise serializers.ValidationError('Must name a file')
+        return name
+    
+    def validate_size(self, value):
+        if not 0 < value <= settings.ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(f'Must be between 1 and {settings.ATTACHMENT_MAX_SIZE} bytes')
+        return value
+    
+    def get_upload_url(self, obj):
+        url = reverse('attachment-upload', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import HealthRecord
+from accounts.models import DoctorProfile, PatientProfile, User
+from .cache import invalidate_patient, invalidate_patients
+from .models import (
+    HealthRecord, DoctorComment, DeletedHealthRecord, PatientRecordSummary, bulk_delete_in_progress
+)
 from notifications.tasks import send_new_record_notification
 
 @receiver(post_save, sender=HealthRecord)
@@ -12,3 +16,52 @@ def notify_doctor_new_record(sender, instance, created, **kwargs):
             instance.patient.user.get_full_name(),
             instance.title
         )
+
+@receiver(post_save, sender=HealthRecord)
+@receiver(post_delete, sender=HealthRecord)
+def refresh_patient_summary(sender, instance, **kwargs):
+    """Recompute the patient's record summary inside the writing transaction"""
+    if not bulk_delete_in_progress.get():
+        PatientRecordSummary.objects.refresh([instance.patient_id])
+
+@receiver(post_delete, sender=HealthRecord)
+def record_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone so synced clients learn about the deletion"""
+    if not bulk_delete_in_progress.get():
+        DeletedHealthRecord.objects.create(record_id=instance.pk, patient_id=instance.patient_id)
+
+@receiver(post_save, sender=PatientProfile)
+def create_patient_summary(sender, instance, created, **kwargs):
+    """Every patient has a summary row, refreshed in place from then on"""
+    if created:
+        PatientRecordSummary.objects.get_or_create(patient=instance)
+
+@receiver(post_save, sender=HealthRecord)
+@receiver(post_delete, sender=HealthRecord)
+def invalidate_record_cache(sender, instance, **kwargs):
+    """Drop cached reads of the record's patient and their assigned doctor"""
+    invalidate_patient(instance.patient_id, instance.patient.assigned_doctor_id)
+
+@receiver(post_save, sender=DoctorComment)
+@receiver(post_delete, sender=DoctorComment)
+def invalidate_comment_cache(sender, instance, **kwargs):
+    """Drop cached reads of the commented record's patient and their assigned doctor"""
+    row = HealthRecord.objects.filter(pk=instance.health_record_id).values_list(
+        'patient_id', 'patient__assigned_doctor_id'
+    ).first()
+    if row is not None:
+        invalidate_patient(*row)
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=DoctorProfile)
+def invalidate_author_cache(sender, instance, created, update_fields=None, **kwargs):
+    """Records embed their author and their comments' doctors; drop cached reads showing them"""
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    patient_ids = set(HealthRecord.objects.filter(created_by_id=user_id).values_list('patient_id', flat=True))
+    patient_ids.update(HealthRecord.objects.filter(doctor_comments__doctor__user_id=user_id).values_list(
+        'patient_id', flat=True
+    ))
+    if patient_ids:
+        invalidate_patients(patient_ids)
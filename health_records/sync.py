@@ -0,0 +1,250 @@
+"""
+Delta sync: which records changed or disappeared since a client's sync token.
+
+Every write to a record or a DeletedHealthRecord tombstone stamps the row
+with the writing transaction's id (change_txid) and a number from a sequence
+shared by both tables (change_seq), through triggers installed by migration
+0011. Changes are read in (change_txid, change_seq) order and only from
+transactions that finished before the oldest one still running (the
+snapshot's xmin). A transaction that commits late is therefore read once it
+has committed: a token never moves past a row that can still appear, however
+long the writer waited for locks. updated_at plays no part. A transaction
+also sees its own changes, which only matters to tests: each one runs in a
+single transaction.
+
+SQLite, used for local and test runs, lets one writer in at a time, so there
+change_seq alone orders commits, numbered from a counter table, and
+change_txid stays 0. As with search.py's column, neither column is part of
+the Django models; install() is idempotent and can be re-run after a
+migration that rebuilds one of the tables (SQLite drops the columns and
+triggers when it does).
+
+Updates and deletions are read in one UNION query over the
+(patient, change_txid, change_seq) indexes, so a sync with nothing new is a
+single indexed statement. The token holds one (change_txid, change_seq)
+position per stream.
+
+A doctor's token also records DoctorProfile.assignment_version. Assigning a
+patient brings in records changed before the token, and unassigning one
+hides records without a tombstone, so neither shows up as a change: once the
+version moved, the client has to sync again from scratch.
+"""
+import base64
+import json
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BigIntegerField, BooleanField, CharField, F, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers
+
+from accounts.models import DoctorProfile
+
+from .models import DeletedHealthRecord
+from .search import RECORD_TABLE
+
+STREAMS = ('updated', 'deleted')
+
+TOMBSTONE_TABLE = DeletedHealthRecord._meta.db_table
+# table -> index over (patient_id, change_txid, change_seq)
+CHANGE_INDEXES = {
+    RECORD_TABLE: 'hr_patient_change_idx',
+    TOMBSTONE_TABLE: 'hr_tombstone_change_idx',
+}
+CHANGE_SEQUENCE = 'health_records_change_seq'
+STAMP_FUNCTION = 'health_records_stamp_change'
+# SQLite stand-in for CHANGE_SEQUENCE
+COUNTER_TABLE = 'health_records_changecounter'
+
+# Finished before every transaction still running, or written by this one
+POSTGRES_VISIBLE = (
+    '({table}.change_txid < txid_snapshot_xmin(txid_current_snapshot()) '
+    'OR {table}.change_txid = txid_current_if_assigned())'
+)
+
+def postgres_setup_sql():
+    statements = [
+        f'CREATE SEQUENCE IF NOT EXISTS {CHANGE_SEQUENCE}',
+        f"""
+        CREATE OR REPLACE FUNCTION {STAMP_FUNCTION}() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_txid := txid_current();
+            NEW.change_seq := nextval('{CHANGE_SEQUENCE}');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+    for table, index in CHANGE_INDEXES.items():
+        statements += [
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_txid bigint NOT NULL DEFAULT 0',
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_seq bigint NOT NULL DEFAULT 0',
+            f'DROP TRIGGER IF EXISTS {table}_change_trigger ON {table}',
+            f"""
+            CREATE TRIGGER {table}_change_trigger BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {STAMP_FUNCTION}()
+            """,
+            # Stamp existing rows through the trigger
+            f'UPDATE {table} SET change_seq = 0 WHERE change_seq = 0',
+            f'CREATE INDEX IF NOT EXISTS {index} ON {table} (patient_id, change_txid, change_seq)',
+        ]
+    return statements
+
+def postgres_teardown_sql():
+    statements = []
+    for table in CHANGE_INDEXES:
+        statements += [
+            f'DROP TRIGGER IF EXISTS {table}_change_trigger ON {table}',
+            f'ALTER TABLE {table} DROP COLUMN IF EXISTS change_txid',
+            f'ALTER TABLE {table} DROP COLUMN IF EXISTS change_seq',
+        ]
+    return statements + [
+        f'DROP FUNCTION IF EXISTS {STAMP_FUNCTION}()',
+        f'DROP SEQUENCE IF EXISTS {CHANGE_SEQUENCE}',
+    ]
+
+def sqlite_setup_sql(existing_columns):
+    """`existing_columns` maps each table to its column names: SQLite cannot ADD COLUMN IF NOT EXISTS"""
+    statements = [
+        f'CREATE TABLE IF NOT EXISTS {COUNTER_TABLE} (value integer NOT NULL)',
+        f'INSERT INTO {COUNTER_TABLE} (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM {COUNTER_TABLE})',
+    ]
+    stamp = f"""
+            UPDATE {COUNTER_TABLE} SET value = value + 1;
+            UPDATE {{table}} SET change_seq = (SELECT value FROM {COUNTER_TABLE}) WHERE id = new.id;
+    """
+    for table, index in CHANGE_INDEXES.items():
+        statements += [
+            f'ALTER TABLE {table} ADD COLUMN {column} integer NOT NULL DEFAULT 0'
+            for column in ('change_txid', 'change_seq') if column not in existing_columns[table]
+        ]
+        statements += [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table} BEGIN
+                {stamp.format(table=table)}
+            END
+            """,
+            # The WHEN clause keeps the trigger's own stamping from firing it again
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE ON {table}
+            WHEN new.change_seq IS old.change_seq BEGIN
+                {stamp.format(table=table)}
+            END
+            """,
+            f'UPDATE {table} SET change_seq = 0 WHERE change_seq = 0',
+            f'CREATE INDEX IF NOT EXISTS {index} ON {table} (patient_id, change_txid, change_seq)',
+        ]
+    return statements
+
+def sqlite_teardown_sql():
+    statements = []
+    for table, index in CHANGE_INDEXES.items():
+        statements += [
+            f'DROP TRIGGER IF EXISTS {table}_change_insert',
+            f'DROP TRIGGER IF EXISTS {table}_change_update',
+            f'DROP INDEX IF EXISTS {index}',
+            f'ALTER TABLE {table} DROP COLUMN change_txid',
+            f'ALTER TABLE {table} DROP COLUMN change_seq',
+        ]
+    return statements + [f'DROP TABLE IF EXISTS {COUNTER_TABLE}']
+
+def install(connection):
+    """Add the change columns, triggers and indexes"""
+    if connection.vendor == 'postgresql':
+        statements = postgres_setup_sql()
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            existing_columns = {
+                table: {column.name for column in connection.introspection.get_table_description(cursor, table)}
+                for table in CHANGE_INDEXES
+            }
+        statements = sqlite_setup_sql(existing_columns)
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+def uninstall(connection):
+    if connection.vendor == 'postgresql':
+        statements = postgres_teardown_sql()
+    elif connection.vendor == 'sqlite':
+        statements = sqlite_teardown_sql()
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+def committed_changes(queryset, table):
+    """
+    `queryset` with its change_txid and change_seq as aliases, limited to
+    rows no running transaction can still add to
+    """
+    queryset = queryset.alias(
+        change_txid=RawSQL(f'{table}.change_txid', [], output_field=BigIntegerField()),
+        change_seq=RawSQL(f'{table}.change_seq', [], output_field=BigIntegerField()),
+    )
+    if connections[queryset.db].vendor == 'postgresql':
+        queryset = queryset.filter(RawSQL(POSTGRES_VISIBLE.format(table=table), [], output_field=BooleanField()))
+    return queryset
+
+def initial_positions(tombstones):
+    """Full sync: every record, but none of the tombstones already there"""
+    last = committed_changes(tombstones, TOMBSTONE_TABLE).annotate(
+        txid=F('change_txid'), seq=F('change_seq')
+    ).order_by('-txid', '-seq').values_list('txid', 'seq').first()
+    return {'updated': (0, 0), 'deleted': last or (0, 0)}
+
+def scope_version(user):
+    """Version of the set of patients the user reads records of"""
+    if user.user_type != 'DOCTOR':
+        return 0
+    # From the primary, like the changes it is paired with
+    return DoctorProfile.objects.using(DEFAULT_DB_ALIAS).filter(user=user).values_list(
+        'assignment_version', flat=True
+    ).first() or 0
+
+def encode_token(positions, scope):
+    payload = {stream: list(position) for stream, position in positions.items()}
+    payload['scope'] = scope
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+def decode_token(token):
+    """Return (positions, scope version); (None, None) for tokens holding timestamps"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        stamps = [payload[stream] for stream in STREAMS]
+        if all(isinstance(stamp[0], str) for stamp in stamps):
+            # Issued before positions were change stamps
+            return None, None
+        positions = {stream: (int(txid), int(seq)) for stream, (txid, seq) in zip(STREAMS, stamps)}
+        scope = int(payload['scope'])
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise serializers.ValidationError({'token': 'Invalid token'})
+    return positions, scope
+
+def read_changes(records, tombstones, positions, limit):
+    """
+    Return (updated record ids, deleted record ids, positions, has_more),
+    oldest change first, at most `limit` changes.
+    """
+    def stream(queryset, table, record_field, kind):
+        txid, seq = positions[kind]
+        return committed_changes(queryset, table).filter(
+            Q(change_txid__gt=txid) | Q(change_txid=txid, change_seq__gt=seq)
+        ).order_by().annotate(
+            txid=F('change_txid'), seq=F('change_seq'), ref=F(record_field),
+            kind=Value(kind, output_field=CharField())
+        ).values_list('txid', 'seq', 'ref', 'kind')
+
+    changes = stream(records, RECORD_TABLE, 'pk', 'updated').union(
+        stream(tombstones, TOMBSTONE_TABLE, 'record_id', 'deleted'), all=True
+    ).order_by('txid', 'seq')
+
+    rows = list(changes[:limit + 1])
+    positions = dict(positions)
+    updated, deleted = [], []
+    for txid, seq, ref, kind in rows[:limit]:
+        positions[kind] = (txid, seq)
+        (updated if kind == 'updated' else deleted).append(ref)
+    return updated, deleted, positions, len(rows) > limit
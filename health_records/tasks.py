@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from . import attachments
+from .partitions import ensure_partitions
+
+@shared_task
+def ensure_record_partitions():
+    """Create the coming years' health record partitions ahead of time"""
+    return ensure_partitions()
+
+@shared_task
+def prune_attachments():
+    """Remove abandoned uploads and attachment content no longer referenced"""
+    return attachments.prune_attachments()
@@ -1,3 +1,1656 @@
-from django.test import TestCase
+import base64
+import csv
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.assignments import assigned_patient_ids
+from accounts.models import User, DoctorProfile, PatientProfile
+from health_record_api import compression, db_routing, fastjson
+from notifications.models import Notification
+from . import attachments, feed, partitions
+from .cache import cache_stats, invalidate_patient, reset_cache_stats
+from .models import (
+    ArchivedHealthRecord, AttachmentBlob, AttachmentUpload, DeletedHealthRecord, HealthRecord, HealthRecordAttachment,
+    DoctorComment, PatientRecordSummary
+)
+
+
+class HealthRecordTestMixin:
+    """Shared fixtures: one doctor with two assigned patients"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create_user(
+            username='doctor1', password='securepass123', user_type='DOCTOR',
+            first_name='Gregory', last_name='House'
+        )
+        cls.doctor = DoctorProfile.objects.create(
+            user=cls.doctor_user, specialization='General',
+            license_number='DOC000001', years_of_experience=10
+        )
+        cls.patients = []
+        for i in range(2):
+            user = User.objects.create_user(
+                username=f'patient{i}', password='securepass123', user_type='PATIENT',
+                first_name='Patient', last_name=str(i)
+            )
+            cls.patients.append(PatientProfile.objects.create(
+                user=user, emergency_contact='', assigned_doctor=cls.doctor
+            ))
+        cls.patient = cls.patients[0]
+
+    def setUp(self):
+        # Profile ids repeat between tests, so cached responses must not leak across them
+        cache.clear()
+
+    @classmethod
+    def create_records(cls, patient, count, with_comments=True):
+        # DoctorComment.bulk_create skips the post_save signals, and with them
+        # the response cache invalidation, which is done by hand below
+        now = timezone.now()
+        records = HealthRecord.objects.bulk_create([
+            HealthRecord(
+                patient=patient,
+                record_type='CHECKUP',
+                title=f'Visit {i}',
+                description='Routine checkup',
+                visit_date=now - timedelta(days=i),
+                created_by=patient.user,
+            )
+            for i in range(count)
+        ])
+        if with_comments:
+            DoctorComment.objects.bulk_create([
+                DoctorComment(health_record=record, doctor=cls.doctor, comment=text, is_private=private)
+                for record in records
+                for text, private in [('Looks fine', False), ('Internal note', True)]
+            ])
+        invalidate_patient(patient.id, patient.assigned_doctor_id)
+        return records
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """Fail if the block runs more than `budget` queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        executed = len(ctx.captured_queries)
+        self.assertLessEqual(
+            executed, budget,
+            f'{executed} queries executed, budget is {budget}:\n'
+            + '\n'.join(q['sql'] for q in ctx.captured_queries)
+        )
+
+
+class HealthRecordQueryBudgetTests(HealthRecordTestMixin, APITestCase):
+    """List and detail endpoints must not issue per-row queries"""
+
+    # COUNT, page, comments prefetch; the ETag is taken from the page list() renders
+    LIST_QUERY_BUDGET = 3
+    # ETag row, scoped record, prefetched comments
+    DETAIL_QUERY_BUDGET = 3
+
+    def assertListWithinBudget(self, user):
+        self.client.force_authenticate(user)
+        with self.assertQueryBudget(self.LIST_QUERY_BUDGET):
+            response = self.client.get(reverse('health-record-list'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_patient_list_query_count_is_constant(self):
+        self.create_records(self.patient, 2)
+        self.assertListWithinBudget(self.patient.user)
+
+        self.create_records(self.patient, 15)
+        response = self.assertListWithinBudget(self.patient.user)
+        self.assertEqual(response.data['count'], 17)
+
+    def test_doctor_list_query_count_is_constant(self):
+        self.create_records(self.patients[0], 3)
+        self.assertListWithinBudget(self.doctor_user)
+
+        self.create_records(self.patients[1], 15)
+        response = self.assertListWithinBudget(self.doctor_user)
+        self.assertEqual(response.data['count'], 18)
+
+    def test_patient_list_hides_private_comments(self):
+        self.create_records(self.patient, 3)
+        response = self.assertListWithinBudget(self.patient.user)
+
+        for record in response.data['results']:
+            self.assertEqual([c['comment'] for c in record['doctor_comments']], ['Looks fine'])
+
+    def test_doctor_list_includes_private_comments(self):
+        self.create_records(self.patient, 3)
+        response = self.assertListWithinBudget(self.doctor_user)
+
+        for record in response.data['results']:
+            self.assertEqual(len(record['doctor_comments']), 2)
+
+    def test_detail_query_count_is_constant(self):
+        record = self.create_records(self.patient, 1)[0]
+        DoctorComment.objects.bulk_create([
+            DoctorComment(health_record=record, doctor=self.doctor, comment=f'Note {i}')
+            for i in range(10)
+        ])
+        url = reverse('health-record-detail', args=[record.pk])
+
+        for user in [self.patient.user, self.doctor_user]:
+            self.client.force_authenticate(user)
+            with self.assertQueryBudget(self.DETAIL_QUERY_BUDGET):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class HealthRecordScopedLookupTests(HealthRecordTestMixin, APITestCase):
+    """Detail and comment lookups authorize through the principal's scope"""
+
+    # record's patient, commenting doctor, INSERT, cache invalidation lookup;
+    # the doctor's assigned patients come from the assignment cache
+    COMMENT_QUERY_BUDGET = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_doctor_user = User.objects.create_user(
+            username='doctor2', password='securepass123', user_type='DOCTOR'
+        )
+        DoctorProfile.objects.create(
+            user=cls.other_doctor_user, specialization='General',
+            license_number='DOC000002', years_of_experience=3
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.record = self.create_records(self.patient, 1)[0]
+        self.url = reverse('health-record-detail', args=[self.record.pk])
+
+    def test_other_patient_is_still_forbidden(self):
+        self.client.force_authenticate(self.patients[1].user)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.patch(self.url, {'title': 'Mine now'}).status_code, 403)
+        self.assertEqual(self.client.delete(self.url).status_code, 403)
+        self.assertTrue(HealthRecord.objects.filter(pk=self.record.pk, title='Visit 0').exists())
+
+    def test_unassigned_doctor_is_still_forbidden(self):
+        self.client.force_authenticate(self.other_doctor_user)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        response = self.client.post(reverse('add-doctor-comment', args=[self.record.pk]), {'comment': 'Hello'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(DoctorComment.objects.filter(health_record=self.record).count(), 2)
+
+    def test_missing_record_is_not_found(self):
+        self.client.force_authenticate(self.patients[1].user)
+        self.assertEqual(self.client.get(reverse('health-record-detail', args=[0])).status_code, 404)
+
+        self.client.force_authenticate(self.doctor_user)
+        response = self.client.post(reverse('add-doctor-comment', args=[0]), {'comment': 'Hello'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_archived_record_outside_scope_is_forbidden(self):
+        call_command('archive_health_records', days=-1, stdout=io.StringIO())
+        self.client.force_authenticate(self.patients[1].user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_comment_query_count(self):
+        assigned_patient_ids(self.doctor.pk)
+        self.client.force_authenticate(self.doctor_user)
+        with self.assertQueryBudget(self.COMMENT_QUERY_BUDGET):
+            response = self.client.post(
+                reverse('add-doctor-comment', args=[self.record.pk]), {'comment': 'Follow up in May'}
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['doctor']['user']['username'], 'doctor1')
+        self.assertTrue(DoctorComment.objects.filter(health_record=self.record, comment='Follow up in May').exists())
+
+
+class HealthRecordCursorPaginationTests(HealthRecordTestMixin, APITestCase):
+    """Opt-in keyset pagination on (visit_date, id)"""
+
+    def setUp(self):
+        super().setUp()
+        records = self.create_records(self.patient, 45, with_comments=False)
+        # Collapse visit dates into groups of five so pages have to break ties on id
+        for i, record in enumerate(records):
+            record.visit_date = records[i - i % 5].visit_date
+        HealthRecord.objects.bulk_update(records, ['visit_date'])
+        self.expected = list(
+            HealthRecord.objects.order_by('-visit_date', '-id').values_list('id', flat=True)
+        )
+        self.client.force_authenticate(self.patient.user)
+
+    def test_walks_every_record_once_in_order(self):
+        seen = []
+        url = reverse('health-record-list') + '?pagination=cursor&page_size=7'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(record['id'] for record in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get(reverse('health-record-list') + '?pagination=cursor&page_size=7')
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [r['id'] for r in back.data['results']],
+            [r['id'] for r in first.data['results']]
+        )
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('health-record-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_remains_default(self):
+        response = self.client.get(reverse('health-record-list'))
+        self.assertEqual(response.data['count'], 45)
+
+
+class AccessPatternIndexTests(HealthRecordTestMixin, APITestCase):
+    """The main query behind each list endpoint must be served by an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for patient in cls.patients:
+            cls.create_records(patient, 200)
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=cls.doctor_user, notification_type='NEW_RECORD',
+                title='New Health Record', message='...', is_read=bool(i % 3)
+            )
+            for i in range(300)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == 'postgresql':
+            # The seeded tables are small enough that a sequential scan would
+            # win on cost; make the planner show which index it would use.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """Assert the plan uses one of index_names (either may win on cost)"""
+        plan = queryset.explain()
+        names = [name for index_name in index_names for name in self.index_and_partitions(index_name)]
+        self.assertTrue(any(name in plan for name in names), plan)
+
+    def assertNoSort(self, queryset):
+        """Assert the rows come back in index order, without a sort step"""
+        plan = queryset.explain()
+        marker = 'Sort' if connection.vendor == 'postgresql' else 'TEMP B-TREE'
+        self.assertNotIn(marker, plan, plan)
+
+    def index_and_partitions(self, index_name):
+        """An index and, on a partitioned table, the per-partition indexes created from it"""
+        names = [index_name]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s)', [index_name])
+                names += [name for (name,) in cursor.fetchall()]
+        return names
+
+    def test_patient_record_list(self):
+        self.assertUsesIndex(HealthRecord.objects.filter(patient=self.patient), 'hr_patient_visit_idx')
+
+    def test_patient_record_cursor_page(self):
+        boundary = HealthRecord.objects.filter(patient=self.patient)[50]
+        queryset = HealthRecord.objects.filter(
+            patient=self.patient, visit_date__lte=boundary.visit_date
+        ).exclude(visit_date=boundary.visit_date, id__gte=boundary.id).order_by('-visit_date', '-id')
+        self.assertUsesIndex(queryset, 'hr_patient_visit_idx')
+
+    def test_doctor_panel_record_list(self):
+        queryset = HealthRecord.objects.filter(patient__assigned_doctor=self.doctor)
+        self.assertUsesIndex(queryset, 'patient_doctor_idx')
+        # Any of the patient-leading record indexes serves the join
+        self.assertUsesIndex(queryset, 'hr_patient_visit_idx', 'hr_patient_type_visit_idx', 'hr_patient_change_idx')
+
+    def test_record_type_date_range_filter(self):
+        queryset = HealthRecord.objects.filter(
+            patient=self.patient, record_type='LAB_RESULT',
+            visit_date__gte=timezone.now() - timedelta(days=90)
+        )
+        self.assertUsesIndex(queryset, 'hr_patient_type_visit_idx')
+
+    def test_doctor_comment_prefetch(self):
+        record_ids = HealthRecord.objects.filter(patient=self.patient).values_list('id', flat=True)[:20]
+        queryset = DoctorComment.objects.filter(health_record__in=list(record_ids))
+        self.assertUsesIndex(queryset, 'comment_record_created_idx')
+
+    def test_notification_list(self):
+        queryset = Notification.objects.filter(recipient=self.doctor_user)
+        self.assertUsesIndex(queryset, 'notif_recipient_created_idx')
+        self.assertNoSort(queryset)
+
+    def test_unread_notifications(self):
+        queryset = Notification.objects.filter(recipient=self.doctor_user, is_read=False)
+        self.assertUsesIndex(queryset, 'notif_unread_idx')
+
+
+class HealthRecordFieldSelectionTests(HealthRecordTestMixin, APITestCase):
+    """?fields= and ?expand= trim both the payload and the SELECT"""
+
+    def setUp(self):
+        super().setUp()
+        self.record = self.create_records(self.patient, 3)[0]
+        self.client.force_authenticate(self.patient.user)
+
+    def test_sparse_fields_skip_unrequested_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('health-record-list') + '?fields=id,title,record_type,visit_date')
+
+        self.assertEqual(response.status_code, 200)
+        for record in response.data['results']:
+            self.assertEqual(set(record), {'id', 'title', 'record_type', 'visit_date'})
+
+        record_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "health_records_healthrecord"' in q['sql']]
+        page_query = record_queries[-1]
+        self.assertNotIn('"description"', page_query)
+        self.assertNotIn('accounts_user', page_query)
+        self.assertFalse(any('health_records_doctorcomment' in q['sql'] for q in ctx.captured_queries))
+
+    def test_expand_embeds_requested_relations(self):
+        response = self.client.get(reverse('health-record-list') + '?fields=id,title&expand=comments,created_by')
+
+        record = response.data['results'][0]
+        self.assertEqual(set(record), {'id', 'title', 'doctor_comments', 'created_by'})
+        self.assertEqual(record['created_by']['username'], self.patient.user.username)
+        self.assertEqual([c['comment'] for c in record['doctor_comments']], ['Looks fine'])
+
+    def test_created_by_is_an_id_unless_expanded(self):
+        response = self.client.get(reverse('health-record-detail', args=[self.record.pk]) + '?fields=id,created_by')
+
+        self.assertEqual(response.data, {'id': self.record.pk, 'created_by': self.patient.user.pk})
+
+    def test_expand_alone_keeps_all_fields(self):
+        response = self.client.get(reverse('health-record-detail', args=[self.record.pk]) + '?expand=created_by')
+
+        self.assertIn('description', response.data)
+        self.assertIsInstance(response.data['created_by'], dict)
+        self.assertNotIn('doctor_comments', response.data)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('health-record-list') + '?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+    def test_no_selection_returns_full_representation(self):
+        response = self.client.get(reverse('health-record-detail', args=[self.record.pk]))
+        self.assertIn('doctor_comments', response.data)
+        self.assertIn('description', response.data)
+        self.assertIsInstance(response.data['created_by'], dict)
+
+
+class HealthRecordFilterTests(HealthRecordTestMixin, APITestCase):
+    """record_type, visit_date range, patient_id and has_comments filters"""
+
+    def setUp(self):
+        super().setUp()
+        records = self.create_records(self.patient, 10, with_comments=False)
+        for record in records[:4]:
+            record.record_type = 'LAB_RESULT'
+        HealthRecord.objects.bulk_update(records, ['record_type'])
+        self.records = records
+        self.create_records(self.patients[1], 3, with_comments=False)
+
+    def get_ids(self, query):
+        response = self.client.get(reverse('health-record-list') + query)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {record['id'] for record in response.data['results']}
+
+    def test_record_type_and_date_range(self):
+        self.client.force_authenticate(self.patient.user)
+        since = (timezone.now() - timedelta(days=2)).date().isoformat()
+
+        ids = self.get_ids(f'?record_type=LAB_RESULT&visit_date__gte={since}')
+
+        self.assertEqual(ids, {r.id for r in self.records[:3]})
+
+    def test_visit_date_lte_date_includes_whole_day(self):
+        self.client.force_authenticate(self.patient.user)
+        today = timezone.now().date().isoformat()
+
+        self.assertEqual(len(self.get_ids(f'?visit_date__lte={today}')), 10)
+        self.assertEqual(len(self.get_ids('?visit_date__lte=9999-12-31')), 10)
+
+    def test_doctor_patient_filter(self):
+        self.client.force_authenticate(self.doctor_user)
+
+        self.assertEqual(len(self.get_ids('')), 13)
+        self.assertEqual(len(self.get_ids(f'?patient_id={self.patients[1].id}')), 3)
+
+    def test_has_comments_ignores_private_comments_for_patients(self):
+        DoctorComment.objects.create(health_record=self.records[0], doctor=self.doctor, comment='Public')
+        DoctorComment.objects.create(health_record=self.records[1], doctor=self.doctor, comment='Private', is_private=True)
+
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.get_ids('?has_comments=true'), {self.records[0].id})
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.get_ids('?has_comments=true'), {self.records[0].id, self.records[1].id})
+
+    def test_invalid_values_are_rejected(self):
+        self.client.force_authenticate(self.patient.user)
+        for query in [
+            '?record_type=XRAY', '?visit_date__gte=yesterday', '?has_comments=maybe', '?patient_id=abc',
+            '?visit_date__lte=9999-12-31T23:00:00-05:00',
+        ]:
+            response = self.client.get(reverse('health-record-list') + query)
+            self.assertEqual(response.status_code, 400, query)
+
+
+class HealthRecordSearchTests(HealthRecordTestMixin, APITestCase):
+    """Ranked full-text search, scoped like the record list"""
+
+    def setUp(self):
+        super().setUp()
+        # Records are created before the doctor is assigned so no notification task is queued
+        PatientProfile.objects.filter(pk__in=[p.pk for p in self.patients]).update(assigned_doctor=None)
+        self.title_match = self.make_record(self.patient, 'Asthma review', description='Follow-up visit')
+        self.text_match = self.make_record(self.patient, 'Follow-up', description='Mild asthma symptoms at night')
+        self.other = self.make_record(self.patient, 'Broken wrist', diagnosis='Distal radius fracture')
+        self.other_patient = self.make_record(self.patients[1], 'Asthma', diagnosis='Asthma')
+        PatientProfile.objects.filter(pk=self.patient.pk).update(assigned_doctor=self.doctor)
+
+    def make_record(self, patient, title, description='', **text):
+        return HealthRecord.objects.create(
+            patient=patient, record_type='DIAGNOSIS', title=title, description=description,
+            visit_date=timezone.now(), created_by=patient.user, **text
+        )
+
+    def search(self, user, query):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('health-record-search'), {'q': query})
+
+    def test_ranks_weighted_matches_first(self):
+        response = self.search(self.patient.user, 'asthma')
+
+        self.assertEqual(response.status_code, 200)
+        ids = [record['id'] for record in response.data['results']]
+        self.assertEqual(ids, [self.title_match.id, self.text_match.id])
+        self.assertGreater(response.data['results'][0]['rank'], response.data['results'][1]['rank'])
+
+    def test_respects_record_scoping(self):
+        self.assertNotIn(
+            self.other_patient.id,
+            [record['id'] for record in self.search(self.doctor_user, 'asthma').data['results']]
+        )
+        self.assertEqual(self.search(self.patients[1].user, 'asthma').data['count'], 1)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.other.diagnosis = 'Exercise-induced asthma'
+        self.other.save()
+        self.text_match.delete()
+
+        ids = {record['id'] for record in self.search(self.patient.user, 'asthma').data['results']}
+        self.assertEqual(ids, {self.title_match.id, self.other.id})
+
+    def test_query_syntax_characters_are_harmless(self):
+        response = self.search(self.patient.user, 'asthma" OR (NEAR*')
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.search(self.patient.user, '  ').status_code, 400)
+
+
+class HealthRecordConditionalGetTests(HealthRecordTestMixin, APITestCase):
+    """ETag revalidation on record list and detail"""
+
+    def setUp(self):
+        super().setUp()
+        self.records = self.create_records(self.patient, 3)
+        self.client.force_authenticate(self.patient.user)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_detail_returns_304(self):
+        url = reverse('health-record-detail', args=[self.records[0].pk])
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        # Answered from the ETag row alone
+        with self.assertQueryBudget(1):
+            response = self.revalidate(url, first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_comment_changes_detail_etag(self):
+        url = reverse('health-record-detail', args=[self.records[0].pk])
+        etag = self.client.get(url)['ETag']
+
+        DoctorComment.objects.create(health_record=self.records[0], doctor=self.doctor, comment='Follow up')
+
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_renamed_doctor_changes_etags(self):
+        urls = [reverse('health-record-list'), reverse('health-record-detail', args=[self.records[0].pk])]
+        for shared, name in [(False, 'Wilson'), (True, 'Cuddy')]:
+            with self.subTest(shared=shared), override_settings(CACHE_IS_SHARED=shared):
+                etags = [self.client.get(url)['ETag'] for url in urls]
+
+                # Comments embed the doctor's name
+                doctor_user = User.objects.get(pk=self.doctor_user.pk)
+                doctor_user.last_name = name
+                doctor_user.save()
+
+                for url, etag in zip(urls, etags):
+                    response = self.revalidate(url, etag)
+                    self.assertEqual(response.status_code, 200, url)
+                    self.assertIn(name, json.dumps(response.data))
+
+    def test_deleted_record_changes_list_etag(self):
+        url = reverse('health-record-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        self.records[-1].delete()
+
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_list_etag_covers_only_the_page(self):
+        self.create_records(self.patient, 30)
+        url = reverse('health-record-list')
+        etag = self.client.get(url)['ETag']
+
+        # The oldest record is on the second page
+        HealthRecord.objects.filter(pk=HealthRecord.objects.order_by('visit_date')[0].pk).update(title='Amended')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'MAX("health_records_healthrecord"' in q['sql']])
+
+        self.assertEqual(self.revalidate(url + '?page=2', self.client.get(url + '?page=2')['ETag']).status_code, 304)
+        HealthRecord.objects.order_by('-visit_date').first().save()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_list_etag_follows_the_cache_version(self):
+        url = reverse('health-record-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        HealthRecord.objects.filter(pk=self.records[-1].pk).update(title='Amended')
+
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Amended', [record['title'] for record in response.data['results']])
+
+    def test_etag_does_not_bypass_authorization(self):
+        url = reverse('health-record-detail', args=[self.records[0].pk])
+        etag = self.client.get(url)['ETag']
+
+        self.client.force_authenticate(self.patients[1].user)
+        self.assertEqual(self.revalidate(url, etag).status_code, 403)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class HealthRecordResponseCacheTests(HealthRecordTestMixin, APITestCase):
+    """Per-principal response cache and its invalidation"""
+
+    def setUp(self):
+        super().setUp()
+        self.record = self.create_records(self.patient, 2)[0]
+        self.detail_url = reverse('health-record-detail', args=[self.record.pk])
+        reset_cache_stats()
+
+    def test_repeat_read_is_served_from_cache(self):
+        self.client.force_authenticate(self.patient.user)
+        first = self.client.get(reverse('health-record-list'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(reverse('health-record-list'))
+
+        self.assertEqual(second.data, first.data)
+        self.assertFalse(any('health_records_' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_process_local_cache_is_bypassed(self):
+        self.client.force_authenticate(self.doctor_user)
+        self.client.get(self.detail_url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.detail_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('health_records_' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 0, 'hit_rate': None})
+
+    def test_principals_do_not_share_entries(self):
+        self.client.force_authenticate(self.doctor_user)
+        doctor_view = self.client.get(self.detail_url)
+        self.client.force_authenticate(self.patient.user)
+        patient_view = self.client.get(self.detail_url)
+
+        self.assertEqual(len(doctor_view.data['doctor_comments']), 2)
+        self.assertEqual(len(patient_view.data['doctor_comments']), 1)
+
+    def test_comment_invalidates_patient_and_doctor(self):
+        for user in [self.patient.user, self.doctor_user]:
+            self.client.force_authenticate(user)
+            self.client.get(self.detail_url)
+
+        self.client.force_authenticate(self.doctor_user)
+        self.client.post(reverse('add-doctor-comment', args=[self.record.pk]), {'comment': 'New note'})
+
+        for user in [self.patient.user, self.doctor_user]:
+            self.client.force_authenticate(user)
+            comments = [c['comment'] for c in self.client.get(self.detail_url).data['doctor_comments']]
+            self.assertIn('New note', comments)
+
+    def test_reassignment_invalidates_previous_doctor(self):
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 200)
+
+        other_user = User.objects.create_user(username='doctor2', password='securepass123', user_type='DOCTOR')
+        other = DoctorProfile.objects.create(
+            user=other_user, specialization='General', license_number='DOC000002', years_of_experience=1
+        )
+        self.client.force_authenticate(other_user)
+        with patch('notifications.tasks.send_patient_assignment_notification.delay'):
+            self.client.post(reverse('assign-doctor'), {'patient_id': self.patient.id, 'doctor_id': other.id})
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 403)
+
+
+class HealthRecordBatchCreateTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-batch-create')
+
+    def record_payload(self, i):
+        return {
+            'record_type': 'LAB_RESULT',
+            'title': f'Imported result {i}',
+            'description': 'Imported from previous provider',
+            'visit_date': (timezone.now() - timedelta(days=i)).isoformat(),
+        }
+
+    def test_creates_batch_with_one_notification(self):
+        self.client.force_authenticate(self.patient.user)
+        payload = {'records': [self.record_payload(i) for i in range(200)]}
+
+        # Profile, savepoint pair, two INSERT batches and the summary refresh
+        # (lock, aggregate, update) regardless of the batch size
+        with patch('health_records.views.send_batch_records_notification.delay') as notify, \
+                self.assertQueryBudget(9):
+            response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['count'], 200)
+        self.assertEqual(
+            set(HealthRecord.objects.filter(pk__in=response.data['ids']).values_list('patient_id', flat=True)),
+            {self.patient.id}
+        )
+        notify.assert_called_once_with(self.doctor_user.id, 'Patient 0', 200)
+
+    def test_invalid_item_rejects_whole_batch(self):
+        self.client.force_authenticate(self.patient.user)
+        records = [self.record_payload(i) for i in range(3)]
+        records[1]['record_type'] = 'UNKNOWN'
+        del records[2]['title']
+
+        with patch('health_records.views.send_batch_records_notification.delay') as notify:
+            response = self.client.post(self.url, {'records': records}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('record_type', response.data['errors'][0]['errors'])
+        self.assertIn('title', response.data['errors'][1]['errors'])
+        self.assertFalse(HealthRecord.objects.exists())
+        notify.assert_not_called()
+
+    def test_batch_invalidates_cached_list(self):
+        self.client.force_authenticate(self.doctor_user)
+        list_url = reverse('health-record-list')
+        self.assertEqual(self.client.get(list_url).data['count'], 0)
+
+        self.client.force_authenticate(self.patient.user)
+        with patch('health_records.views.send_batch_records_notification.delay'):
+            self.client.post(self.url, {'records': [self.record_payload(i) for i in range(3)]}, format='json')
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.client.get(list_url).data['count'], 3)
+
+    def test_rejects_oversized_batch_and_non_patients(self):
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.post(self.url, {'records': [self.record_payload(0)] * 501}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.doctor_user)
+        response = self.client.post(self.url, {'records': [self.record_payload(0)]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class HealthRecordExportTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-export')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_records(cls.patients[0], 7)
+        cls.create_records(cls.patients[1], 3)
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_streams_in_chunks_with_permitted_comments(self):
+        with patch('health_records.views.HealthRecordExportView.chunk_size', 2), \
+                self.assertQueryBudget(12):
+            response, body = self.export(self.patient.user)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual([row['title'] for row in rows], [f'Visit {i}' for i in range(7)])
+        self.assertTrue(all(len(row['doctor_comments']) == 1 for row in rows))
+
+        _, body = self.export(self.doctor_user)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertTrue(all(len(row['doctor_comments']) == 2 for row in rows))
+
+    def test_csv_honours_fields_and_filters(self):
+        _, body = self.export(
+            self.doctor_user, export_format='csv', fields='id,title,visit_date',
+            patient_id=self.patients[1].id
+        )
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'title', 'visit_date'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Visit 0', 'Visit 1', 'Visit 2'])
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url, {'export_format': 'xml'}).status_code, 400)
+
+
+class MyPatientsTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('my-patients')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_records(cls.patients[0], 4)
+        cls.create_records(cls.patients[1], 2, with_comments=False)
+        HealthRecord.objects.filter(patient=cls.patients[0], title='Visit 3').update(record_type='LAB_RESULT')
+        for i in range(2, 30):
+            user = User.objects.create_user(
+                username=f'patient{i}', password='securepass123', user_type='PATIENT',
+                first_name='Extra', last_name=str(i)
+            )
+            PatientProfile.objects.create(user=user, emergency_contact='', assigned_doctor=cls.doctor)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.doctor_user)
+
+    def test_summaries_in_constant_queries(self):
+        # Doctor profile, page count, one grouped page query
+        with self.assertQueryBudget(3):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 20)
+
+        # Most recent visit first, patients without records last
+        rows = {row['id']: row for row in response.data['results'][:2]}
+        first, second = rows[self.patients[0].id], rows[self.patients[1].id]
+        self.assertEqual(first['total_records'], 4)
+        self.assertEqual(first['records_by_type']['CHECKUP'], 3)
+        self.assertEqual(first['records_by_type']['LAB_RESULT'], 1)
+        self.assertEqual(first['unreviewed_records'], 0)
+        self.assertEqual(first['name'], 'Patient 0')
+        self.assertEqual(second['unreviewed_records'], 2)
+        self.assertIsNone(response.data['results'][2]['last_visit'])
+
+    def test_ordering_and_name_filter(self):
+        response = self.client.get(self.url, {'ordering': '-total_records'})
+        self.assertEqual(
+            [row['total_records'] for row in response.data['results'][:3]], [4, 2, 0]
+        )
+
+        response = self.client.get(self.url, {'name': 'patient 1'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.patients[1].id])
+
+        self.assertEqual(self.client.get(self.url, {'ordering': 'email'}).status_code, 400)
+
+    def test_patients_are_forbidden(self):
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class PatientRecordSummaryTests(HealthRecordTestMixin, APITestCase):
+
+    def summary(self, patient=None):
+        return PatientRecordSummary.objects.get(patient=patient or self.patient)
+
+    def assertSummaryConsistent(self):
+        self.assertEqual(list(PatientRecordSummary.objects.inconsistencies()), [])
+
+    def test_api_writes_keep_summary_current(self):
+        self.client.force_authenticate(self.patient.user)
+        with patch('health_records.signals.send_new_record_notification.delay'):
+            response = self.client.post(reverse('health-record-list'), {
+                'record_type': 'EMERGENCY', 'title': 'Fracture', 'description': 'Fell off a bike',
+                'visit_date': timezone.now().isoformat(),
+            })
+        record_id = HealthRecord.objects.get(title='Fracture').pk
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((self.summary().total_records, self.summary().emergency_count), (1, 1))
+
+        detail_url = reverse('health-record-detail', args=[record_id])
+        self.client.patch(detail_url, {'record_type': 'DIAGNOSIS'})
+        self.assertEqual((self.summary().emergency_count, self.summary().diagnosis_count), (0, 1))
+
+        self.client.delete(detail_url)
+        self.assertEqual(self.summary().total_records, 0)
+        self.assertIsNone(self.summary().last_visit)
+        self.assertSummaryConsistent()
+
+    def test_bulk_operations_keep_summary_current(self):
+        self.create_records(self.patients[0], 5)
+        self.create_records(self.patients[1], 2)
+        self.assertEqual(self.summary().total_records, 5)
+
+        HealthRecord.objects.filter(patient=self.patients[0], title='Visit 0').update(record_type='LAB_RESULT')
+        self.assertEqual((self.summary().checkup_count, self.summary().lab_result_count), (4, 1))
+
+        HealthRecord.objects.filter(patient=self.patients[1]).update(patient=self.patients[0])
+        self.assertEqual(self.summary().total_records, 7)
+        self.assertEqual(self.summary(self.patients[1]).total_records, 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            HealthRecord.objects.filter(patient=self.patients[0], title__in=['Visit 1', 'Visit 2', 'Visit 3']).delete()
+        # Refreshed once for the whole delete (lock + update), not once per row
+        summary_queries = [q for q in ctx.captured_queries if 'patientrecordsummary' in q['sql']]
+        self.assertEqual(len(summary_queries), 2)
+        # Both patients had a 'Visit 1' before the move
+        self.assertEqual(self.summary().total_records, 3)
+        self.assertSummaryConsistent()
+
+    def test_rebuild_command_repairs_and_verifies(self):
+        self.create_records(self.patients[0], 3)
+        PatientRecordSummary.objects.filter(patient=self.patients[0]).update(total_records=99)
+        PatientRecordSummary.objects.filter(patient=self.patients[1]).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_patient_summaries', '--check', stdout=io.StringIO(), stderr=io.StringIO())
+
+        out = io.StringIO()
+        call_command('rebuild_patient_summaries', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+        self.assertEqual(self.summary().total_records, 3)
+        self.assertEqual(self.summary(self.patients[1]).total_records, 0)
+
+
+@patch('health_records.feed.SETTLE_TIME', timedelta(0))
+class HealthRecordFeedTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-feed')
+
+    def setUp(self):
+        super().setUp()
+        self.origin = feed.encode_cursor({
+            stream: (timezone.now() - timedelta(days=1), 0) for stream in ['records', 'comments']
+        })
+
+    def read_all(self, user, cursor, limit):
+        self.client.force_authenticate(user)
+        items = []
+        while True:
+            response = self.client.get(self.url, {'cursor': cursor, 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            items.extend(response.data['results'])
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                return items, cursor
+
+    def test_pages_through_records_and_comments_in_creation_order(self):
+        self.create_records(self.patients[0], 2)
+        self.create_records(self.patients[1], 1, with_comments=False)
+        other_user = User.objects.create_user(username='unassigned', password='securepass123', user_type='PATIENT')
+        self.create_records(PatientProfile.objects.create(user=other_user, emergency_contact=''), 2)
+
+        items, cursor = self.read_all(self.doctor_user, self.origin, limit=2)
+        self.assertEqual(sorted(item['type'] for item in items), ['comment'] * 4 + ['record'] * 3)
+        self.assertEqual([item['created_at'] for item in items], sorted(item['created_at'] for item in items))
+        self.assertEqual(len({(item['type'], item['id']) for item in items}), 7)
+
+        # Nothing new after the last cursor, then only what was added since
+        self.assertEqual(self.read_all(self.doctor_user, cursor, limit=2)[0], [])
+        self.create_records(self.patients[1], 1, with_comments=False)
+        items, _ = self.read_all(self.doctor_user, cursor, limit=2)
+        self.assertEqual([(item['type'], item['patient']) for item in items], [('record', self.patients[1].id)])
+
+    def test_patients_see_own_records_and_public_comments(self):
+        self.create_records(self.patients[0], 2)
+        self.create_records(self.patients[1], 2)
+
+        items, _ = self.read_all(self.patient.user, self.origin, limit=50)
+        self.assertEqual(len(items), 4)
+        self.assertTrue(all(item['patient'] == self.patient.id for item in items))
+        self.assertFalse(any(item.get('is_private') for item in items))
+
+    def test_long_poll_is_off_by_default(self):
+        self.client.force_authenticate(self.doctor_user)
+        with patch('health_records.feed.time.sleep') as sleep:
+            response = self.client.get(self.url, {'wait': 25})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        sleep.assert_not_called()
+
+    @override_settings(CACHE_IS_SHARED=True, FEED_MAX_WAIT=25)
+    @patch('health_records.feed.POLL_INTERVAL', 0.05)
+    def test_long_poll_is_bounded(self):
+        self.client.force_authenticate(self.doctor_user)
+        started = time.monotonic()
+        response = self.client.get(self.url, {'wait': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertLess(time.monotonic() - started, 3)
+
+        self.assertEqual(self.client.get(self.url, {'wait': 60}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 400)
+
+
+class HealthRecordSyncTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-sync')
+
+    def sync(self, user, token=None, **params):
+        self.client.force_authenticate(user)
+        if token:
+            params['token'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_full_sync_then_only_changes(self):
+        records = self.create_records(self.patient, 5)
+
+        updated, token = [], None
+        while True:
+            data = self.sync(self.patient.user, token, limit=2)
+            updated.extend(record['id'] for record in data['updated'])
+            token = data['token']
+            if not data['has_more']:
+                break
+        self.assertEqual(sorted(updated), sorted(record.pk for record in records))
+
+        # Nothing changed: profile lookup plus one UNION over the two indexes
+        with self.assertQueryBudget(2):
+            data = self.sync(self.patient.user, token)
+        self.assertEqual((data['updated'], data['deleted']), ([], []))
+        token = data['token']
+
+        self.client.patch(reverse('health-record-detail', args=[records[0].pk]), {'title': 'Renamed'})
+        self.client.delete(reverse('health-record-detail', args=[records[1].pk]))
+        HealthRecord.objects.filter(pk__in=[records[2].pk, records[3].pk]).delete()
+
+        data = self.sync(self.patient.user, token)
+        self.assertEqual([record['title'] for record in data['updated']], ['Renamed'])
+        self.assertEqual(sorted(data['deleted']), sorted(record.pk for record in records[1:4]))
+
+    def test_doctor_syncs_whole_panel_and_full_sync_skips_old_tombstones(self):
+        self.create_records(self.patients[0], 2)
+        doomed = self.create_records(self.patients[1], 2)
+        doomed[0].delete()
+
+        data = self.sync(self.doctor_user)
+        self.assertEqual(len(data['updated']), 3)
+        self.assertEqual(data['deleted'], [])
+
+        doomed_id = doomed[1].pk
+        doomed[1].delete()
+        data = self.sync(self.doctor_user, data['token'])
+        self.assertEqual((data['updated'], data['deleted']), ([], [doomed_id]))
+        self.assertEqual(self.client.get(self.url, {'token': 'garbage'}).status_code, 400)
+
+    def test_changes_are_read_in_write_order_not_by_timestamp(self):
+        token = self.sync(self.patient.user)['token']
+        # updated_at is taken before the writing transaction commits, which may be much later
+        late = self.create_records(self.patient, 1)[0]
+        HealthRecord.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        data = self.sync(self.patient.user, token)
+        self.assertEqual([record['id'] for record in data['updated']], [late.pk])
+        self.assertEqual(self.sync(self.patient.user, data['token'])['updated'], [])
+
+    def test_tokens_holding_timestamps_require_full_sync(self):
+        old = base64.urlsafe_b64encode(json.dumps({
+            'updated': ['2026-01-01T00:00:00+00:00', 5], 'deleted': ['2026-01-01T00:00:00+00:00', 0],
+        }).encode()).decode()
+        self.assertResyncRequired(self.patient.user, old)
+
+    def assertResyncRequired(self, user, token):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, 410)
+        self.assertIn('error', response.data)
+
+    def test_assigning_a_patient_requires_full_sync(self):
+        self.create_records(self.patients[0], 1)
+        newcomer = PatientProfile.objects.create(
+            user=User.objects.create_user(username='newcomer', password='securepass123', user_type='PATIENT'),
+            emergency_contact=''
+        )
+        # Older than any token the doctor could hold
+        old_records = self.create_records(newcomer, 2)
+        token = self.sync(self.doctor_user)['token']
+
+        newcomer.assigned_doctor = self.doctor
+        newcomer.save()
+        self.assertResyncRequired(self.doctor_user, token)
+
+        data = self.sync(self.doctor_user)
+        self.assertLessEqual({record.pk for record in old_records}, {record['id'] for record in data['updated']})
+        self.assertEqual(self.sync(self.doctor_user, data['token'])['updated'], [])
+
+    def test_unassigning_a_patient_requires_full_sync(self):
+        self.create_records(self.patients[0], 1)
+        leaving = self.create_records(self.patients[1], 2)
+        other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor2', password='securepass123', user_type='DOCTOR'),
+            specialization='General', license_number='DOC000002', years_of_experience=3
+        )
+        token = self.sync(self.doctor_user)['token']
+        other_token = self.sync(other_doctor.user)['token']
+        patient_token = self.sync(self.patients[1].user)['token']
+
+        PatientProfile.objects.filter(pk=self.patients[1].pk).update(assigned_doctor=other_doctor)
+        self.assertResyncRequired(self.doctor_user, token)
+        self.assertResyncRequired(other_doctor.user, other_token)
+
+        ids = {record['id'] for record in self.sync(self.doctor_user)['updated']}
+        self.assertFalse(ids & {record.pk for record in leaving})
+        # The patient's own scope did not change
+        self.assertEqual(self.sync(self.patients[1].user, patient_token)['updated'], [])
+
+
+class HealthRecordBatchRetrieveTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-list')
+
+    def test_found_and_not_found_in_one_scoped_query(self):
+        own = self.create_records(self.patients[0], 3)
+        others = self.create_records(self.patients[1], 1)
+        requested = [own[2].pk, others[0].pk, own[0].pk, 999999]
+
+        self.client.force_authenticate(self.patient.user)
+        # Cache principal, profile, ETag aggregate, the records and their comments
+        with self.assertQueryBudget(5):
+            response = self.client.get(self.url, {'ids': ','.join(map(str, requested))})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([record['id'] for record in response.data['results']], [own[2].pk, own[0].pk])
+        self.assertEqual(response.data['not_found'], [others[0].pk, 999999])
+
+        self.client.force_authenticate(self.doctor_user)
+        response = self.client.get(self.url, {'ids': f'{own[1].pk},{others[0].pk}'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['not_found'], [])
+
+    def test_rejects_malformed_and_oversized_batches(self):
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url, {'ids': '1,two'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': ','.join(map(str, range(1, 102)))}).status_code, 400)
+
+
+class CompressionMiddlewareTests(HealthRecordTestMixin, APITestCase):
+    url = reverse('health-record-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_records(cls.patients[0], 20)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.patient.user)
+
+    def test_negotiates_by_quality_then_server_preference(self):
+        encodings = ['zstd', 'br', 'gzip']
+        self.assertEqual(compression.negotiate('gzip, br', encodings), 'br')
+        self.assertEqual(compression.negotiate('gzip;q=1.0, br;q=0.5', encodings), 'gzip')
+        self.assertEqual(compression.negotiate('*;q=0.1, zstd;q=0', encodings), 'br')
+        self.assertIsNone(compression.negotiate('identity', encodings))
+
+    def test_gzip_list_page(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # The weak tag still revalidates
+        revalidated = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_small_and_excluded_responses_are_not_compressed(self):
+        response = self.client.get(self.url, {'fields': 'id', 'page': 2}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.post(
+            reverse('login'), {'username': 'patient0', 'password': 'securepass123'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @skipUnless(compression.zstandard and compression.brotli, 'zstandard and Brotli are not installed')
+    def test_streamed_export_with_each_encoding(self):
+        export_url = reverse('health-record-export')
+        plain = b''.join(self.client.get(export_url).streaming_content)
+        decoders = {
+            'gzip': gzip.decompress,
+            'br': compression.brotli.decompress,
+            'zstd': lambda data: compression.zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        }
+        for encoding, decode in decoders.items():
+            response = self.client.get(export_url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(decode(b''.join(response.streaming_content)), plain)
+
+
+class FastJSONTests(HealthRecordTestMixin, APITestCase):
+    values = {
+        'utc': datetime(2024, 3, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'offset': datetime(2024, 3, 1, 9, 30, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+        'naive': datetime(2024, 3, 1, 9, 30),
+        'date': date(2024, 3, 1),
+        'decimal': Decimal('12.50'),
+        'uuid': uuid.UUID(int=1),
+        'lazy': gettext_lazy('Not found.'),
+        'text': 'Caf\u00e9 \u2013 line\u2028separator "quoted"\n',
+        'nested': [{'a': None, 'b': True}, (1, 2)],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_records(cls.patients[0], 5)
+
+    def assertRendersLikeDRF(self, data, media_type=None):
+        self.assertEqual(
+            fastjson.FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type)
+        )
+
+    def test_renders_like_drf(self):
+        self.assertRendersLikeDRF(self.values)
+        self.assertRendersLikeDRF(self.values, 'application/json; indent=4')
+        # Handed to the stdlib: non-string keys and integers wider than 64 bits
+        self.assertRendersLikeDRF({1: 'one', 'big': 2 ** 70})
+
+    def test_record_list_is_served_by_fast_renderer(self):
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.get(reverse('health-record-list'))
+
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertIsInstance(response.accepted_renderer, fastjson.FastJSONRenderer)
+
+    def test_parses_like_drf(self):
+        body = JSONRenderer().render(self.values)
+        parsed = fastjson.FastJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(parsed, JSONParser().parse(io.BytesIO(body)))
+
+        latin1 = '{"name": "Caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(
+            fastjson.FastJSONParser().parse(io.BytesIO(latin1), parser_context={'encoding': 'latin-1'}),
+            {'name': 'Caf\u00e9'}
+        )
+
+    def test_parse_errors_match_drf(self):
+        for body in [b'{"a": 1,}', b'{"a": NaN}', b'']:
+            with self.assertRaises(ParseError) as expected:
+                JSONParser().parse(io.BytesIO(body))
+            with self.assertRaises(ParseError) as raised:
+                fastjson.FastJSONParser().parse(io.BytesIO(body))
+            self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_falls_back_without_orjson(self):
+        with patch.object(fastjson, 'orjson', None):
+            self.assertRendersLikeDRF(self.values)
+            self.assertEqual(fastjson.FastJSONParser().parse(io.BytesIO(b'{"a": [1]}')), {'a': [1]})
+
+
+class ReplicaRoutingTests(HealthRecordTestMixin, APITestCase):
+    """
+    Runs against a second local database standing in for a replica: it holds
+    the users and profiles but none of the health records, as if it lagged.
+    """
+    replica = 'replica'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connections.settings[cls.replica] = connections.configure_settings({
+            'default': connections.settings['default'],
+            cls.replica: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })[cls.replica]
+        call_command('migrate', database=cls.replica, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[cls.replica].close()
+        del connections[cls.replica]
+        del connections.settings[cls.replica]
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_records(cls.patient, 3)
+
+    def setUp(self):
+        super().setUp()
+        for model in [User, DoctorProfile, PatientProfile]:
+            model.objects.using(self.replica).all().delete()
+            model.objects.using(self.replica).bulk_create(model.objects.all())
+        db_routing._lag.clear()
+        # Pins reach other workers only through a shared cache
+        replicas = self.settings(DATABASE_REPLICAS=[self.replica], CACHE_IS_SHARED=True)
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def list_count(self):
+        return self.client.get(reverse('health-record-list')).data['count']
+
+    def create_record(self):
+        response = self.client.post(reverse('health-record-list'), {
+            'record_type': 'CHECKUP', 'title': 'New', 'description': 'Follow-up',
+            'visit_date': timezone.now().isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_reads_follow_the_writer_to_the_primary(self):
+        self.authenticate(self.patient.user)
+        self.assertEqual(self.list_count(), 0)
+
+        self.create_record()
+        self.assertEqual(self.list_count(), 4)
+
+        # Once the pins (and the cached page) expire, reads go back to the replica
+        cache.clear()
+        self.assertEqual(self.list_count(), 0)
+
+    def test_invalidated_principals_refill_the_cache_from_the_primary(self):
+        self.authenticate(self.doctor_user)
+        self.assertEqual(self.list_count(), 0)
+
+        self.authenticate(self.patient.user)
+        self.create_record()
+
+        self.authenticate(self.doctor_user)
+        self.assertEqual(self.list_count(), 4)
+
+    def test_lagging_or_unreachable_replica_is_skipped(self):
+        self.authenticate(self.patient.user)
+        for lag in [60, None]:
+            db_routing._lag.clear()
+            with patch.object(db_routing, 'replica_lag', return_value=lag):
+                self.assertEqual(self.list_count(), 3)
+
+    def test_failed_lag_probe_routes_to_the_primary(self):
+        self.authenticate(self.patient.user)
+        # Unreachable, then caught up on everything received but no longer receiving
+        for query in ['SELECT no_such_function()', 'SELECT 0, 0']:
+            db_routing._lag.clear()
+            with patch.dict(db_routing.LAG_QUERIES, {'sqlite': query}):
+                self.assertIsNone(db_routing.replica_lag(self.replica))
+                self.assertEqual(db_routing.healthy_replicas(), [])
+                self.assertEqual(self.list_count(), 3)
+
+        with patch.dict(db_routing.LAG_QUERIES, {'sqlite': 'SELECT 1, 0.5'}):
+            self.assertEqual(db_routing.replica_lag(self.replica), 0.5)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_process_local_cache_reads_from_the_primary(self):
+        self.authenticate(self.patient.user)
+        self.assertEqual(self.list_count(), 3)
+
+    def test_sync_reads_from_the_primary(self):
+        self.authenticate(self.patient.user)
+        response = self.client.get(reverse('health-record-sync'))
+        self.assertEqual(len(response.data['updated']), 3)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(HealthRecord.objects.count(), 3)
+        self.assertEqual(HealthRecord.objects.all().db, 'default')
+
+
+class HealthRecordArchiveTests(HealthRecordTestMixin, APITestCase):
+    export_url = reverse('health-record-export')
+
+    def setUp(self):
+        super().setUp()
+        self.records = self.create_records(self.patient, 6)
+        self.old_ids = [record.pk for record in self.records[3:]]
+        HealthRecord.objects.filter(pk__in=self.old_ids).update(updated_at=timezone.now() - timedelta(days=30))
+
+    def archive(self):
+        out = io.StringIO()
+        call_command('archive_health_records', days=2, stdout=out)
+        cache.clear()
+        return out.getvalue()
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.export_url, params)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def summary(self):
+        return PatientRecordSummary.objects.filter(patient=self.patient).values(
+            *PatientRecordSummary.objects.aggregates()
+        ).get()
+
+    def test_moves_old_records_with_comments_out_of_the_hot_table(self):
+        before = self.summary()
+        self.assertIn('Archived 3 health records', self.archive())
+
+        self.assertEqual(HealthRecord.objects.filter(patient=self.patient).count(), 3)
+        self.assertEqual(sorted(ArchivedHealthRecord.objects.values_list('pk', flat=True)), sorted(self.old_ids))
+        self.assertFalse(DoctorComment.objects.filter(health_record_id__in=self.old_ids).exists())
+        # Archiving is not a deletion: summaries keep counting, sync sees no tombstones
+        self.assertEqual(self.summary(), before)
+        self.assertFalse(DeletedHealthRecord.objects.exists())
+        call_command('rebuild_patient_summaries', check=True, stdout=io.StringIO())
+
+    def test_detail_serves_archived_records_with_visible_comments(self):
+        url = reverse('health-record-detail', args=[self.old_ids[0]])
+        self.client.force_authenticate(self.patient.user)
+        expected = self.client.get(url).json()
+        self.archive()
+
+        self.assertEqual(self.client.get(url).json(), expected)
+        self.assertEqual(len(expected['doctor_comments']), 1)
+        response = self.client.get(url, {'fields': 'id,title'})
+        self.assertEqual(response.json(), {'id': self.old_ids[0], 'title': 'Visit 3'})
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(len(self.client.get(url).json()['doctor_comments']), 2)
+        self.client.force_authenticate(self.patients[1].user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_archived_records_are_read_only_but_deletable(self):
+        self.archive()
+        url = reverse('health-record-detail', args=[self.old_ids[0]])
+        self.client.force_authenticate(self.patient.user)
+
+        self.assertEqual(self.client.patch(url, {'title': 'Renamed'}).status_code, 409)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(ArchivedHealthRecord.objects.filter(pk=self.old_ids[0]).exists())
+        self.assertTrue(DeletedHealthRecord.objects.filter(record_id=self.old_ids[0]).exists())
+        self.assertEqual(self.summary()['total_records'], 5)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_export_merges_archived_records_on_request(self):
+        expected = self.export(self.doctor_user)
+        self.archive()
+
+        self.assertEqual(len(self.export(self.doctor_user)), 3)
+        self.assertEqual(self.export(self.doctor_user, include_archived='true'), expected)
+        rows = self.export(self.patient.user, include_archived='true', fields='title', record_type='CHECKUP')
+        self.assertEqual(rows, [{'title': f'Visit {i}'} for i in range(6)])
+        self.assertEqual(self.export(self.patient.user, include_archived='true', has_comments='false'), [])
+
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.export_url, {'include_archived': 'maybe'}).status_code, 400)
+
+
+class HealthRecordAttachmentTests(HealthRecordTestMixin, APITestCase):
+    content = bytes(range(256)) * 1000
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = self.settings(ATTACHMENT_ROOT=root, ATTACHMENT_CHUNK_MAX_SIZE=100_000)
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.record = self.create_records(self.patient, 1)[0]
+        self.attachments_url = reverse('health-record-attachments', args=[self.record.pk])
+
+    def start(self, user, content=None):
+        self.client.force_authenticate(user)
+        response = self.client.post(self.attachments_url, {
+            'filename': 'C:\\scans\\lab result.pdf', 'content_type': 'application/pdf',
+            'size': len(content or self.content)
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload_url, chunk, first, total):
+        return self.client.put(
+            upload_url, chunk, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{first + len(chunk) - 1}/{total}'
+        )
+
+    def upload(self, user, content=None, chunk_size=90_000):
+        content = content or self.content
+        upload = self.start(user, content)
+        for first in range(0, len(content), chunk_size):
+            response = self.put_chunk(upload['upload_url'], content[first:first + chunk_size], first, len(content))
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def download(self, attachment, **headers):
+        response = self.client.get(reverse('attachment-download', args=[attachment['id']]), **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_chunked_uploads_are_stored_once_per_content(self):
+        first = self.upload(self.patient.user)
+        second = self.upload(self.doctor_user)
+
+        self.assertEqual(first['filename'], 'lab result.pdf')
+        self.assertEqual(first['size'], len(self.content))
+        self.assertEqual(first['sha256'], hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(second['sha256'], first['sha256'])
+        self.assertEqual(AttachmentBlob.objects.count(), 1)
+        self.assertFalse(os.listdir(attachments.upload_dir()))
+        self.assertEqual([row['id'] for row in self.client.get(self.attachments_url).json()], [first['id'], second['id']])
+
+        response, body = self.download(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{first["sha256"]}"')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="lab result.pdf"')
+
+    def test_range_and_conditional_downloads(self):
+        attachment = self.upload(self.patient.user)
+        size = len(self.content)
+        etag = f'"{attachment["sha256"]}"'
+
+        response, body = self.download(attachment, HTTP_RANGE='bytes=10-19', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{size}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response, body = self.download(attachment, HTTP_RANGE='bytes=-5', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, self.content[-5:]))
+        response, body = self.download(attachment, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+        response, _ = self.download(attachment, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        response, _ = self.download(attachment, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_access_follows_the_record_permissions(self):
+        attachment = self.upload(self.patient.user)
+        url = reverse('attachment-download', args=[attachment['id']])
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.download(attachment)[0].status_code, 200)
+        self.client.force_authenticate(self.patients[1].user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(self.attachments_url).status_code, 403)
+        self.assertEqual(self.client.post(self.attachments_url, {'filename': 'x', 'size': 1}).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_chunks_must_arrive_in_order(self):
+        upload = self.start(self.patient.user)
+        url, total = upload['upload_url'], len(self.content)
+
+        self.assertEqual(self.put_chunk(url, self.content[:10], 0, total).status_code, 200)
+        response = self.put_chunk(url, self.content[20:30], 20, total)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 10)
+        self.assertEqual(self.put_chunk(url, self.content[10:20], 10, total + 1).status_code, 400)
+        self.assertEqual(self.put_chunk(url, self.content[10:100_011], 10, total).status_code, 413)
+        self.assertEqual(self.client.put(url, b'x', content_type='application/octet-stream').status_code, 400)
+        self.assertEqual(self.client.get(url).json()['received'], 10)
+
+        self.client.force_authenticate(self.doctor_user)
+        self.assertEqual(self.put_chunk(url, self.content[10:20], 10, total).status_code, 404)
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.assertFalse(os.listdir(attachments.upload_dir()))
+
+    def test_chunks_are_written_outside_the_transaction(self):
+        upload = self.start(self.patient.user)
+        url, total = upload['upload_url'], len(self.content)
+        self.assertEqual(self.put_chunk(url, self.content[:10], 0, total).status_code, 200)
+        path = attachments.upload_path(upload['id'])
+
+        # A request still receiving the chunk holds the file
+        with open(path, 'r+b') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            response = self.put_chunk(url, self.content[10:20], 10, total)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 10)
+
+        # A request that checked the offset before another one moved it writes nothing
+        stale = AttachmentUpload.objects.get(pk=upload['id'])
+        self.assertEqual(self.put_chunk(url, self.content[10:20], 10, total).status_code, 200)
+        self.assertFalse(attachments.write_chunk(stale, io.BytesIO(b'x' * 10), 10, 10))
+        self.assertEqual(AttachmentUpload.objects.get(pk=upload['id']).received, 20)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.content[:20])
+
+    def test_accel_redirect_hands_the_file_to_nginx(self):
+        attachment = self.upload(self.patient.user)
+        with self.settings(ATTACHMENT_ACCEL_REDIRECT_PREFIX='/protected-attachments/'):
+            response, body = self.download(attachment, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-attachments/' + attachments.blob_name(attachment['sha256']))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_prune_removes_unreferenced_content(self):
+        attachment = self.upload(self.patient.user)
+        self.start(self.patient.user)
+        path = attachments.blob_path(attachment['sha256'])
+        call_command('prune_attachments', hours=0, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(AttachmentUpload.objects.exists())
+
+        self.client.delete(reverse('health-record-detail', args=[self.record.pk]))
+        self.assertFalse(HealthRecordAttachment.objects.exists())
+        call_command('prune_attachments', hours=0, stdout=io.StringIO())
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Range partitioning is PostgreSQL only')
+class HealthRecordPartitionTests(HealthRecordTestMixin, APITestCase):
+    def create_record(self, visit_date):
+        return HealthRecord.objects.create(
+            patient=self.patient, record_type='CHECKUP', title='Visit', description='Checkup',
+            visit_date=visit_date, created_by=self.patient.user
+        )
+
+    def partition_of(self, record):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.RECORD_TABLE} WHERE id = %s', [record.pk])
+            return cursor.fetchone()[0]
+
+    def test_records_are_stored_in_their_year(self):
+        year = timezone.now().year
+        record = self.create_record(datetime(year, 6, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.partition_of(record), partitions.partition_name(year))
+
+    def test_visit_date_range_prunes_other_years(self):
+        year = timezone.now().year
+        partitions.ensure_partitions(years=[year - 1])
+        start = datetime(year, 1, 1, tzinfo=dt_timezone.utc)
+
+        plan = HealthRecord.objects.filter(
+            patient=self.patient, visit_date__gte=start, visit_date__lt=start + timedelta(days=90)
+        ).explain()
+        self.assertIn(partitions.partition_name(year), plan)
+        self.assertNotIn(partitions.partition_name(year - 1), plan)
+        self.assertNotIn(partitions.DEFAULT_PARTITION, plan)
+
+    def test_new_partition_takes_over_rows_from_default(self):
+        year = timezone.now().year + partitions.PARTITIONS_AHEAD + 3
+        record = self.create_record(datetime(year, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.partition_of(record), partitions.DEFAULT_PARTITION)
+
+        self.assertEqual(partitions.ensure_partitions(years=[year]), [partitions.partition_name(year)])
+        self.assertEqual(self.partition_of(record), partitions.partition_name(year))
+        self.assertEqual(partitions.ensure_partitions(years=[year]), [])
+
+    def test_comments_are_deleted_with_their_record(self):
+        record = self.create_record(timezone.now())
+        record_id = record.pk
+        DoctorComment.objects.create(health_record=record, doctor=self.doctor, comment='Fine')
+
+        record.delete()
+        self.assertFalse(DoctorComment.objects.filter(health_record_id=record_id).exists())
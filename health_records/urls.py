@@ -3,7 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.HealthRecordListCreateView.as_view(), name='health-record-list'),
+    path('batch/', views.batch_create_health_records, name='health-record-batch-create'),
+    path('export/', views.HealthRecordExportView.as_view(), name='health-record-export'),
+    path('feed/', views.HealthRecordFeedView.as_view(), name='health-record-feed'),
+    path('search/', views.HealthRecordSearchView.as_view(), name='health-record-search'),
+    path('sync/', views.HealthRecordSyncView.as_view(), name='health-record-sync'),
     path('<int:pk>/', views.HealthRecordDetailView.as_view(), name='health-record-detail'),
     path('<int:record_id>/comments/', views.add_doctor_comment, name='add-doctor-comment'),
-    path('my-patients/', views.my_patients, name='my-patients'),
+    path('<int:record_id>/attachments/', views.HealthRecordAttachmentsView.as_view(), name='health-record-attachments'),
+    path('attachments/uploads/<uuid:upload_id>/', views.AttachmentUploadView.as_view(), name='attachment-upload'),
+    path('attachments/<int:pk>/download/', views.AttachmentDownloadView.as_view(), name='attachment-download'),
+    path('my-patients/', views.MyPatientsView.as_view(), name='my-patients'),
 ]
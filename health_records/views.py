@@ -3,44 +3,123 @@ from drf_yasg import openapi
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from health_record_api import db_routing
+from health_record_api.conditional import ConditionalGetMixin, latest
+from accounts.assignments import is_assigned
 from accounts.models import PatientProfile, DoctorProfile
-from .models import HealthRecord, DoctorComment
+from .models import (
+    ArchivedHealthRecord, AttachmentUpload, HealthRecord, HealthRecordAttachment, DoctorComment, DeletedHealthRecord,
+    PatientRecordSummary
+)
 from .serializers import (
     HealthRecordSerializer, 
     HealthRecordCreateSerializer,
-    DoctorCommentSerializer
+    HealthRecordSearchResultSerializer,
+    DoctorCommentSerializer,
+    DoctorCommentFeedSerializer,
+    HealthRecordFeedSerializer,
+    PatientSummarySerializer,
+    HealthRecordAttachmentSerializer,
+    AttachmentUploadSerializer
 )
 from rest_framework import serializers
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.pagination import PageNumberPagination
 
+from notifications.tasks import send_batch_records_notification
+from . import archive, attachments, export, feed, sync
+from .cache import CachedResponseMixin, get_version, principal_for
+from .filters import HealthRecordFilterBackend
+from .pagination import VisitDateCursorPagination
+from .search import search_records
 from .permissions import (
     IsPatientOwnerOrAssignedDoctor,
     IsPatientOwner,
     IsDoctorAssignedToPatient
 )
 
-class PatientSummarySerializer(serializers.Serializer):
-    id = serializers.IntegerField()
-    name = serializers.CharField()
-    email = serializers.CharField()
-    phone = serializers.CharField()
-    blood_type = serializers.CharField()
-    total_records = serializers.IntegerField()
-    last_visit = serializers.DateTimeField(allow_null=True)
+def record_scope(user):
+    """
+    Filter kwargs over the patient relation selecting what the user may read:
+    their own records as a patient, their assigned patients' as a doctor.
+    None when they may read nothing.
+    """
+    if user.user_type not in ('PATIENT', 'DOCTOR'):
+        return None
+    
+    profile = user.profile
+    if profile is None:
+        raise Http404('No profile found for this user')
+    
+    if user.user_type == 'PATIENT':
+        return {'patient': profile}
+    return {'patient__assigned_doctor': profile}
+
+def scoped_health_records(user, model=HealthRecord):
+    """
+    Records the user may read: their own as a patient, their assigned patients' as a doctor.
+    Pass model=ArchivedHealthRecord for archived ones.
+    """
+    scope = record_scope(user)
+    if scope is None:
+        return model.objects.none()
+    return model.objects.filter(**scope)
+
+def rendered_stamps(record):
+    """
+    Id and update times of a record loaded by with_display_relations() and of
+    everything it embeds: the author and comments with their doctors, whose
+    names are rendered too.
+    """
+    stamps = [record.pk, record.updated_at]
+    if HealthRecord.created_by.is_cached(record):
+        stamps.append(record.created_by.updated_at)
+    for comment in getattr(record, 'visible_comments', ()):
+        stamps.append((comment.pk, comment.updated_at, comment.doctor.updated_at, comment.doctor.user.updated_at))
+    return stamps
 
-class HealthRecordListCreateView(generics.ListCreateAPIView):
+class HealthRecordListCreateView(CachedResponseMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     """
     Health Records Management
     
     GET: List health records (patients see their own, doctors see assigned patients)
     POST: Create new health record (patients only)
+    
+    Lists can be narrowed with record_type, visit_date__gte/lte, patient_id
+    and has_comments (see HealthRecordFilterBackend).
+    
+    Page-number pagination is the default; pass ?pagination=cursor (or a cursor
+    returned by a previous page) to switch to keyset pagination on visit_date.
     """
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [HealthRecordFilterBackend]
+    cursor_pagination_class = VisitDateCursorPagination
+    # Page loaded by get_validators(), reused by list()
+    rendered_records = None
     
     @swagger_auto_schema(
         operation_summary="List Health Records",
         operation_description="Get list of health records. Patients see their own records, doctors see records of assigned patients.",
         tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('record_type', openapi.IN_QUERY, description="Comma-separated record types, e.g. LAB_RESULT,PRESCRIPTION", type=openapi.TYPE_STRING),
+            openapi.Parameter('visit_date__gte', openapi.IN_QUERY, description="Visits on or after this date or datetime", type=openapi.TYPE_STRING, format='date-time'),
+            openapi.Parameter('visit_date__lte', openapi.IN_QUERY, description="Visits on or before this date (whole day) or datetime", type=openapi.TYPE_STRING, format='date-time'),
+            openapi.Parameter('patient_id', openapi.IN_QUERY, description="Only records of this patient (doctors)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('has_comments', openapi.IN_QUERY, description="Only records with (true) or without (false) visible doctor comments", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('ids', openapi.IN_QUERY, description=f"Fetch these records (comma-separated, at most {HealthRecordFilterBackend.MAX_IDS}) in one unpaginated response, with ids that are missing or not yours listed under not_found", type=openapi.TYPE_STRING),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated record fields to return, e.g. id,title,record_type,visit_date", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Comma-separated related data to embed: comments, created_by", type=openapi.TYPE_STRING),
+            openapi.Parameter('pagination', openapi.IN_QUERY, description="Set to 'cursor' for keyset pagination without page counts", type=openapi.TYPE_STRING, enum=['page', 'cursor']),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the next/previous link of a cursor-paginated page", type=openapi.TYPE_STRING),
+        ],
         responses={
             200: HealthRecordSerializer(many=True),
             401: openapi.Response(description="Authentication required")
@@ -82,6 +161,67 @@ class HealthRecordListCreateView(generics.ListCreateAPIView):
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
     
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            params = request.query_params if request is not None else {}
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+    
+    def get_validators(self, request, *args, **kwargs):
+        try:
+            records = self.filter_queryset(self.get_scoped_records())
+        except Http404:
+            return None
+        
+        if settings.CACHE_IS_SHARED:
+            # Bumped on every write that changes what the principal can see
+            return (get_version(principal_for(request.user)),), None
+        
+        # Without a shared cache, load the rows this response renders and
+        # validate those; list() serializes them without querying again
+        records = self.filter_queryset(self.get_queryset())
+        count = None
+        if HealthRecordFilterBackend.parse_ids(request.query_params) is not None or self.paginator is None:
+            self.rendered_records = list(records)
+        else:
+            try:
+                self.rendered_records = self.paginate_queryset(records)
+            except NotFound:
+                return None
+            if isinstance(self.paginator, PageNumberPagination):
+                count = self.paginator.page.paginator.count
+        
+        # The total as well: additions and deletions shift the page even
+        # when nothing on it changed
+        return [count, [rendered_stamps(record) for record in self.rendered_records]], None
+    
+    def paginate_queryset(self, queryset):
+        if self.rendered_records is not None and self.paginator is not None:
+            return self.rendered_records
+        return super().paginate_queryset(queryset)
+    
+    def list(self, request, *args, **kwargs):
+        ids = HealthRecordFilterBackend.parse_ids(request.query_params)
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        
+        # Fetched and authorized in one scoped query: ids outside the caller's
+        # scope are reported exactly like ids that do not exist
+        rendered = self.rendered_records
+        if rendered is None:
+            rendered = self.filter_queryset(self.get_queryset())
+        records = {record.pk: record for record in rendered}
+        serializer = self.get_serializer([records[pk] for pk in ids if pk in records], many=True)
+        return Response({
+            'results': serializer.data,
+            'not_found': [pk for pk in ids if pk not in records],
+        })
+    
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return HealthRecordCreateSerializer
@@ -89,16 +229,15 @@ class HealthRecordListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         user = self.request.user
+        fields, expand = HealthRecordSerializer.parse_field_selection(self.request.query_params)
         
-        if user.user_type == 'PATIENT':
-            patient_profile = get_object_or_404(PatientProfile, user=user)
-            return HealthRecord.objects.filter(patient=patient_profile)
-        
-        elif user.user_type == 'DOCTOR':
-            doctor_profile = get_object_or_404(DoctorProfile, user=user)
-            return HealthRecord.objects.filter(patient__assigned_doctor=doctor_profile)
-        
-        return HealthRecord.objects.none()
+        return self.get_scoped_records().with_display_relations(user, fields, expand)
+    
+    def get_scoped_records(self):
+        # Shared by get_validators and get_queryset so the profile is looked up once
+        if not hasattr(self, '_scoped_records'):
+            self._scoped_records = scoped_health_records(self.request.user)
+        return self._scoped_records
     
     def perform_create(self, serializer):
         if self.request.user.user_type != 'PATIENT':
@@ -113,22 +252,297 @@ class HealthRecordListCreateView(generics.ListCreateAPIView):
             created_by=self.request.user
         )
 
-class HealthRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
+class HealthRecordSearchView(generics.ListAPIView):
+    """
+    Health Record Search
+    
+    GET: Ranked full-text search over the clinical text of the records the user can see
+    """
+    serializer_class = HealthRecordSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [HealthRecordFilterBackend]
+    
+    @swagger_auto_schema(
+        operation_summary="Search Health Records",
+        operation_description="Full-text search over title, description, symptoms, diagnosis, treatment and medications, best matches first. Same visibility rules as the record list.",
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Search terms; supports quoted phrases, OR and -exclusions on PostgreSQL", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('record_type', openapi.IN_QUERY, description="Comma-separated record types", type=openapi.TYPE_STRING),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated record fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Comma-separated related data to embed: comments, created_by", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: HealthRecordSearchResultSerializer(many=True),
+            400: openapi.Response(description="Missing search query"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise serializers.ValidationError({'q': 'A search query is required'})
+        
+        user = self.request.user
+        fields, expand = HealthRecordSerializer.parse_field_selection(self.request.query_params)
+        
+        return search_records(scoped_health_records(user), query).with_display_relations(user, fields, expand)
+
+class HealthRecordExportView(generics.GenericAPIView):
+    """
+    Health Record Export
+    
+    GET: Stream every record the user can see, with permitted comments, as NDJSON or CSV
+    """
+    serializer_class = HealthRecordSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [HealthRecordFilterBackend]
+    chunk_size = export.CHUNK_SIZE
+    
+    @swagger_auto_schema(
+        operation_summary="Export Health Records",
+        operation_description="Stream the full history as newline-delimited JSON (default) or CSV, newest visit first. Takes the same filters and field selection as the record list; comments follow the usual visibility rules. Archived records are included with include_archived=true.",
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('export_format', openapi.IN_QUERY, description="Output format", type=openapi.TYPE_STRING, enum=list(export.FORMATS), default='ndjson'),
+            openapi.Parameter('record_type', openapi.IN_QUERY, description="Comma-separated record types", type=openapi.TYPE_STRING),
+            openapi.Parameter('visit_date__gte', openapi.IN_QUERY, description="Visits on or after this date or datetime", type=openapi.TYPE_STRING, format='date-time'),
+            openapi.Parameter('visit_date__lte', openapi.IN_QUERY, description="Visits on or before this date (whole day) or datetime", type=openapi.TYPE_STRING, format='date-time'),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated record fields to export", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Comma-separated related data to embed: comments, created_by", type=openapi.TYPE_STRING),
+            openapi.Parameter('include_archived', openapi.IN_QUERY, description="Also export archived records", type=openapi.TYPE_BOOLEAN, default=False),
+        ],
+        responses={
+            200: openapi.Response(description="Streamed NDJSON or CSV file"),
+            400: openapi.Response(description="Unknown export format or invalid filter"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'ndjson').lower()
+        if export_format not in export.FORMATS:
+            raise serializers.ValidationError({'export_format': f"Expected one of: {', '.join(export.FORMATS)}"})
+        content_type, extension = export.FORMATS[export_format]
+    
+        include_archived = HealthRecordFilterBackend.BOOLEAN_VALUES.get(
+            request.query_params.get('include_archived', 'false').lower()
+        )
+        if include_archived is None:
+            raise serializers.ValidationError({'include_archived': 'Must be true or false'})
+    
+        # Evaluated lazily by the streaming response, one chunk at a time
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-visit_date', '-id')
+        archived = None
+        if include_archived:
+            fields, expand = HealthRecordSerializer.parse_field_selection(request.query_params)
+            rows = self.filter_queryset(scoped_health_records(request.user, ArchivedHealthRecord)).order_by('-visit_date', '-id')
+            archived = archive.iter_records(rows, request.user, fields, expand, self.chunk_size)
+        serializer = self.get_serializer()
+        representations = export.iter_representations(queryset, serializer, self.chunk_size, archived)
+    
+        if export_format == 'csv':
+            rows = export.csv_rows(representations, list(serializer.fields))
+        else:
+            rows = export.ndjson_rows(representations)
+    
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="health-records.{extension}"'
+        return response
+    
+    def get_queryset(self):
+        user = self.request.user
+        fields, expand = HealthRecordSerializer.parse_field_selection(self.request.query_params)
+    
+        return scoped_health_records(user).with_display_relations(user, fields, expand)
+
+class HealthRecordFeedView(generics.GenericAPIView):
+    """
+    Activity Feed
+    
+    GET: New records and comments across every patient the user can see,
+    oldest first after a cursor, optionally long-polling until something arrives
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+    MAX_WAIT = 25
+    
+    @swagger_auto_schema(
+        operation_summary="Activity Feed",
+        operation_description=(
+            "New health records and doctor comments for all assigned patients (doctors) or your own records (patients), "
+            "in creation order. Start without a cursor to follow from now on, then pass back the returned cursor. "
+            f"With wait=N (at most {MAX_WAIT}) an empty feed is held open up to N seconds until something arrives, "
+            "where the server enables long-polling; otherwise it answers at once."
+        ),
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous feed response", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Items per response, at most {MAX_LIMIT}", type=openapi.TYPE_INTEGER, default=DEFAULT_LIMIT),
+            openapi.Parameter('wait', openapi.IN_QUERY, description=f"Long-poll for up to this many seconds when there is nothing new (max {MAX_WAIT})", type=openapi.TYPE_INTEGER, default=0),
+        ],
+        responses={
+            200: openapi.Response(description="Feed items with the cursor to continue from and has_more"),
+            400: openapi.Response(description="Invalid cursor, limit or wait"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        # Positions are timestamps: a lagging replica could let the cursor skip rows
+        db_routing.use_primary()
+        params = request.query_params
+        limit = self.parse_bounded_int(params, 'limit', self.DEFAULT_LIMIT, 1, self.MAX_LIMIT)
+        wait = self.parse_bounded_int(params, 'wait', 0, 0, self.MAX_WAIT)
+        # A waiting client holds a worker, and only sees other processes'
+        # writes through a shared cache: off unless FEED_MAX_WAIT is set
+        wait = min(wait, settings.FEED_MAX_WAIT) if settings.CACHE_IS_SHARED else 0
+        
+        streams = feed.feed_streams(scoped_health_records(request.user), request.user)
+        if 'cursor' in params:
+            positions = feed.decode_cursor(params['cursor'], streams)
+        else:
+            start = (timezone.now() - feed.SETTLE_TIME, 0)
+            positions = {stream: start for stream in streams}
+        
+        if wait:
+            items, positions, has_more = feed.wait_for_feed(
+                streams, positions, limit, principal_for(request.user), wait
+            )
+        else:
+            items, positions, has_more = feed.read_feed(streams, positions, limit)
+        
+        serializers_by_stream = {'records': HealthRecordFeedSerializer, 'comments': DoctorCommentFeedSerializer}
+        return Response({
+            'results': [serializers_by_stream[stream](obj).data for stream, obj in items],
+            'cursor': feed.encode_cursor(positions),
+            'has_more': has_more,
+        })
+    
+    def parse_bounded_int(self, params, name, default, minimum, maximum):
+        try:
+            value = int(params.get(name, default))
+        except ValueError:
+            raise serializers.ValidationError({name: 'Must be an integer'})
+        if not minimum <= value <= maximum:
+            raise serializers.ValidationError({name: f'Must be between {minimum} and {maximum}'})
+        return value
+
+class HealthRecordSyncView(generics.GenericAPIView):
+    """
+    Delta Sync
+    
+    GET: Records created or updated, and ids of records deleted, since a sync token
+    """
+    serializer_class = HealthRecordSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 500
+    
+    @swagger_auto_schema(
+        operation_summary="Sync Health Records",
+        operation_description=(
+            "Without a token, returns every visible record (a full sync). With the token from the previous response, "
+            "returns only records created or updated since then and the ids of records deleted since then. "
+            "Keep requesting with the new token while has_more is true. "
+            "A 410 response means the token can no longer be used, because the doctor's assigned patients changed "
+            "or an older release issued it: discard the local copy and sync again without a token."
+        ),
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('token', openapi.IN_QUERY, description="Sync token from the previous response", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Changes per response, at most {MAX_LIMIT}", type=openapi.TYPE_INTEGER, default=DEFAULT_LIMIT),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated record fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Comma-separated related data to embed: comments, created_by", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: openapi.Response(description="updated records, deleted ids, the next token and has_more"),
+            400: openapi.Response(description="Invalid token or limit"),
+            401: openapi.Response(description="Authentication required"),
+            410: openapi.Response(description="Full sync required: the assigned patients changed or the token is from an older release")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        # Tokens follow the primary's transactions, which replicas may not have replayed yet
+        db_routing.use_primary()
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Must be an integer'})
+        if not 1 <= limit <= self.MAX_LIMIT:
+            raise serializers.ValidationError({'limit': f'Must be between 1 and {self.MAX_LIMIT}'})
+        
+        # Read before the changes: an assignment made in between fails the next sync
+        scope_version = sync.scope_version(request.user)
+        if 'token' in params:
+            positions, token_scope = sync.decode_token(params['token'])
+            if token_scope != scope_version:
+                return Response(
+                    {'error': 'This token can no longer be synced from; sync again without a token'},
+                    status=status.HTTP_410_GONE
+                )
+        
+        scope = record_scope(request.user)
+        if scope is None:
+            records, tombstones = HealthRecord.objects.none(), DeletedHealthRecord.objects.none()
+        else:
+            records, tombstones = HealthRecord.objects.filter(**scope), DeletedHealthRecord.objects.filter(**scope)
+        if 'token' not in params:
+            positions = sync.initial_positions(tombstones)
+        
+        updated_ids, deleted_ids, positions, has_more = sync.read_changes(records, tombstones, positions, limit)
+        
+        updated = []
+        if updated_ids:
+            fields, expand = HealthRecordSerializer.parse_field_selection(params)
+            queryset = records.filter(pk__in=updated_ids).with_display_relations(request.user, fields, expand)
+            # In the order the changes were made
+            by_id = {record.pk: record for record in queryset}
+            updated = self.get_serializer([by_id[pk] for pk in updated_ids if pk in by_id], many=True).data
+        
+        return Response({
+            'updated': updated,
+            'deleted': deleted_ids,
+            'token': sync.encode_token(positions, scope_version),
+            'has_more': has_more,
+        })
+
+class ArchivedRecordReadOnly(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Archived health records are read-only.'
+    default_code = 'archived'
+
+class HealthRecordDetailView(CachedResponseMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Health Record Detail Management
     
     GET: Retrieve specific health record
     PUT/PATCH: Update health record (patients only)
     DELETE: Delete health record (patients only)
+    
+    Records moved to the archive (see archive.py) can still be read and
+    deleted here, but not updated.
+    
+    Lookups are scoped to what the user may read, so the query that fetches
+    the record also authorizes it.
     """
     queryset = HealthRecord.objects.all()
     serializer_class = HealthRecordSerializer
-    permission_classes = [permissions.IsAuthenticated, IsPatientOwnerOrAssignedDoctor]
+    permission_classes = [permissions.IsAuthenticated]
     
     @swagger_auto_schema(
         operation_summary="Get Health Record",
-        operation_description="Retrieve a specific health record by ID",
+        operation_description="Retrieve a specific health record by ID, including archived records",
         tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated record fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Comma-separated related data to embed: comments, created_by", type=openapi.TYPE_STRING),
+        ],
         responses={
            200: HealthRecordSerializer,
             404: openapi.Response(description="Health record not found"),
@@ -147,6 +561,7 @@ class HealthRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
             200: HealthRecordSerializer,
             403: openapi.Response(description="Only patients can update their health records"),
             404: openapi.Response(description="Health record not found"),
+            409: openapi.Response(description="Archived health records are read-only"),
             401: openapi.Response(description="Authentication required")
         }
     )
@@ -172,6 +587,58 @@ class HealthRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
             return HealthRecordCreateSerializer
         return HealthRecordSerializer
     
+    def get_validators(self, request, *args, **kwargs):
+        # Scoping doubles as the authorization check; anything not visible
+        # falls through to the normal 403/404 handling
+        try:
+            records = scoped_health_records(request.user)
+        except Http404:
+            return None
+        
+        # Comments embed their doctor's profile and name
+        row = records.filter(pk=kwargs['pk']).annotate(
+            last_comment=Max('doctor_comments__updated_at'),
+            last_doctor=Max('doctor_comments__doctor__updated_at'),
+            last_doctor_user=Max('doctor_comments__doctor__user__updated_at'),
+            comment_count=Count('doctor_comments')
+        ).values_list(
+            'updated_at', 'created_by__updated_at', 'last_comment', 'last_doctor', 'last_doctor_user', 'comment_count'
+        ).first()
+        if row is None:
+            return None
+        
+        return row, latest(*row[:-1])
+    
+    def get_queryset(self):
+        records = scoped_health_records(self.request.user)
+        if self.request.method in permissions.SAFE_METHODS:
+            fields, expand = HealthRecordSerializer.parse_field_selection(self.request.query_params)
+            return records.with_display_relations(self.request.user, fields, expand)
+        return records
+    
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            row = scoped_health_records(self.request.user, ArchivedHealthRecord).filter(pk=self.kwargs['pk']).first()
+            if row is None:
+                self.permission_denied_if_exists(self.kwargs['pk'])
+                raise
+        
+        fields, expand = HealthRecordSerializer.parse_field_selection(self.request.query_params)
+        record, = archive.materialize([row], self.request.user, fields, expand)
+        if self.request.method not in permissions.SAFE_METHODS and self.request.method != 'DELETE':
+            raise ArchivedRecordReadOnly()
+        return record
+    
+    def permission_denied_if_exists(self, pk):
+        """
+        403 rather than 404 for a record outside the user's scope, as before
+        lookups were scoped. Only runs when the scoped lookup missed.
+        """
+        if HealthRecord.objects.filter(pk=pk).exists() or ArchivedHealthRecord.objects.filter(pk=pk).exists():
+            self.permission_denied(self.request)
+    
     def update(self, request, *args, **kwargs):
         if request.user.user_type != 'PATIENT':
             return Response(
@@ -187,6 +654,94 @@ class HealthRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         return super().destroy(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        if hasattr(instance, 'archived_at'):
+            archive.delete_archived(instance)
+        else:
+            instance.delete()
+
+BATCH_CREATE_MAX_SIZE = 500
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Batch Create Health Records",
+    operation_description=(
+        f"Create up to {BATCH_CREATE_MAX_SIZE} health records in one request (patients only). "
+        "All records are validated first; if any is invalid nothing is saved and the errors are "
+        "reported per item by index. The assigned doctor receives a single notification for the batch."
+    ),
+    tags=['Health Records'],
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['records'],
+        properties={
+            'records': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_OBJECT, description='Same fields as POST /api/health-records/'),
+                description=f'Health records to create, at most {BATCH_CREATE_MAX_SIZE}'
+            ),
+        }
+    ),
+    responses={
+        201: openapi.Response(description="Count and ids of the created records, in request order"),
+        400: openapi.Response(description="Per-item validation errors; nothing was created"),
+        403: openapi.Response(description="Only patients can create health records"),
+        401: openapi.Response(description="Authentication required")
+    }
+)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_create_health_records(request):
+    """Create many health records for the current patient in one transaction"""
+    if request.user.user_type != 'PATIENT':
+        return Response(
+            {'error': 'Only patients can create health records'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    records = request.data.get('records') if isinstance(request.data, dict) else None
+    if not isinstance(records, list) or not records:
+        return Response(
+            {'records': ['Expected a non-empty list of health records']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(records) > BATCH_CREATE_MAX_SIZE:
+        return Response(
+            {'records': [f'At most {BATCH_CREATE_MAX_SIZE} records can be created per request']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    patient_profile = get_object_or_404(
+        PatientProfile.objects.select_related('user', 'assigned_doctor'), user=request.user
+    )
+    
+    serializer = HealthRecordCreateSerializer(data=records, many=True)
+    if not serializer.is_valid():
+        errors = [
+            {'index': index, 'errors': item_errors}
+            for index, item_errors in enumerate(serializer.errors) if item_errors
+        ]
+        return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # bulk_create skips save() and post_save, so the doctor's notification
+    # is sent here once for the whole batch
+    created = HealthRecord.objects.bulk_create([
+        HealthRecord(patient=patient_profile, created_by=request.user, **item)
+        for item in serializer.validated_data
+    ])
+    
+    if patient_profile.assigned_doctor:
+        send_batch_records_notification.delay(
+            patient_profile.assigned_doctor.user_id,
+            patient_profile.user.get_full_name(),
+            len(created)
+        )
+    
+    return Response(
+        {'count': len(created), 'ids': [record.id for record in created]},
+        status=status.HTTP_201_CREATED
+    )
 
 @swagger_auto_schema(
     method='post',
@@ -221,10 +776,14 @@ def add_doctor_comment(request, record_id):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    health_record = get_object_or_404(HealthRecord, id=record_id)
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = request.user.profile
+    if doctor_profile is None:
+        raise Http404('No profile found for this user')
     
-    if health_record.patient.assigned_doctor != doctor_profile:
+    patient_id = HealthRecord.objects.filter(pk=record_id).values_list('patient_id', flat=True).first()
+    if patient_id is None:
+        raise Http404
+    if not is_assigned(doctor_profile.pk, patient_id):
         return Response(
             {'error': 'You can only comment on records of your assigned patients'},
             status=status.HTTP_403_FORBIDDEN
@@ -233,47 +792,299 @@ def add_doctor_comment(request, record_id):
     serializer = DoctorCommentSerializer(data=request.data)
     if serializer.is_valid():
         serializer.save(
-            health_record=health_record,
-            doctor=doctor_profile
+            health_record_id=record_id,
+            # Rendered in the response with its user
+            doctor=DoctorProfile.objects.select_related('user').get(pk=doctor_profile.pk)
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@swagger_auto_schema(
-    method='get',
-    operation_summary="My Patients",
-    operation_description="Get list of patients assigned to the current doctor",
-    tags=['Doctor Management'],
-    responses={
-        200: PatientSummarySerializer(many=True),
-        403: openapi.Response(description="Only doctors can access this endpoint"),
-        401: openapi.Response(description="Authentication required")
-    }
-)
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def my_patients(request):
-    """List all patients assigned to the current doctor"""
-    if request.user.user_type != 'DOCTOR':
+class HealthRecordAttachmentsView(generics.GenericAPIView):
+    """
+    Health Record Attachments
+    
+    GET: Files attached to a health record
+    POST: Start a chunked upload of a new attachment (see AttachmentUploadView)
+    """
+    serializer_class = AttachmentUploadSerializer
+    permission_classes = [permissions.IsAuthenticated, IsPatientOwnerOrAssignedDoctor]
+    
+    @swagger_auto_schema(
+        operation_summary="List Attachments",
+        operation_description="Files attached to a health record, oldest first, including those of archived records",
+        tags=['Health Records'],
+        responses={
+            200: HealthRecordAttachmentSerializer(many=True),
+            403: openapi.Response(description="Permission denied - not owner or assigned doctor"),
+            404: openapi.Response(description="Health record not found"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, record_id):
+        self.get_record()
+        attachments = HealthRecordAttachment.objects.filter(health_record_id=record_id).select_related('blob')
+        return Response(HealthRecordAttachmentSerializer(attachments, many=True, context=self.get_serializer_context()).data)
+    
+    @swagger_auto_schema(
+        operation_summary="Start Attachment Upload",
+        operation_description=(
+            "Announce a file to attach (patient owner or assigned doctor), then send its bytes in chunks "
+            f"of at most {settings.ATTACHMENT_CHUNK_MAX_SIZE} bytes with PUT to the returned upload_url. "
+            f"Files are limited to {settings.ATTACHMENT_MAX_SIZE} bytes."
+        ),
+        tags=['Health Records'],
+        request_body=AttachmentUploadSerializer,
+        responses={
+            201: AttachmentUploadSerializer,
+            400: openapi.Response(description="Invalid file name or size"),
+            403: openapi.Response(description="Permission denied - not owner or assigned doctor"),
+            404: openapi.Response(description="Health record not found"),
+            409: openapi.Response(description="Archived health records are read-only"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def post(self, request, record_id):
+        record = self.get_record()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(health_record_id=record.pk, patient_id=record.patient_id, uploaded_by=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    def get_record(self):
+        """The record, or its archived row for reads, after the usual object permission check"""
+        record_id = self.kwargs['record_id']
+        record = HealthRecord.objects.filter(pk=record_id).first()
+        if record is None:
+            record = get_object_or_404(ArchivedHealthRecord, pk=record_id)
+            self.check_object_permissions(self.request, record)
+            if self.request.method not in permissions.SAFE_METHODS:
+                raise ArchivedRecordReadOnly()
+            return record
+        self.check_object_permissions(self.request, record)
+        return record
+
+class AttachmentUploadView(generics.GenericAPIView):
+    """
+    Attachment Upload
+    
+    GET: Progress of an upload, to resume it after an interruption
+    PUT: Send the next chunk; the last one creates the attachment
+    DELETE: Abandon the upload
+    
+    Only the user who started an upload can see or continue it.
+    """
+    serializer_class = AttachmentUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = 'upload_id'
+    
+    @swagger_auto_schema(
+        operation_summary="Get Attachment Upload",
+        operation_description="How many bytes of an upload have been received",
+        tags=['Health Records'],
+        responses={
+            200: AttachmentUploadSerializer,
+            404: openapi.Response(description="Upload not found"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
+    
+    @swagger_auto_schema(
+        operation_summary="Upload Attachment Chunk",
+        operation_description=(
+            "Raw bytes of the file starting at the received offset, described by "
+            "Content-Range: bytes <first>-<last>/<size>. Returns the upload until the last chunk, "
+            "then the created attachment. Identical files are stored once."
+        ),
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('Content-Range', openapi.IN_HEADER, description="bytes <first>-<last>/<size>", type=openapi.TYPE_STRING, required=True),
+        ],
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_BINARY),
+        responses={
+            200: AttachmentUploadSerializer,
+            201: HealthRecordAttachmentSerializer,
+            400: openapi.Response(description="Missing or inconsistent Content-Range, or a truncated body"),
+            404: openapi.Response(description="Upload not found"),
+            409: openapi.Response(description="Chunk does not start at the received offset, or another request is writing it"),
+            413: openapi.Response(description="Chunk too large"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def put(self, request, *args, **kwargs):
+        content_range = attachments.parse_content_range(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if content_range is None:
+            return Response(
+                {'error': 'Content-Range must be "bytes <first>-<last>/<size>"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        first, last, size = content_range
+        length = last - first + 1
+        if length > settings.ATTACHMENT_CHUNK_MAX_SIZE:
+            return Response(
+                {'error': f'Chunks are limited to {settings.ATTACHMENT_CHUNK_MAX_SIZE} bytes'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if request.META.get('CONTENT_LENGTH') != str(length):
+            return Response(
+                {'error': 'Content-Length does not match Content-Range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # The row is locked only to check the chunk; its bytes are copied outside the transaction
+        with transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=kwargs['upload_id'])
+            if size != upload.size:
+                return Response(
+                    {'error': f'The upload was announced with {upload.size} bytes'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if first != upload.received:
+                return Response(
+                    {'error': f'Expected the chunk starting at byte {upload.received}', 'received': upload.received},
+                    status=status.HTTP_409_CONFLICT
+                )
+        try:
+            written = attachments.write_chunk(upload, request.stream, first, length)
+        except attachments.IncompleteChunk as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not written:
+            upload = get_object_or_404(self.get_queryset(), pk=upload.pk)
+            return Response(
+                {'error': 'Another request is writing this chunk, or has written it', 'received': upload.received},
+                status=status.HTTP_409_CONFLICT
+            )
+        upload.received = last + 1
+        
+        if upload.received < upload.size:
+            return Response(self.get_serializer(upload).data)
+        
+        attachment = attachments.complete(upload)
         return Response(
-            {'error': 'Only doctors can access this endpoint'},
-            status=status.HTTP_403_FORBIDDEN
+            HealthRecordAttachmentSerializer(attachment, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
         )
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    patients = PatientProfile.objects.filter(assigned_doctor=doctor_profile)
-    
-    data = []
-    for patient in patients:
-        data.append({
-            'id': patient.id,
-            'name': patient.user.get_full_name(),
-            'email': patient.user.email,
-            'phone': patient.user.phone_number,
-            'blood_type': patient.blood_type,
-            'total_records': patient.health_records.count(),
-            'last_visit': patient.health_records.first().visit_date if patient.health_records.exists() else None
-        })
+    @swagger_auto_schema(
+        operation_summary="Abandon Attachment Upload",
+        tags=['Health Records'],
+        responses={
+            204: openapi.Response(description="Upload and received bytes discarded"),
+            404: openapi.Response(description="Upload not found"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def delete(self, request, *args, **kwargs):
+        upload = self.get_object()
+        upload_id = upload.pk
+        upload.delete()
+        attachments.discard_upload(upload_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    def get_queryset(self):
+        return AttachmentUpload.objects.filter(uploaded_by=self.request.user)
+
+class AttachmentDownloadView(generics.GenericAPIView):
+    """
+    Attachment Download
+    
+    GET: The file, honouring Range requests, under the same access rules as its health record
+    """
+    queryset = HealthRecordAttachment.objects.select_related('blob')
+    permission_classes = [permissions.IsAuthenticated, IsPatientOwnerOrAssignedDoctor]
+    
+    @swagger_auto_schema(
+        operation_summary="Download Attachment",
+        operation_description=(
+            "The attached file. Supports a single Range (with If-Range) and If-None-Match; "
+            "the ETag is the SHA-256 of the content."
+        ),
+        tags=['Health Records'],
+        manual_parameters=[
+            openapi.Parameter('Range', openapi.IN_HEADER, description="bytes=<first>-<last>", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: openapi.Response(description="File content"),
+            206: openapi.Response(description="Requested byte range"),
+            304: openapi.Response(description="Not modified"),
+            403: openapi.Response(description="Permission denied - not owner or assigned doctor"),
+            404: openapi.Response(description="Attachment not found"),
+            416: openapi.Response(description="Range not satisfiable"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return attachments.serve(request, self.get_object())
+
+class MyPatientsView(generics.ListAPIView):
+    """
+    Doctor Panel
+    
+    GET: Paginated summaries of the patients assigned to the current doctor,
+    read from their PatientRecordSummary rows
+    """
+    serializer_class = PatientSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    ORDERINGS = {
+        'last_visit': [F('last_visit').asc(nulls_first=True), 'id'],
+        '-last_visit': [F('last_visit').desc(nulls_last=True), '-id'],
+        'total_records': ['total_records', 'id'],
+        '-total_records': ['-total_records', '-id'],
+        'name': ['user__last_name', 'user__first_name', 'id'],
+        '-name': ['-user__last_name', '-user__first_name', '-id'],
+    }
+    
+    @swagger_auto_schema(
+        operation_summary="My Patients",
+        operation_description="Get list of patients assigned to the current doctor, with record counts per type, last visit and records the doctor has not commented on yet",
+        tags=['Doctor Management'],
+        manual_parameters=[
+            openapi.Parameter('name', openapi.IN_QUERY, description="Only patients whose first or last name contains every given word", type=openapi.TYPE_STRING),
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="Sort order", type=openapi.TYPE_STRING, enum=list(ORDERINGS), default='-last_visit'),
+        ],
+        responses={
+            200: PatientSummarySerializer(many=True),
+            400: openapi.Response(description="Unknown ordering"),
+            403: openapi.Response(description="Only doctors can access this endpoint"),
+            401: openapi.Response(description="Authentication required")
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        if request.user.user_type != 'DOCTOR':
+            return Response(
+                {'error': 'Only doctors can access this endpoint'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return super().get(request, *args, **kwargs)
     
-    return Response(data)
\ No newline at end of file
+    def get_queryset(self):
+        params = self.request.query_params
+        ordering = params.get('ordering', '-last_visit')
+        if ordering not in self.ORDERINGS:
+            raise serializers.ValidationError({'ordering': f"Expected one of: {', '.join(self.ORDERINGS)}"})
+        
+        doctor_profile = get_object_or_404(DoctorProfile, user=self.request.user)
+        patients = PatientProfile.objects.filter(assigned_doctor=doctor_profile).select_related('user')
+        
+        for term in params.get('name', '').split():
+            patients = patients.filter(Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term))
+        
+        # Record statistics come from the per-patient summary row; only the
+        # doctor-specific unreviewed count is computed, as a correlated count
+        unreviewed = HealthRecord.objects.filter(patient=OuterRef('pk')).exclude(
+            Exists(DoctorComment.objects.filter(health_record=OuterRef('pk'), doctor=doctor_profile))
+        ).order_by().values('patient').annotate(count=Count('id')).values('count')
+        
+        summary_fields = {
+            name: Coalesce(F(f'record_summary__{name}'), 0)
+            for name in PatientRecordSummary.objects.aggregates() if name != 'last_visit'
+        }
+        
+        return patients.annotate(
+            last_visit=F('record_summary__last_visit'),
+            unreviewed_records=Coalesce(Subquery(unreviewed), 0),
+            **summary_fields
+        ).order_by(*self.ORDERINGS[ordering])
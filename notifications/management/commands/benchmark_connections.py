@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from notifications.models import Notification
+
+# label, CONN_MAX_AGE, CONN_HEALTH_CHECKS
+MODES = [
+    ('connection per request', 0, False),
+    ('persistent', 60, False),
+    ('persistent, health checks', 60, True),
+]
+
+class Command(BaseCommand):
+    help = (
+        'Measure mark_notification_read latency with a new database connection per request and '
+        'with persistent connections. Requests go through the full WSGI handler, so connections '
+        'are opened and closed exactly as under gunicorn. Creates and removes its own user.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per mode')
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per mode')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'postgresql':
+            self.stderr.write(f'Connecting to {connection.vendor} is not representative of PostgreSQL.')
+
+        stamp = int(time.time())
+        user = User.objects.create_user(username=f'bench_connections_{stamp}', password=None, user_type='PATIENT')
+        notification = Notification.objects.create(
+            recipient=user, notification_type='NEW_RECORD', title='Benchmark', message='Benchmark'
+        )
+        saved = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        try:
+            self.stdout.write(f'{"mode":<28} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"mean ms":>8} {"connects":>9}')
+            for label, max_age, health_checks in MODES:
+                connection.close()
+                connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+                samples, connects = self.measure(user, notification, options['warmup'], options['requests'])
+                quantiles = statistics.quantiles(samples, n=100)
+                self.stdout.write(
+                    f'{label:<28} {quantiles[49] * 1000:>8.2f} {quantiles[89] * 1000:>8.2f} '
+                    f'{quantiles[98] * 1000:>8.2f} {statistics.mean(samples) * 1000:>8.2f} {connects:>9}'
+                )
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+            user.delete()
+
+    def measure(self, user, notification, warmup, requests):
+        handler = WSGIHandler()
+        factory = RequestFactory(SERVER_NAME='localhost')
+        path = reverse('mark-notification-read', args=[notification.pk])
+        authorization = f'Bearer {AccessToken.for_user(user)}'
+
+        connects = []
+        def count_connect(sender, connection, **kwargs):
+            connects.append(connection.alias)
+
+        samples = []
+        connection_created.connect(count_connect)
+        try:
+            for i in range(warmup + requests):
+                if i == warmup:
+                    connects.clear()
+                environ = factory.post(path, HTTP_AUTHORIZATION=authorization).environ
+                start = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                # Closing the response sends request_finished, as a WSGI server would
+                response.close()
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise CommandError(f'{path} answered {response.status_code}: {response.content[:200]!r}')
+                if i >= warmup:
+                    samples.append(elapsed)
+        finally:
+            connection_created.disconnect(count_connect)
+        return samples, len(connects)
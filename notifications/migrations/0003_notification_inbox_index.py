@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_access_pattern_indexes'),
+    ]
+
+    # Build the replacement before dropping the old index, so the recipient
+    # foreign key is never left without an index
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_recipient_read_idx',
+        ),
+    ]
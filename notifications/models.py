@@ -8,7 +8,8 @@ class Notification(models.Model):
         ('COMMENT_ADDED', 'Comment Added'),
     ]
     
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Indexed as the leading column of notif_recipient_created_idx
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     title = models.CharField(max_length=200)
     message = models.TextField()
@@ -17,6 +18,16 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Inbox: one recipient, newest first, read straight off the index without a sort
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # Unread inbox and mark-all-read only ever touch the unread slice
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notif_unread_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
@@ -32,3 +32,19 @@ def send_new_record_notification(doctor_id, patient_name, record_title):
         )
     except User.DoesNotExist:
         pass
+
+@shared_task
+def send_batch_records_notification(doctor_id, patient_name, record_count):
+    """Send one notification when a patient uploads a batch of health records"""
+    from accounts.models import User
+    
+    try:
+        doctor = User.objects.get(id=doctor_id)
+        Notification.objects.create(
+            recipient=doctor,
+            notification_type='NEW_RECORD',
+            title='New Health Records',
+            message=f'{patient_name} has created {record_count} new health records'
+        )
+    except User.DoesNotExist:
+        pass